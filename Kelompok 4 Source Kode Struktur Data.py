@@ -1,363 +1,172 @@
 import customtkinter as ctk 
 from tkinter import messagebox, filedialog
-import random
 import pygame
 import os
-import json
-import time
-import math
+import io
+import argparse
+import threading
+from queue import Empty
+from concurrent.futures import ThreadPoolExecutor
 
-# safer init for pygame mixer
-try:
-    pygame.mixer.init()
-except Exception:
-    # If audio device unavailable (CI / headless), continue but playback will fail at runtime.
-    pass
+from groovy import Song, User, MusicPlayer, AdminController, UserController, SearchWorker, QueryError, METRICS
 
 
-# BACKEND - MODELS & DS
-
-class Song:
-    def __init__(self, id, title, artist, genre, album, year=None, duration=None, file_path=None):
-        self.id = id
-        self.title = title
-        self.artist = artist
-        self.genre = genre
-        self.album = album
-        self.year = year
-        self.duration = duration  # optional string like "3:45"
-        self.file_path = file_path
-
-    def __str__(self):
-        return f"{self.id}: {self.title} - {self.artist} ({self.genre})"
-
-
-class User:
-    def __init__(self, username, fullname):
-        self.username = username
-        self.fullname = fullname
-
-
-class Node:
-    def __init__(self, song):
-        self.song = song
-        self.prev = None
-        self.next = None
-
-
-class DoublyLinkedList:
-    def __init__(self):
-        self.head = None
-        self.tail = None
-        self.size = 0
-
-    def add(self, song: Song):
-        new_node = Node(song)
-        if self.head is None:
-            self.head = self.tail = new_node
-        else:
-            self.tail.next = new_node
-            new_node.prev = self.tail
-            self.tail = new_node
-        self.size += 1
-        return True
-
-    def delete(self, song_id):
-        current = self.head
-        while current:
-            if current.song.id == song_id:
-                if current.prev:
-                    current.prev.next = current.next
-                else:
-                    self.head = current.next
-                if current.next:
-                    current.next.prev = current.prev
-                else:
-                    self.tail = current.prev
-                self.size -= 1
-                return True
-            current = current.next
-        return False
-
-    def search(self, keyword):
-        results = []
-        current = self.head
-        keyword = keyword.lower()
-        while current:
-            s = current.song
-            if (keyword in (s.title or '').lower() or keyword in (s.artist or '').lower() or keyword in (s.genre or '').lower()):
-                results.append(s)
-            current = current.next
-        return results
-
-    def get_all(self):
-        songs = []
-        current = self.head
-        while current:
-            songs.append(current.song)
-            current = current.next
-        return songs
-
-    def find_by_id(self, song_id):
-        current = self.head
-        while current:
-            if current.song.id == song_id:
-                return current.song
-            current = current.next
-        return None
-
-
-class Queue:
-    def __init__(self):
-        self.items = []
-
-    def enqueue(self, song):
-        self.items.append(song)
-
-    def dequeue(self):
-        return self.items.pop(0) if self.items else None
-
-    def get_all(self):
-        return self.items.copy()
-
+# UI - CUSTOMTKINTER
 
-class Stack:
-    def __init__(self):
+class VirtualSongList(ctk.CTkFrame):
+    """Scrollable list that only builds widgets for the rows on screen.
+
+    ``items`` can be any sequence (len + indexing). A small pool of row
+    widgets is created with ``make_row(parent)`` and re-bound to whichever
+    items are visible with ``bind_row(row, item, index)`` while scrolling,
+    so opening a view costs the same for 50 songs or 500k.
+    """
+    def __init__(self, master, make_row, bind_row, row_height=76, empty_text="", **kwargs):
+        kwargs.setdefault("fg_color", "transparent")
+        super().__init__(master, **kwargs)
+        self.make_row = make_row
+        self.bind_row = bind_row
+        self.row_height = row_height
         self.items = []
-
-    def push(self, song):
-        if len(self.items) >= 20:
-            self.items.pop(0)
-        self.items.append(song)
-
-    def get_all(self):
-        return self.items.copy()
-
-
-class MusicPlayer:
-    """Core player logic and in-memory data storage."""
-    def __init__(self):
-        self.library = DoublyLinkedList()
-        self.playlist = DoublyLinkedList()
-        self.queue = Queue()
-        self.history = Stack()
-        self.favorites = set()
-        self.current_song = None
-        self.is_playing = False
-        self.current_mode = "library"
-        self.list_order = "asc"
-
-        # Load saved data
-        self.load_library()
-        self.load_playlist()   # load playlist after library so IDs resolve correctly
-
-    def get_next_id(self):
-        songs = self.library.get_all()
-        return max([s.id for s in songs], default=0) + 1
-
-    #  playlist persistence 
-    def save_playlist(self):
-        """Simpan playlist ke playlist.json sebagai list ID lagu."""
-        try:
-            ids = [song.id for song in self.playlist.get_all()]
-            with open("playlist.json", "w") as f:
-                json.dump(ids, f, indent=4)
-        except Exception as e:
-            print("Failed to save playlist:", e)
-
-    def load_playlist(self):
-        """Muat playlist dari playlist.json bila ada."""
-        try:
-            if not os.path.isfile("playlist.json"):
-                return
-            with open("playlist.json", "r") as f:
-                ids = json.load(f)
-
-            # rebuild playlist using songs from library
-            for song_id in ids:
-                song = self.library.find_by_id(song_id)
-                if song:
-                    self.playlist.add(song)
-
-        except Exception as e:
-            print("Failed to load playlist:", e)
-
-    #  library persistence (optional helpers) 
-    def save_library(self):
-        """Simpan seluruh library ke songs.json (dipakai jika ingin persist library)."""
-        try:
-            data = []
-            for s in self.library.get_all():
-                data.append({
-                    "id": s.id,
-                    "title": s.title,
-                    "artist": s.artist,
-                    "genre": s.genre,
-                    "album": s.album,
-                    "year": s.year,
-                    "duration": s.duration,
-                    "file_path": s.file_path
-                })
-            with open("songs.json", "w") as f:
-                json.dump(data, f, indent=4)
-        except Exception as e:
-            print("Failed to save library:", e)
-
-    def load_library(self):
-        try:
-            with open("songs.json", "r") as f:
-                data = json.load(f)
-
-            for s in data:
-                song = Song(
-                    s.get("id"),
-                    s.get("title"),
-                    s.get("artist"),
-                    s.get("genre"),
-                    s.get("album"),
-                    s.get("year"),
-                    s.get("duration"),
-                    s.get("file_path")
-                )
-                # avoid duplicate IDs if repeated load
-                if self.library.find_by_id(song.id) is None:
-                    self.library.add(song)
-
-        except FileNotFoundError:
-            pass  # tidak ada file? biarkan library kosong
-        except Exception as e:
-            print("Failed to load library:", e)
-
-    #  navigation helpers 
-    def find_similar_song(self, current_song):
-        songs = self.library.get_all()
-        candidates = [s for s in songs if s.id != current_song.id]
-        if not candidates:
-            return None
-        same_artist = [s for s in candidates if s.artist == current_song.artist]
-        if same_artist:
-            return same_artist[0]
-        same_genre = [s for s in candidates if s.genre == current_song.genre]
-        if same_genre:
-            return same_genre[0]
-        return random.choice(candidates)
-
-    def _get_ordered_list(self):
-        """Return list following current_mode and list_order so next/prev follow visual order."""
-        if self.current_mode == "playlist":
-            base = self.playlist.get_all()
+        self.first = 0
+        self.rows = []
+
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.pack(side="left", fill="both", expand=True)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        self.empty_label = ctk.CTkLabel(self.body, text=empty_text, font=("Arial", 13), text_color="#64748b")
+
+        self.body.bind("<Configure>", lambda e: self._render())
+        # one global wheel handler; it only acts while the pointer is over this list
+        self.bind("<Enter>", self._grab_wheel)
+
+    def set_items(self, items, keep_position=False):
+        self.items = items
+        if not keep_position:
+            self.first = 0
+        self._render()
+
+    def refresh(self):
+        """Re-bind the visible rows, e.g. after the items changed in place."""
+        self._render()
+
+    def _body_height(self):
+        # place() coordinates are scaled by CustomTkinter, winfo_height is not
+        return int(self.body.winfo_height() / self._get_widget_scaling())
+
+    def _visible(self):
+        return max(1, self._body_height() // self.row_height)
+
+    def _render(self):
+        height = self._body_height()
+        needed = height // self.row_height + 1
+        while len(self.rows) < needed:
+            self.rows.append(self.make_row(self.body))
+        n = len(self.items)
+        self.first = max(0, min(self.first, n - self._visible()))
+        for i, row in enumerate(self.rows):
+            index = self.first + i
+            if index < n and i * self.row_height < height:
+                self.bind_row(row, self.items[index], index)
+                row.place(x=0, y=i * self.row_height, relwidth=1)
+            else:
+                row.place_forget()
+        if n:
+            self.empty_label.place_forget()
+            self.scrollbar.set(self.first / n, min(1.0, (self.first + self._visible()) / n))
         else:
-            base = self.library.get_all()
-        if self.list_order == "desc":
-            return list(reversed(base))
-        return base
-
-    def next_song(self):
-        songs = self._get_ordered_list()
-        if not songs or not self.current_song:
-            return None
-        try:
-            idx = next(i for i, s in enumerate(songs) if s.id == self.current_song.id)
-            if idx < len(songs) - 1:
-                return songs[idx + 1]
-        except StopIteration:
-            pass
-        # fallback: similar
-        return self.find_similar_song(self.current_song) if self.current_song else None
-
-    def prev_song(self):
-        songs = self._get_ordered_list()
-        if not songs or not self.current_song:
-            return None
-        try:
-            idx = next(i for i, s in enumerate(songs) if s.id == self.current_song.id)
-            if idx > 0:
-                return songs[idx - 1]
-        except StopIteration:
-            pass
-        # fallback: similar
-        return self.find_similar_song(self.current_song) if self.current_song else None
-
-
-# CONTROLLER
-
-class AdminController:
-    def __init__(self, player: MusicPlayer):
-        self.player = player
-
-    def list_songs(self):
-        return self.player.library.get_all()
-
-    def add_song(self, title, artist, genre, album, year, duration, file_path):
-        try:
-            song = Song(self.player.get_next_id(), title, artist, genre, album, int(year) if year else None, duration, file_path)
-            self.player.library.add(song)
-            # persist library
-            try:
-                self.player.save_library()
-            except Exception:
-                pass
-            return True, "Song added"
-        except Exception as e:
-            return False, str(e)
-
-    def delete_song(self, song_id):
-        ok = self.player.library.delete(song_id)
-        # also try to remove from playlist (ignore if not present)
+            self.empty_label.place(relx=0.5, y=30, anchor="n")
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_to(self, index):
+        self.first = index
+        self._render()
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.first = int(float(args[1]) * len(self.items))
+        elif args[0] == "scroll":
+            step = self._visible() if args[2] == "pages" else 1
+            self.first += int(args[1]) * step
+        self._render()
+
+    def _grab_wheel(self, event=None):
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.bind_all(sequence, self._on_wheel)
+
+    def _on_wheel(self, event):
         try:
-            self.player.playlist.delete(song_id)
-            # persist playlist after deletion
-            self.player.save_playlist()
+            x, y = self.winfo_pointerxy()
+            under = self.winfo_containing(x, y)
         except Exception:
-            pass
-        # persist library
-        try:
-            self.player.save_library()
-        except Exception:
-            pass
-        return ok
-
-
-class UserController:
-    """Contains user-facing operations (search, playlist, favs, history)."""
-    def __init__(self, player: MusicPlayer):
-        self.player = player
-
-    def search(self, keyword):
-        return self.player.library.search(keyword)
-
-    def add_to_playlist(self, song_id):
-        song = self.player.library.find_by_id(song_id)
-        if not song:
-            return False
-        self.player.playlist.add(song)
-        return True
-
-    def toggle_favorite(self, song_id):
-        if song_id in self.player.favorites:
-            self.player.favorites.remove(song_id)
-            return False
-        self.player.favorites.add(song_id)
-        return True
+            return
+        if under is None or not str(under).startswith(str(self)):
+            return
+        up = getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0
+        self.first += -3 if up else 3
+        self._render()
 
-    def get_favorites(self):
-        return [s for s in self.player.library.get_all() if s.id in self.player.favorites]
 
-    def get_history(self):
-        return list(reversed(self.player.history.get_all()))
+class SongViewModel:
+    """Per-song UI state (favorite / playing) with change notifications.
 
+    Rows subscribe for the song they currently show. When a song's state
+    changes, changed(song_id) repaints only the rows watching it, instead of
+    rebuilding the view or walking every button.
+    """
+    def __init__(self, player):
+        self.player = player
+        self._watchers = {}   # song id -> {row: repaint callback}
+
+    def is_favorite(self, song_id):
+        return song_id in self.player.favorites
+
+    def is_playing(self, song_id):
+        current = self.player.current_song
+        return current is not None and current.id == song_id and self.player.is_playing
+
+    def watch(self, row, song_id, repaint):
+        """(Re)point ``row`` at ``song_id``; a recycled row drops its old song."""
+        old = getattr(row, "song_id", None)
+        if old is not None and old != song_id:
+            self.unwatch(row, old)
+        row.song_id = song_id
+        self._watchers.setdefault(song_id, {})[row] = repaint
+
+    def unwatch(self, row, song_id):
+        rows = self._watchers.get(song_id)
+        if rows is not None:
+            rows.pop(row, None)
+            if not rows:
+                del self._watchers[song_id]
+
+    def reset(self):
+        """Forget all rows (the view holding them is being replaced)."""
+        self._watchers.clear()
+
+    def changed(self, *song_ids):
+        for song_id in song_ids:
+            for row, repaint in list(self._watchers.get(song_id, {}).items()):
+                try:
+                    repaint()
+                except Exception:
+                    self.unwatch(row, song_id)   # widget already destroyed
 
-# UI - CUSTOMTKINTER
 
 class MusicPlayerGUI:
     """The GUI composes the player and controllers. UI/UX methods are kept here."""
     def __init__(self):
-        self.player = MusicPlayer()
+        # library is streamed in after the window is up (see _load_library_step)
+        self.player = MusicPlayer(autoload=False)
         self.admin = AdminController(self.player)
         self.user = UserController(self.player)
         self.current_user = None
-        self.play_buttons = {}
-        self.admin_play_buttons = {}
+        self.songs_vm = SongViewModel(self.player)
+        self.search_worker = SearchWorker(self.user.search)
+        self._search_job = None          # pending debounce after() id
+        self._search_generation = 0      # search whose results the view is showing
+        self._search_text = None         # entry text the last search was started for
         self.users = {
             "ade": User("ade", "Ade Tian"),
             "guest": User("guest", "Guest User"),
@@ -368,6 +177,30 @@ class MusicPlayerGUI:
         self._progress_update_job = None
         self.current_song_length = 0.0  # seconds
         self.progress_value = 0.0
+        self._library_loader = None
+        self._current_view = None
+        # label -> (SortedIndex field or None for list order, descending)
+        self.sort_choices = {
+            "Newest": (None, True), "Oldest": (None, False),
+            "Title A-Z": ("title", False), "Title Z-A": ("title", True),
+            "Artist": ("artist", False), "Album": ("album", False), "Genre": ("genre", False),
+            "Year ↓": ("year", True), "Year ↑": ("year", False),
+            "Shortest": ("duration", False), "Longest": ("duration", True),
+        }
+        self._home_sort = "Newest"
+        self._admin_sort = "Oldest"
+        self._admin_query = ""           # structured filter of the admin library view
+        self._editing_id = None          # song shown in the admin form, None when adding
+
+        # Gapless playback: the next song is read ahead and queued in the mixer
+        self._prefetcher = ThreadPoolExecutor(max_workers=1)
+        self._prefetch = None          # (song, future) being read ahead
+        self._queued_song = None       # song handed to pygame.mixer.music.queue
+        self._queued = None            # (buffer, length) of that song
+        self._current_buffer = None    # keeps the playing in-memory track alive
+        self._last_elapsed = 0.0
+        self._track_loaded = False     # mixer is playing a track we started
+        self._end_event = None         # set up with the mixer on the first play
 
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
@@ -376,6 +209,10 @@ class MusicPlayerGUI:
         self.window.title("Groovy Music Player")
         self.window.geometry("1200x700")
         self.window.configure(fg_color="#0a0a0a")
+        self.window.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.window.bind("<Map>", self._on_window_map, add="+")
+        self.window.bind("<F12>", lambda e: self.show_debug_panel())
+        self._debug_panel = None
         # UI attributes created later
         self.now_playing = None
         self.now_artist = None
@@ -384,9 +221,12 @@ class MusicPlayerGUI:
         self.progress_label_total = None
 
         self.show_login()
+        self._library_loader = self.player.iter_load_library()
+        self.window.after(1, self._load_library_step)
 
     #  helpers 
     def clear_window(self):
+        self._current_view = None
         for w in self.window.winfo_children():
             w.destroy()
         self.window.update()
@@ -586,6 +426,29 @@ class MusicPlayerGUI:
     def load_library(self):
         self.player.load_library()
 
+    def _load_library_step(self):
+        # one batch per Tk tick so the window stays responsive while loading
+        try:
+            next(self._library_loader)
+        except StopIteration:
+            self._finish_library_load()
+            return
+        except Exception as e:
+            print("Failed to load library:", e)
+            self._finish_library_load()
+            return
+        self.window.after(1, self._load_library_step)
+
+    def _finish_library_load(self):
+        self._library_loader = None
+        self.player.load_session()
+        # views opened mid-load only showed the first batches
+        if self._current_view in (self.user_home, self.admin_view_songs):
+            try:
+                self._current_view()
+            except Exception:
+                pass
+
     # login user (tetap ada tapi aman - fallback ke guest jika combobox hilang)
     def do_login(self):
         username = None
@@ -603,6 +466,8 @@ class MusicPlayerGUI:
             return
 
         self.current_user = self.users[username]
+        # admin works on the shared library; every other account gets its own session
+        self.player.switch_session(None if username == "admin" else username)
         if username == "admin":
             self.show_admin_page()
         else:
@@ -615,6 +480,7 @@ class MusicPlayerGUI:
             return
 
         self.current_user = self.users[username]
+        self.player.switch_session(None if username == "admin" else username)
 
         if username == "admin":
             self.show_admin_page()
@@ -630,6 +496,13 @@ class MusicPlayerGUI:
             pygame.mixer.music.stop()
         except Exception:
             pass
+        self.player.current_song = None
+        self.player.is_playing = False
+        self._prefetch = self._queued_song = self._queued = self._current_buffer = None
+        self._track_loaded = False
+
+        # save this user's session and go back to the default one
+        self.player.switch_session(None)
         
         # Stop progress updates
         if self._progress_update_job:
@@ -646,13 +519,6 @@ class MusicPlayerGUI:
         # Jika lagu ini sedang diputar → STOP
         if self.player.current_song == song and self.player.is_playing:
             self.stop_current()
-
-            # Kembalikan ikon semua tombol ke ▶
-            for btn in self.play_buttons.values():
-                try:
-                    btn.configure(text="▶")
-                except Exception:
-                    pass
             return
 
         # Jika lagu baru atau sedang pause → PLAY
@@ -674,7 +540,8 @@ class MusicPlayerGUI:
 
         ctk.CTkLabel(sidebar, text="⚡ Groovy", font=("Arial", 20, "bold"), text_color="#6366f1").pack(pady=(30, 50))
 
-        menus = [("📚 Library", self.admin_view_songs), ("➕ Add Song", self.admin_add_song), ("🚪 Logout", self.logout)]
+        menus = [("📚 Library", self.admin_view_songs), ("➕ Add Song", self.admin_add_song),
+                 ("📁 Import Folder", self.admin_import_folder), ("🚪 Logout", self.logout)]
         for text, cmd in menus:
             ctk.CTkButton(sidebar, text=text, width=170, height=38, font=("Arial", 13), corner_radius=8,
                         fg_color="transparent", hover_color="#1e293b", anchor="w", command=cmd).pack(pady=4, padx=15)
@@ -688,7 +555,9 @@ class MusicPlayerGUI:
         # Load songs di thread terpisah atau gunakan after
         self.window.after(10, self.admin_view_songs)
 
+    @METRICS.instrument("view.admin_view_songs")
     def admin_view_songs(self):
+        self._current_view = self.admin_view_songs
         for w in self.content.winfo_children():
             w.destroy()
 
@@ -701,6 +570,28 @@ class MusicPlayerGUI:
         admin_controls.pack(side="right")
         ctk.CTkButton(admin_controls, text="⏮ Prev", width=90, height=34, command=self.play_prev).pack(side="left", padx=4)
         ctk.CTkButton(admin_controls, text="⏭ Next", width=90, height=34, command=self.play_next).pack(side="left", padx=4)
+        self._sort_menu(admin_controls, self._admin_sort, self._set_admin_sort).pack(side="left", padx=(12, 4))
+
+        # structured filter, answered from the library indexes (see groovy.query)
+        filter_bar = ctk.CTkFrame(self.content, fg_color="transparent")
+        filter_bar.pack(fill="x", pady=(0, 5))
+        query_entry = ctk.CTkEntry(filter_bar, width=420, height=34,
+                                   placeholder_text="Filter: genre:pop artist:hindia year>=2000 duration<4:00")
+        if self._admin_query:
+            query_entry.insert(0, self._admin_query)
+        query_entry.pack(side="left", padx=(4, 8))
+
+        def apply_filter(query):
+            self._admin_query = query.strip()
+            self.admin_view_songs()
+
+        query_entry.bind("<Return>", lambda e: apply_filter(query_entry.get()))
+        ctk.CTkButton(filter_bar, text="Filter", width=70, height=34,
+                      command=lambda: apply_filter(query_entry.get())).pack(side="left", padx=(0, 6))
+        ctk.CTkButton(filter_bar, text="Clear", width=70, height=34, fg_color="#1e293b", hover_color="#334155",
+                      command=lambda: apply_filter("")).pack(side="left")
+        filter_status = ctk.CTkLabel(filter_bar, text="", font=("Arial", 11), text_color="#94a3b8")
+        filter_status.pack(side="left", padx=12)
 
         table = ctk.CTkFrame(self.content, fg_color="#0f0f0f", corner_radius=12)
         table.pack(fill="both", expand=True, pady=(5,0))
@@ -708,46 +599,130 @@ class MusicPlayerGUI:
         thead = ctk.CTkFrame(table, fg_color="transparent", height=45)
         thead.pack(fill="x", padx=15, pady=(15, 5))
 
-        cols = [("#", 0.06), ("Title", 0.25), ("Artist", 0.22), ("Genre", 0.15), ("Album", 0.22)]
+        cols = [("#", 0.06), ("Title", 0.24), ("Artist", 0.2), ("Genre", 0.14), ("Album", 0.14)]
         x = 0
         for text, w in cols:
             ctk.CTkLabel(thead, text=text, font=("Arial", 11, "bold"), text_color="#64748b", anchor="w").place(relx=x, rely=0.5, anchor="w")
             x += w
 
-        scroll = ctk.CTkScrollableFrame(table, fg_color="transparent")
-        scroll.pack(fill="both", expand=True, padx=10, pady=(0, 10))
-
-        for song in self.admin.list_songs():
-            row = ctk.CTkFrame(scroll, fg_color="#1a1a1a", height=50, corner_radius=8)
-            row.pack(fill="x", pady=2)
-
-            data = [(str(song.id), 0.06), (song.title[:22], 0.25), (song.artist[:18], 0.22), (song.genre, 0.15), (song.album[:18], 0.22)]
-            x = 0.02
-            for val, w in data:
-                ctk.CTkLabel(row, text=val, font=("Arial", 11), text_color="#e2e8f0", anchor="w").place(relx=x, rely=0.5, anchor="w")
-                x += w
-
-            play_btn = ctk.CTkButton(
-                row,
-                text="⏵",
-                width=60,
-                height=32,
-                fg_color="#6366f1",
-                hover_color="#4f46e5",
-                command=lambda s=song: self.admin_toggle_play(s)
-            )
-            play_btn.place(relx=0.86, rely=0.5, anchor="center")
+        self.songs_vm.reset()
+        songs = VirtualSongList(table, self._make_admin_row, self._bind_admin_row, row_height=54,
+                                empty_text="No matching songs" if self._admin_query else "Library is empty")
+        songs.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        items = self._ordered_library(self._admin_sort)
+        if self._admin_query:
+            field, descending = self.sort_choices[self._admin_sort]
+            try:
+                items = self.admin.list_songs(sort_by=field, descending=descending, query=self._admin_query)
+                filter_status.configure(text=f"{len(items)} of {self.player.library.size} songs")
+            except QueryError as e:
+                filter_status.configure(text=str(e), text_color="#ef4444")
+        songs.set_items(items)
+
+    def _make_admin_row(self, parent):
+        row = ctk.CTkFrame(parent, fg_color="#1a1a1a", height=50, corner_radius=8)
+        row.song_id = None
+        row.cells = []
+        x = 0.02
+        for w in (0.06, 0.24, 0.2, 0.14, 0.14):
+            label = ctk.CTkLabel(row, text="", font=("Arial", 11), text_color="#e2e8f0", anchor="w")
+            label.place(relx=x, rely=0.5, anchor="w")
+            row.cells.append(label)
+            x += w
 
-            self.admin_play_buttons[song.id] = play_btn
+        row.play_btn = ctk.CTkButton(row, text="⏵", width=60, height=32, fg_color="#6366f1", hover_color="#4f46e5")
+        row.play_btn.place(relx=0.8, rely=0.5, anchor="center")
+        row.edit_btn = ctk.CTkButton(row, text="Edit", width=60, height=32, font=("Arial", 10), fg_color="#1e293b",
+                                     hover_color="#334155")
+        row.edit_btn.place(relx=0.87, rely=0.5, anchor="center")
+        row.delete_btn = ctk.CTkButton(row, text="Delete", width=70, height=32, font=("Arial", 10), fg_color="#ef4444",
+                                       hover_color="#dc2626")
+        row.delete_btn.place(relx=0.94, rely=0.5, anchor="center")
+        return row
+
+    def _bind_admin_row(self, row, song, index):
+        values = (str(song.id), (song.title or "")[:22], (song.artist or "")[:18], song.genre or "", (song.album or "")[:14])
+        for label, val in zip(row.cells, values):
+            label.configure(text=val)
+        self.songs_vm.watch(row, song.id, lambda r=row, i=song.id: self._paint_admin_row(r, i))
+        self._paint_admin_row(row, song.id)
+        row.play_btn.configure(command=lambda s=song: self.admin_toggle_play(s))
+        row.edit_btn.configure(command=lambda s=song: self.admin_add_song(s))
+        row.delete_btn.configure(command=lambda s=song: self.admin_delete(s.id))
+
+    def _paint_admin_row(self, row, song_id):
+        row.play_btn.configure(text="⏸" if self.songs_vm.is_playing(song_id) else "⏵")
+
+    def admin_import_folder(self):
+        self._current_view = self.admin_import_folder
+        for w in self.content.winfo_children():
+            w.destroy()
 
-            ctk.CTkButton(row, text="Delete", width=70, height=32, font=("Arial", 10), fg_color="#ef4444",
-                         hover_color="#dc2626", command=lambda s=song: self.admin_delete(s.id)).place(relx=0.94, rely=0.5, anchor="center")
+        ctk.CTkLabel(self.content, text="Import Folder", font=("Arial", 32, "bold"),
+                    text_color="#ffffff").pack(pady=(0, 25))
 
-    def admin_add_song(self):
+        panel = ctk.CTkFrame(self.content, fg_color="#0f0f0f", corner_radius=12)
+        panel.pack(fill="x", padx=50, pady=20)
+
+        status = ctk.CTkLabel(panel, text="Pick a folder; every audio file below it is imported with its ID3 tags.",
+                              font=("Arial", 12), text_color="#94a3b8")
+        status.pack(padx=20, pady=(20, 10), anchor="w")
+        bar = ctk.CTkProgressBar(panel)
+        bar.set(0.0)
+        bar.pack(fill="x", padx=20, pady=10)
+
+        state = {"done": 0, "total": 0, "records": None, "error": None}
+
+        def work(root):
+            try:
+                state["records"] = self.admin.scan_folder(
+                    root, progress=lambda done, total: state.update(done=done, total=total))
+            except Exception as e:
+                state["error"] = e
+
+        def poll(thread):
+            # Tk is not thread-safe: the worker only writes `state`, we read it here.
+            # Keep polling after the admin leaves this page, or the scan is lost.
+            visible = status.winfo_exists()
+            if visible and state["total"]:
+                bar.set(state["done"] / state["total"])
+                status.configure(text=f"Reading tags... {state['done']} / {state['total']}")
+            if thread.is_alive():
+                self.window.after(100, poll, thread)
+                return
+            if state["error"] is not None:
+                messagebox.showerror("Error", f"Import failed:\n{state['error']}")
+                return
+            added = self.admin.add_songs(state["records"] or [])
+            if visible:
+                bar.set(1.0)
+                messagebox.showinfo("Import", f"{added} songs imported.")
+                self.admin_view_songs()
+            elif self._current_view == self.admin_view_songs:
+                self.admin_view_songs()
+
+        def choose():
+            root = filedialog.askdirectory(title="Select Music Folder")
+            if not root:
+                return
+            browse.configure(state="disabled")
+            status.configure(text="Scanning folder...")
+            thread = threading.Thread(target=work, args=(root,), daemon=True)
+            thread.start()
+            poll(thread)
+
+        browse = ctk.CTkButton(panel, text="Choose Folder", width=180, height=42, font=("Arial", 14),
+                               fg_color="#6366f1", hover_color="#4f46e5", command=choose)
+        browse.pack(padx=20, pady=(10, 20), anchor="e")
+
+    def admin_add_song(self, song=None):
+        """Song form; given a song it edits that song instead of adding one."""
+        self._current_view = self.admin_add_song if song is None else (lambda: self.admin_add_song(song))
+        self._editing_id = song.id if song is not None else None
         for w in self.content.winfo_children():
             w.destroy()
 
-        ctk.CTkLabel(self.content, text="Add New Song", font=("Arial", 32, "bold"),
+        ctk.CTkLabel(self.content, text="Add New Song" if song is None else "Edit Song", font=("Arial", 32, "bold"),
                     text_color="#ffffff").pack(pady=(0, 25))
 
         form = ctk.CTkFrame(self.content, fg_color="#0f0f0f", corner_radius=12)
@@ -801,6 +776,12 @@ class MusicPlayerGUI:
             row += 1
 
 
+        if song is not None:
+            values = (song.title, song.artist, song.genre, song.album, song.year, song.duration, song.file_path)
+            for entry, value in zip(self.entries.values(), values):
+                if value not in (None, ""):
+                    entry.insert(0, str(value))
+
         ctk.CTkButton(form, text="Save Song", width=180, height=42,
                     font=("Arial", 14), fg_color="#6366f1",
                     hover_color="#4f46e5", command=self.save_song)\
@@ -810,55 +791,17 @@ class MusicPlayerGUI:
         # Jika lagu ini yang sedang dimainkan
         if self.player.current_song == song:
 
-            # Jika sedang bermain → PAUSE
+            # Jika sedang bermain → PAUSE, jika sedang PAUSE → RESUME
             if self.player.is_playing:
-                try:
-                    pygame.mixer.music.pause()
-                except Exception:
-                    pass
-                self.player.is_playing = False
-
-                # ubah tombol jadi play (resume)
-                if song.id in self.admin_play_buttons:
-                    try:
-                        self.admin_play_buttons[song.id].configure(text="⏵")
-                    except Exception:
-                        pass
-                return
-
-            # Jika sedang PAUSE → RESUME
+                self.pause_current()
             else:
-                try:
-                    pygame.mixer.music.unpause()
-                except Exception:
-                    pass
-                self.player.is_playing = True
-
-                if song.id in self.admin_play_buttons:
-                    try:
-                        self.admin_play_buttons[song.id].configure(text="⏸")
-                    except Exception:
-                        pass
-                return
+                self.resume_current()
+            return
 
         # Jika lagu belum dimainkan sama sekali → PLAY LAGU
         # set player mode and ordering so next/prev behave as admin expects (library asc)
         self.play_song(song, "library")
-        self.player.list_order = "asc"
-
-        # set semua tombol admin kembali normal
-        for btn in self.admin_play_buttons.values():
-            try:
-                btn.configure(text="⏵")
-            except Exception:
-                pass
-
-        # tombol lagu yang dimainkan jadi pause
-        if song.id in self.admin_play_buttons:
-            try:
-                self.admin_play_buttons[song.id].configure(text="⏸")
-            except Exception:
-                pass
+        self._set_order(self._admin_sort)
 
 
     def save_song(self):
@@ -870,7 +813,22 @@ class MusicPlayerGUI:
         duration = self.entries["duration"].get().strip()
         file_path = self.entries["file"].get().strip()
 
-
+        if not title:
+            messagebox.showerror("Error", "Title is required.")
+            return
+        if year and not year.isdigit():
+            messagebox.showerror("Error", "Year must be a number.")
+            return
+        values = (title, artist, genre, album, year, duration or None, file_path or None)
+        if self._editing_id is None:
+            ok, message = self.admin.add_song(*values)
+        else:
+            ok, message = self.admin.edit_song(self._editing_id, *values)
+        if not ok:
+            messagebox.showerror("Error", message)
+            return
+        messagebox.showinfo("Success", message)
+        self.admin_view_songs()
 
     def admin_delete(self, song_id):
         if messagebox.askyesno("Confirm", "Delete this song?"):
@@ -898,6 +856,7 @@ class MusicPlayerGUI:
             ("🏠 Home", self.user_home),
             ("🔍 Search", self.user_search),
             ("📝 Playlist", self.user_playlist),
+            ("🎶 Queue", self.user_queue),
             ("⭐ Favorites", self.user_favorites),
             ("📜 History", self.user_history)
         ]
@@ -926,6 +885,7 @@ class MusicPlayerGUI:
             corner_radius=20, fg_color="#1a1a1a", border_width=0
         )
         self.search_entry.pack(side="left")
+        self.search_entry.bind("<KeyRelease>", self._on_search_key)
 
         # Logout button (top-right)
         logout_btn = ctk.CTkButton(
@@ -940,7 +900,8 @@ class MusicPlayerGUI:
         user_btn.pack(side="right", padx=(0, 10))
 
         #  CONTENT AREA 
-        self.content = ctk.CTkScrollableFrame(self.main_content, fg_color="transparent")
+        # plain frame: each view packs its own VirtualSongList that scrolls itself
+        self.content = ctk.CTkFrame(self.main_content, fg_color="transparent")
         self.content.pack(fill="both", expand=True, padx=25, pady=(10, 120))
 
         # = PLAYER BAR =
@@ -998,94 +959,273 @@ class MusicPlayerGUI:
                                  fg_color="#1e293b", hover_color="#4f46e5", command=self.play_next)
         btn_next.pack(side="left", padx=8)
 
-    def create_song_card(self, parent, song):
+    def _make_song_row(self, parent):
         card = ctk.CTkFrame(parent, fg_color="#1a1a1a", corner_radius=8, height=70)
-        card.pack(fill="x", pady=3)
+        card.pack_propagate(False)
+        card.song_id = None
 
         info = ctk.CTkFrame(card, fg_color="transparent")
         info.pack(side="left", fill="both", expand=True, padx=15, pady=10)
 
-        ctk.CTkLabel(info, text=song.title, font=("Arial", 13, "bold"), text_color="#ffffff", anchor="w").pack(anchor="w")
-        ctk.CTkLabel(info, text=f"{song.artist} • {song.genre}", font=("Arial", 10), text_color="#94a3b8", anchor="w").pack(anchor="w")
+        card.title_label = ctk.CTkLabel(info, text="", font=("Arial", 13, "bold"), text_color="#ffffff", anchor="w")
+        card.title_label.pack(anchor="w")
+        card.sub_label = ctk.CTkLabel(info, text="", font=("Arial", 10), text_color="#94a3b8", anchor="w")
+        card.sub_label.pack(anchor="w")
 
         btns = ctk.CTkFrame(card, fg_color="transparent")
         btns.pack(side="right", padx=10)
 
-        fav_text = "⭐" if song.id in self.player.favorites else "☆"
-        ctk.CTkButton(btns, text=fav_text, width=35, height=35, font=("Arial", 14), fg_color="transparent", hover_color="#6366f1", command=lambda s=song: self._toggle_fav_and_refresh(s)).pack(side="left", padx=2)
+        card.fav_btn = ctk.CTkButton(btns, text="☆", width=35, height=35, font=("Arial", 14), fg_color="transparent", hover_color="#6366f1")
+        card.fav_btn.pack(side="left", padx=2)
 
         # Tombol Play (bisa berubah ikon)
-        play_btn = ctk.CTkButton(
-            btns, text="▶", width=35, height=35, font=("Arial", 12),
-            fg_color="#6366f1", hover_color="#4f46e5",
-            command=lambda s=song: self.toggle_play(s)
-        )
-        play_btn.pack(side="left", padx=2)
-
-        # simpan tombol di dict supaya bisa diganti ikon
-        self.play_buttons[song.id] = play_btn
-
-        ctk.CTkButton(btns, text="+", width=35, height=35, font=("Arial", 14), fg_color="#1e293b", hover_color="#334155", command=lambda s=song: self.add_playlist_and_notify(s)).pack(side="left", padx=2)
+        card.play_btn = ctk.CTkButton(btns, text="▶", width=35, height=35, font=("Arial", 12),
+                                      fg_color="#6366f1", hover_color="#4f46e5")
+        card.play_btn.pack(side="left", padx=2)
+
+        card.add_btn = ctk.CTkButton(btns, text="+", width=35, height=35, font=("Arial", 14), fg_color="#1e293b", hover_color="#334155")
+        card.add_btn.pack(side="left", padx=2)
+        card.queue_btn = ctk.CTkButton(btns, text="⤵", width=35, height=35, font=("Arial", 14), fg_color="#1e293b", hover_color="#334155")
+        card.queue_btn.pack(side="left", padx=2)
+        return card
+
+    def _bind_song_row(self, card, song, index):
+        card.title_label.configure(text=song.title)
+        card.sub_label.configure(text=f"{song.artist} • {song.genre}")
+        # row is recycled while scrolling: repaint follows whichever song it shows
+        self.songs_vm.watch(card, song.id, lambda c=card, i=song.id: self._paint_song_row(c, i))
+        self._paint_song_row(card, song.id)
+
+        card.fav_btn.configure(command=lambda s=song: self._toggle_fav_and_refresh(s))
+        card.play_btn.configure(command=lambda s=song: self.toggle_play(s))
+        card.add_btn.configure(command=lambda s=song: self.add_playlist_and_notify(s))
+        card.queue_btn.configure(command=lambda s=song: self.enqueue_and_notify(s))
+
+    def _paint_song_row(self, card, song_id):
+        card.fav_btn.configure(text="⭐" if self.songs_vm.is_favorite(song_id) else "☆")
+        card.play_btn.configure(text="⏸" if self.songs_vm.is_playing(song_id) else "▶")
+
+    def _song_list(self, parent, songs, empty_text=""):
+        """Pack a virtualized list of song cards filling the rest of ``parent``."""
+        self.songs_vm.reset()
+        song_list = VirtualSongList(parent, self._make_song_row, self._bind_song_row, empty_text=empty_text)
+        song_list.pack(fill="both", expand=True)
+        song_list.set_items(songs)
+        return song_list
 
     # --------------------------------------------------
     # USER PAGE SCREENS (HOME, SEARCH, PLAYLIST, FAVORITE, HISTORY)
     # --------------------------------------------------
+    @METRICS.instrument("view.user_home")
     def user_home(self):
-        # Trending: show newest first (desc). We set player.list_order accordingly.
+        # Trending: newest first by default, or any order from the sort menu
+        self._current_view = self.user_home
         for w in self.content.winfo_children():
             w.destroy()
-        ctk.CTkLabel(self.content, text="Trending Now", font=("Arial", 28, "bold"), text_color="#ffffff").pack(anchor="w", pady=(10, 20))
-        # AMBIL SEMUA LAGU & URUTKAN BERDASARKAN YANG TERBARU
-        # set ordering so Next will go to visual "below" item
+        header = ctk.CTkFrame(self.content, fg_color="transparent")
+        header.pack(fill="x", pady=(10, 20))
+        ctk.CTkLabel(header, text="Trending Now", font=("Arial", 28, "bold"), text_color="#ffffff").pack(side="left")
+        self._sort_menu(header, self._home_sort, self._set_home_sort).pack(side="right")
+
+        songs = self._ordered_library(self._home_sort)
+        self._song_list(self.content, songs, "Library is empty")
+
+    # --- library ordering (sort menus) ---
+    def _sort_menu(self, parent, current, command):
+        menu = ctk.CTkOptionMenu(parent, values=list(self.sort_choices), width=130, height=32, command=command)
+        menu.set(current)
+        return menu
+
+    def _set_order(self, choice):
+        """Make next/prev walk the library the way ``choice`` lists it."""
+        field, descending = self.sort_choices[choice]
         self.player.current_mode = "library"
-        self.player.list_order = "desc"
+        self.player.list_order = "desc" if descending else "asc"
+        self.player.sort_by = field
+
+    def _ordered_library(self, choice):
+        """The library as a sequence in ``choice`` order; sorted orders are views, not copies."""
+        self._set_order(choice)
+        field, descending = self.sort_choices[choice]
+        if field is not None:
+            return self.player.sorted_index(field).view(reverse=descending)
+        songs = self.admin.list_songs()
+        if descending:
+            songs.reverse()
+        return songs
 
-        songs = list(reversed(self.player.library.get_all()))  # newest first for display
-        for song in songs:
-            self.create_song_card(self.content, song)
+    def _set_home_sort(self, choice):
+        self._home_sort = choice
+        self.user_home()
+
+    def _set_admin_sort(self, choice):
+        self._admin_sort = choice
+        self.admin_view_songs()
 
     def user_search(self):
+        self._current_view = self.user_search
         for w in self.content.winfo_children():
             w.destroy()
         ctk.CTkLabel(self.content, text="Search", font=("Arial", 28, "bold"), text_color="#ffffff").pack(anchor="w", pady=(10, 15))
         search_frame = ctk.CTkFrame(self.content, fg_color="transparent")
         search_frame.pack(fill="x", pady=10)
 
-        entry = ctk.CTkEntry(search_frame, width=400, height=40, placeholder_text="Search...", font=("Arial", 12), corner_radius=8, fg_color="#1a1a1a")
-        entry.pack(side="left", padx=(0, 10))
+        # the topbar entry is the search box; results update while typing
+        self._search_status = ctk.CTkLabel(search_frame, text="Type in the search bar above", font=("Arial", 12), text_color="#94a3b8")
+        self._search_status.pack(side="left", padx=(0, 10))
+
+        self._search_results = self._song_list(self.content, [])
 
-        result = ctk.CTkFrame(self.content, fg_color="transparent")
-        result.pack(fill="both", expand=True, pady=10)
+        def queue_all():
+            if self._search_results.items:
+                n = self.user.enqueue_many([s.id for s in self._search_results.items])
+                messagebox.showinfo("Queue", f"{n} songs added to queue!")
 
-        def do_search():
-            for w in result.winfo_children():
-                w.destroy()
-            keyword = entry.get()
-            if keyword:
-                songs = self.user.search(keyword)
-                # for search results, set ordering to asc (natural)
-                self.player.current_mode = "library"
-                self.player.list_order = "asc"
-                for s in songs:
-                    self.create_song_card(result, s)
+        ctk.CTkButton(search_frame, text="⤵ Queue all", width=110, height=40, fg_color="#1e293b", hover_color="#334155", command=queue_all).pack(side="right")
+        ctk.CTkButton(search_frame, text="Search", width=100, height=40, fg_color="#6366f1", hover_color="#4f46e5",
+                      command=lambda: self._start_search(self.search_entry.get())).pack(side="right", padx=(0, 10))
+        self.search_entry.focus_set()
 
-        ctk.CTkButton(search_frame, text="Search", width=100, height=40, fg_color="#6366f1", hover_color="#4f46e5", command=do_search).pack(side="left")
+    # --- search as you type ---
+    def _on_search_key(self, event):
+        # arrows, Shift, Ctrl... fire KeyRelease too; only a changed text searches again
+        if self.search_entry.get().strip() == self._search_text:
+            return
+        # debounce: only search once typing pauses for a moment
+        if self._search_job is not None:
+            self.window.after_cancel(self._search_job)
+        self._search_job = self.window.after(150, lambda: self._start_search(self.search_entry.get()))
+
+    def _start_search(self, keyword):
+        if self._search_job is not None:
+            self.window.after_cancel(self._search_job)
+        self._search_job = None
+        keyword = keyword.strip()
+        self._search_text = keyword
+        if self._current_view != self.user_search:
+            if not keyword:
+                return
+            self.user_search()
+        if not keyword:
+            self.search_worker.cancel()
+            self._search_generation = 0
+            self._search_results.set_items([])
+            self._search_status.configure(text="Type in the search bar above")
+            return
+        # for search results, set ordering to asc (natural)
+        self.player.current_mode = "library"
+        self.player.list_order = "asc"
+        self.player.sort_by = None
+        self._search_status.configure(text="Searching...")
+        self._search_generation = self.search_worker.submit(keyword)
+        self._poll_search(self._search_generation, fresh=True)
+
+    def _poll_search(self, generation, fresh):
+        # Tk is not thread-safe: the worker only fills the queue, we drain it here
+        if generation != self._search_generation or not self._search_results.winfo_exists():
+            return
+        results = self._search_results
+        received = done = False
+        while not done:
+            try:
+                batch_generation, songs, done = self.search_worker.results.get_nowait()
+            except Empty:
+                break
+            if batch_generation != generation:
+                done = False   # leftover of a cancelled search
+                continue
+            if fresh:
+                # keep the previous results on screen until the new ones arrive
+                results.items = []
+                results.first = 0
+                fresh = False
+            results.items.extend(songs)
+            received = True
+        if received:
+            results.refresh()
+        if done:
+            self._search_status.configure(text=f"{len(results.items)} results")
+            return
+        self.window.after(30, self._poll_search, generation, fresh)
 
     def user_playlist(self):
+        self._current_view = self.user_playlist
         for w in self.content.winfo_children():
             w.destroy()
-        ctk.CTkLabel(self.content, text="My Playlist", font=("Arial", 28, "bold"), text_color="#ffffff").pack(anchor="w", pady=(10, 20))
-        songs = self.player.playlist.get_all()
+        header = ctk.CTkFrame(self.content, fg_color="transparent")
+        header.pack(fill="x", pady=(10, 20))
+        ctk.CTkLabel(header, text="Playlists", font=("Arial", 28, "bold"), text_color="#ffffff").pack(side="left")
+
+        def choose(name):
+            self.user.select_playlist(name)
+            self.user_playlist()
+
+        def create():
+            name = ctk.CTkInputDialog(text="Playlist name:", title="New Playlist").get_input()
+            if name is None:
+                return
+            if self.user.create_playlist(name):
+                choose(name.strip())
+            else:
+                messagebox.showerror("Error", "Playlist name is empty or already exists.")
+
+        def delete():
+            name = self.player.playlists.active_name
+            if messagebox.askyesno("Delete", f"Delete playlist '{name}'?"):
+                if not self.user.delete_playlist(name):
+                    messagebox.showerror("Error", "This playlist cannot be deleted.")
+                self.user_playlist()
+
+        ctk.CTkButton(header, text="Delete", width=80, height=32, fg_color="#1e293b", hover_color="#334155",
+                      command=delete).pack(side="right")
+        ctk.CTkButton(header, text="+ New", width=80, height=32, fg_color="#6366f1", hover_color="#4f46e5",
+                      command=create).pack(side="right", padx=(0, 10))
+        selector = ctk.CTkOptionMenu(header, values=self.user.get_playlists(), width=200, height=32, command=choose)
+        selector.set(self.player.playlists.active_name)
+        selector.pack(side="right", padx=(0, 10))
+
+        songs = self.user.get_playlist()
         # show playlist in asc order (as stored)
         self.player.current_mode = "playlist"
         self.player.list_order = "asc"
-        if not songs:
-            ctk.CTkLabel(self.content, text="Playlist is empty", font=("Arial", 13), text_color="#64748b").pack(pady=30)
-        else:
-            for song in songs:
-                self.create_song_card(self.content, song)
+        self.player.sort_by = None
+        self._song_list(self.content, songs, "Playlist is empty")
+
+    def user_queue(self):
+        self._current_view = self.user_queue
+        for w in self.content.winfo_children():
+            w.destroy()
+        header = ctk.CTkFrame(self.content, fg_color="transparent")
+        header.pack(fill="x", pady=(10, 20))
+        ctk.CTkLabel(header, text="Up Next", font=("Arial", 28, "bold"), text_color="#ffffff").pack(side="left")
+        ctk.CTkButton(header, text="Clear", width=80, height=32, fg_color="#1e293b", hover_color="#334155",
+                      command=lambda: (self.player.queue.clear(), self.user_queue())).pack(side="right")
+        queued = VirtualSongList(self.content, self._make_queue_row, self._bind_queue_row, row_height=62,
+                                 empty_text="Queue is empty")
+        queued.pack(fill="both", expand=True)
+        queued.set_items(self.user.get_queue())
+
+    def _make_queue_row(self, parent):
+        row = ctk.CTkFrame(parent, fg_color="#1a1a1a", corner_radius=8, height=56)
+        row.pack_propagate(False)
+        row.title_label = ctk.CTkLabel(row, text="", font=("Arial", 13, "bold"), text_color="#ffffff", anchor="w")
+        row.title_label.pack(side="left", padx=15, pady=12)
+        row.artist_label = ctk.CTkLabel(row, text="", font=("Arial", 10), text_color="#94a3b8")
+        row.artist_label.pack(side="left")
+        row.remove_btn = ctk.CTkButton(row, text="✕", width=35, height=35, fg_color="#1e293b", hover_color="#ef4444")
+        row.remove_btn.pack(side="right", padx=(2, 10))
+        row.front_btn = ctk.CTkButton(row, text="⏫", width=35, height=35, fg_color="#1e293b", hover_color="#6366f1")
+        row.front_btn.pack(side="right", padx=2)
+        return row
+
+    def _bind_queue_row(self, row, song, pos):
+        row.title_label.configure(text=f"{pos + 1}.  {song.title}")
+        row.artist_label.configure(text=song.artist)
+        row.remove_btn.configure(command=lambda p=pos: (self.user.remove_from_queue(p), self.user_queue()))
+        row.front_btn.configure(command=lambda p=pos: (self.user.move_to_front(p), self.user_queue()))
 
     def user_favorites(self):
+        self._current_view = self.user_favorites
         for w in self.content.winfo_children():
             w.destroy()
         ctk.CTkLabel(self.content, text="Favorites", font=("Arial", 28, "bold"), text_color="#ffffff").pack(anchor="w", pady=(10, 20))
@@ -1093,13 +1233,11 @@ class MusicPlayerGUI:
         # favorites view -> asc
         self.player.current_mode = "library"
         self.player.list_order = "asc"
-        if not favs:
-            ctk.CTkLabel(self.content, text="No favorites yet", font=("Arial", 13), text_color="#64748b").pack(pady=30)
-        else:
-            for s in favs:
-                self.create_song_card(self.content, s)
+        self.player.sort_by = None
+        self._song_list(self.content, favs, "No favorites yet")
 
     def user_history(self):
+        self._current_view = self.user_history
         for w in self.content.winfo_children():
             w.destroy()
         ctk.CTkLabel(self.content, text="Recently Played", font=("Arial", 28, "bold"), text_color="#ffffff").pack(anchor="w", pady=(10, 20))
@@ -1107,60 +1245,70 @@ class MusicPlayerGUI:
         # history view -> asc
         self.player.current_mode = "library"
         self.player.list_order = "asc"
-        if not history:
-            ctk.CTkLabel(self.content, text="No history yet", font=("Arial", 13), text_color="#64748b").pack(pady=30)
-        else:
-            for s in history:
-                self.create_song_card(self.content, s)
+        self.player.sort_by = None
+        self._song_list(self.content, history, "No history yet")
 
     # --- small UI helper wrappers that call controllers ---
     def _toggle_fav_and_refresh(self, song):
         self.user.toggle_favorite(song.id)
-        # refresh whichever view is visible by rebuilding home (safe default)
-        self.user_home()
+        # only the star(s) of this song change; the current view stays as it is
+        self.songs_vm.changed(song.id)
 
     def add_playlist_and_notify(self, song):
         added = self.user.add_to_playlist(song.id)
         if added:
-            # simpan playlist permanen setiap kali diubah
-            try:
-                self.player.save_playlist()
-            except Exception:
-                pass
-            messagebox.showinfo("Success", f"'{song.title}' added to playlist!")
+            messagebox.showinfo("Success", f"'{song.title}' added to {self.player.playlists.active_name}!")
         else:
             messagebox.showerror("Error", "Cannot add to playlist.")
 
+    def enqueue_and_notify(self, song):
+        if self.user.enqueue(song.id):
+            messagebox.showinfo("Queue", f"'{song.title}' added to queue!")
+        else:
+            messagebox.showerror("Error", "Cannot add to queue.")
+
     # PLAYBACK CONTROL HANDLERS (PLAY, NEXT, PREV, STOP)
    
+    @METRICS.instrument("play_song")
     def play_song(self, song, mode):
         # single consolidated play_song method
+        with METRICS.timed("play_song.probe"):
+            length = self._get_song_length_seconds(song)
+        self._set_now_playing(song, mode, length)
+
+        # ACTUAL MUSIC PLAYBACK
+        # load() also drops whatever was queued in the mixer
+        self._queued_song = None
+        self._current_buffer = None
+        self._track_loaded = False
+        try:
+            if song.file_path:
+                if not os.path.isfile(song.file_path):
+                    raise FileNotFoundError(f"File not found: {song.file_path}")
+                with METRICS.timed("play_song.load"):
+                    self._ensure_mixer()
+                    pygame.mixer.music.load(song.file_path)
+                self._discard_end_events()
+                with METRICS.timed("play_song.start"):
+                    pygame.mixer.music.play()
+                self._track_loaded = True
+            else:
+                messagebox.showwarning("No File", "This song has no audio file.")
+        except Exception as e:
+            messagebox.showerror("Error", f"Cannot play song:\n{e}")
+
+        # start progress updater
+        self._plan_next()
+        self._start_progress_updater()
+
+    def _set_now_playing(self, song, mode, length):
+        """State and labels for a song that just started (by load or from the mixer queue)."""
+        previous = self.player.current_song
         self.player.current_song = song
         self.player.is_playing = True
 
-        # Reset semua tombol ke ▶
-        for btn in self.play_buttons.values():
-            try:
-                btn.configure(text="▶")
-            except Exception:
-                pass
-        for btn in self.admin_play_buttons.values():
-            try:
-                btn.configure(text="⏵")
-            except Exception:
-                pass
-
-        # Tombol lagu yang sedang diputar berubah jadi ⏸ (if exists)
-        if song.id in self.play_buttons:
-            try:
-                self.play_buttons[song.id].configure(text="⏸")
-            except Exception:
-                pass
-        if song.id in self.admin_play_buttons:
-            try:
-                self.admin_play_buttons[song.id].configure(text="⏸")
-            except Exception:
-                pass
+        # only the rows of the old and new song change icon
+        self.songs_vm.changed(*{s.id for s in (previous, song) if s is not None})
 
         # track mode & history
         self.player.current_mode = mode
@@ -1178,28 +1326,66 @@ class MusicPlayerGUI:
             except Exception:
                 pass
 
-        
-        # ACTUAL MUSIC PLAYBACK
-        # compute length
-        length = self._get_song_length_seconds(song)
         self.current_song_length = length if length else 0.0
         # set total time label
         self._set_progress_total_label(self.current_song_length)
         # reset progress
         self.progress_value = 0.0
+        self._last_elapsed = 0.0
+
+    # --- gapless playback ---
+    def _plan_next(self):
+        """Start reading ahead the song that will follow the current one."""
+        if self.player.current_song is None:
+            return
+        nxt = self.player.peek_next_song()
+        if self._prefetch is not None and self._prefetch[0] is nxt:
+            return
+        # a song queued for an older plan is dropped at the transition, see _advance_to_queued
+        self._prefetch = None
+        if nxt is not None and nxt.file_path:
+            self._prefetch = (nxt, self._prefetcher.submit(self._read_ahead, nxt))
+
+    def _read_ahead(self, song):
+        # runs on the prefetch thread: disk read + header probe only, no Tk calls
+        with open(song.file_path, "rb") as f:
+            buffer = io.BytesIO(f.read())
+        return buffer, self._get_song_length_seconds(song)
+
+    def _queue_prefetched(self):
+        """Hand a finished read-ahead to the mixer so it starts without a gap."""
+        if self._prefetch is None:
+            return
+        song, future = self._prefetch
+        if self._queued_song is song or not future.done():
+            return
         try:
-            if song.file_path:
-                if not os.path.isfile(song.file_path):
-                    raise FileNotFoundError(f"File not found: {song.file_path}")
-                pygame.mixer.music.load(song.file_path)
-                pygame.mixer.music.play()
-            else:
-                messagebox.showwarning("No File", "This song has no audio file.")
+            buffer, length = future.result()
+            pygame.mixer.music.queue(buffer, os.path.splitext(song.file_path)[1].lstrip("."))
         except Exception as e:
-            messagebox.showerror("Error", f"Cannot play song:\n{e}")
+            METRICS.count("playback.prefetch_failures")
+            print("Failed to prefetch next song:", e)
+            self._prefetch = None   # play_song will load it from disk at the end
+            return
+        self._queued_song = song
+        self._queued = (buffer, length)
 
-        # start progress updater
-        self._start_progress_updater()
+    def _advance_to_queued(self):
+        """The mixer moved on to the queued song: commit the same step in the player."""
+        song, (buffer, length) = self._queued_song, self._queued
+        self._queued_song = self._queued = self._prefetch = None
+        nxt = self.player.next_song()
+        if nxt is not song:
+            # the plan changed after queueing (e.g. queue edited at the last moment)
+            if nxt:
+                self.play_song(nxt, self.player.current_mode)
+            else:
+                self.stop_current()
+            return
+        self._current_buffer = buffer
+        self._set_now_playing(song, self.player.current_mode, length)
+        METRICS.count("playback.gapless_transitions")
+        self._plan_next()
 
     def play_prev(self):
         # Prev should go to previous item in visual list (which may be above)
@@ -1218,16 +1404,26 @@ class MusicPlayerGUI:
             self.play_song(self.player.current_song, self.player.current_mode)
 
     def pause_current(self):
+        if not pygame.mixer.get_init():
+            return   # nothing has played yet (the mixer starts on first play)
         try:
             pygame.mixer.music.pause()
             self.player.is_playing = False
+            if self.player.current_song is not None:
+                self.songs_vm.changed(self.player.current_song.id)
         except Exception as e:
             messagebox.showerror("Error", f"Cannot pause: {e}")
 
     def resume_current(self):
+        if not pygame.mixer.get_init():
+            return   # nothing has played yet (the mixer starts on first play)
         try:
             pygame.mixer.music.unpause()
             self.player.is_playing = True
+            if self.player.current_song is not None:
+                self.songs_vm.changed(self.player.current_song.id)
+            # the tick stops while paused
+            self._start_progress_updater()
         except Exception as e:
             messagebox.showerror("Error", f"Cannot resume: {e}")
 
@@ -1237,8 +1433,15 @@ class MusicPlayerGUI:
         except Exception:
             pass
 
+        previous = self.player.current_song
         self.player.is_playing = False
         self.player.current_song = None
+        if previous is not None:
+            self.songs_vm.changed(previous.id)
+        # stop() also empties the mixer queue
+        self._prefetch = self._queued_song = self._queued = self._current_buffer = None
+        self._track_loaded = False
+        self._discard_end_events()
 
         # Reset UI
         if hasattr(self, "now_playing") and self.now_playing is not None:
@@ -1266,17 +1469,12 @@ class MusicPlayerGUI:
     # Progress helpers
 
     def _get_song_length_seconds(self, song: Song):
-        # Try pygame Sound if file exists (gives accurate length)
+        # Read the length from the file headers (cached by path/size/mtime)
         try:
-            if song.file_path and os.path.isfile(song.file_path):
-                try:
-                    snd = pygame.mixer.Sound(song.file_path)
-                    length = snd.get_length()
-                    # release Sound object
-                    del snd
+            if song.file_path:
+                length = self.player.metadata.duration(song.file_path)
+                if length:
                     return float(length)
-                except Exception:
-                    pass
             # fallback: parse song.duration string like "3:45" or "03:45"
             if song.duration:
                 parts = song.duration.strip().split(":")
@@ -1314,7 +1512,9 @@ class MusicPlayerGUI:
         # schedule update
         self._update_progress()
 
+    @METRICS.instrument("progress_tick")
     def _update_progress(self):
+        self._progress_update_job = None
         # compute elapsed
         elapsed = 0.0
         try:
@@ -1324,43 +1524,180 @@ class MusicPlayerGUI:
             # There are platform quirks: when music finished, get_pos() may be -1 or 0.
         except Exception:
             elapsed = 0.0
+        try:
+            busy = pygame.mixer.music.get_busy()
+        except Exception:
+            busy = False
+
+        if self._track_ended(busy, elapsed):
+            self._on_track_end(busy)
+            # play_song restarted the tick, or playback stopped
+            if self._progress_update_job is not None or self.player.current_song is None:
+                return
+            elapsed = 0.0
+        self._last_elapsed = elapsed
 
         # If we can get total length from property
         total = self.current_song_length if self.current_song_length else 0.0
+        hidden = self._window_hidden()
 
-        # update UI labels
-        self._set_progress_elapsed_label(elapsed)
-        if total > 0:
-            fraction = min(1.0, elapsed / total)
-        else:
-            fraction = 0.0
+        # update UI labels (nobody sees them while minimized)
+        if not hidden:
+            self._set_progress_elapsed_label(elapsed)
+            try:
+                self.progress_bar.set(min(1.0, elapsed / total) if total > 0 else 0.0)
+            except Exception:
+                pass
+
+        # paused or idle: no tick until resume_current / play_song start it again
+        if not self.player.is_playing:
+            return
+
+        # keep the read-ahead in step with queue / list edits
+        self._plan_next()
+        self._queue_prefetched()
+
+        # schedule next update: slower while hidden, but wake up right at the end of the song
+        delay = 2000 if hidden else 500
+        if total > elapsed:
+            delay = min(delay, int((total - elapsed) * 1000) + 50)
+        self._progress_update_job = self.window.after(max(delay, 50), self._update_progress)
+
+    # --- end of track ---
+    def _ensure_mixer(self):
+        """Start the audio device on the first play, not at import / window start."""
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()   # raises when there is no audio device; play_song reports it
+            self._end_event = self._init_end_event()
+
+    def _init_end_event(self):
+        """Ask the mixer to post an event when a track ends; None means poll get_busy() instead."""
         try:
-            self.progress_bar.set(fraction)
-        except Exception:
-            pass
+            # pygame's event queue lives in the video subsystem; no window is opened
+            pygame.display.init()
+            event = pygame.USEREVENT + 1
+            pygame.mixer.music.set_endevent(event)
+            return event
+        except Exception as e:
+            print("Mixer end events unavailable, polling instead:", e)
+            return None
+
+    def _discard_end_events(self):
+        # stop() posts an end event too; it must not advance the next song
+        if self._end_event is not None:
+            try:
+                pygame.event.get()
+            except Exception:
+                pass
 
-        # If playback ended (pygame reports not busy) and fraction >= .99 -> auto next
+    def _track_ended(self, busy, elapsed):
+        if self._end_event is not None:
+            try:
+                return any(e.type == self._end_event for e in pygame.event.get())
+            except Exception:
+                return False
+        # polling fallback: the queued song starting resets get_pos(), a finished one stops the mixer
+        if busy:
+            return self._queued_song is not None and elapsed + 0.25 < self._last_elapsed
+        return self._track_loaded and self.player.is_playing
+
+    def _on_track_end(self, busy):
+        if busy:
+            # the mixer is already playing the queued song
+            if self._queued_song is not None:
+                self._advance_to_queued()
+            return
+        self._track_loaded = False
+        METRICS.count("playback.track_ends")
+        nxt = self.player.next_song()
+        if nxt:
+            self.play_song(nxt, self.player.current_mode)
+        else:
+            self.stop_current()
+
+    def _window_hidden(self):
         try:
-            busy = pygame.mixer.music.get_busy()
+            return self.window.state() in ("iconic", "withdrawn")
         except Exception:
-            busy = False
+            return False
 
-        # If not busy but elapsed > 0 and fraction near 1 => ended
-        if not busy and total > 0 and fraction >= 0.98:
-            # move to next
-            nxt = self.player.next_song()
-            if nxt:
-                # small delay to avoid immediate re-entrancy
-                self.window.after(200, lambda: self.play_song(nxt, self.player.current_mode))
-                return
-            else:
-                # reset
-                self.stop_current()
-                return
+    def _on_window_map(self, event):
+        # back from minimized: refresh the progress bar now instead of at the slow tick
+        if event.widget is self.window and self.player.is_playing:
+            self._start_progress_updater()
 
-        # schedule next update
-        self._progress_update_job = self.window.after(500, self._update_progress)
 
+    # --- debug panel (F12) ---
+    def show_debug_panel(self):
+        if self._debug_panel is not None and self._debug_panel.winfo_exists():
+            self._debug_panel.focus()
+            return
+        panel = self._debug_panel = ctk.CTkToplevel(self.window)
+        panel.title("Groovy - Metrics")
+        panel.geometry("760x480")
+        panel.configure(fg_color="#0f0f0f")
+
+        bar = ctk.CTkFrame(panel, fg_color="transparent")
+        bar.pack(fill="x", padx=15, pady=(15, 5))
+
+        def toggle():
+            METRICS.enabled = bool(switch.get())
+
+        switch = ctk.CTkSwitch(bar, text="Record metrics", command=toggle)
+        if METRICS.enabled:
+            switch.select()
+        switch.pack(side="left")
+
+        def dump(ext, label):
+            path = filedialog.asksaveasfilename(parent=panel, title=f"Save metrics ({label})", defaultextension=ext,
+                                                initialfile=f"groovy-metrics{ext}")
+            if path:
+                try:
+                    METRICS.dump(path)
+                except Exception as e:
+                    messagebox.showerror("Error", f"Cannot save metrics:\n{e}", parent=panel)
+
+        ctk.CTkButton(bar, text="Save Prometheus", width=130, fg_color="#1e293b", hover_color="#334155",
+                      command=lambda: dump(".prom", "Prometheus text")).pack(side="right")
+        ctk.CTkButton(bar, text="Save JSON", width=100, fg_color="#1e293b", hover_color="#334155",
+                      command=lambda: dump(".json", "JSON")).pack(side="right", padx=(0, 8))
+        ctk.CTkButton(bar, text="Reset", width=80, fg_color="#1e293b", hover_color="#334155",
+                      command=METRICS.reset).pack(side="right", padx=(0, 8))
+
+        text = ctk.CTkTextbox(panel, font=("Courier", 12), fg_color="#1a1a1a", wrap="none")
+        text.pack(fill="both", expand=True, padx=15, pady=(5, 15))
+
+        def refresh():
+            if not text.winfo_exists():
+                return
+            snap = METRICS.snapshot()
+            lines = [f"{'histogram':<26}{'count':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}"]
+            for name, h in snap["histograms"].items():
+                lines.append(f"{name:<26}{h['count']:>8}{h['mean'] * 1000:>10.2f}{h['p50'] * 1000:>10.2f}"
+                             f"{h['p95'] * 1000:>10.2f}{h['max'] * 1000:>10.2f}")
+            if snap["counters"]:
+                lines += ["", f"{'counter':<26}{'value':>8}"]
+                lines += [f"{name:<26}{value:>8}" for name, value in sorted(snap["counters"].items())]
+            if not METRICS.enabled:
+                lines += ["", "Recording is off - flip the switch above."]
+            text.configure(state="normal")
+            text.delete("1.0", "end")
+            text.insert("1.0", "\n".join(lines))
+            text.configure(state="disabled")
+            panel.after(1000, refresh)
+
+        refresh()
+
+    def on_close(self):
+        # let a running journal compaction finish before exiting
+        try:
+            pygame.mixer.music.stop()
+        except Exception:
+            pass
+        self.search_worker.close()
+        self._prefetcher.shutdown(wait=False)
+        self.player.close()
+        self.window.destroy()
 
     def run(self):
         self.window.mainloop()
@@ -1368,5 +1705,22 @@ class MusicPlayerGUI:
 
 
 if __name__ == "__main__":
-    app = MusicPlayerGUI()
-    app.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Groovy music player")
+    parser.add_argument("--serve", action="store_true", help="run the local HTTP/JSON API instead of the GUI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--metrics", action="store_true", help="record hot-path latencies (see F12 in the GUI)")
+    parser.add_argument("--metrics-dump", metavar="PATH", help="on exit, write metrics to PATH (.json or Prometheus text)")
+    args = parser.parse_args()
+    if args.metrics or args.metrics_dump:
+        METRICS.enabled = True
+    try:
+        if args.serve:
+            from groovy.api import serve_api
+            serve_api(MusicPlayer(), args.host, args.port)
+        else:
+            app = MusicPlayerGUI()
+            app.run()
+    finally:
+        if args.metrics_dump:
+            METRICS.dump(args.metrics_dump)
\ No newline at end of file
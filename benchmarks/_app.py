@@ -0,0 +1,16 @@
+"""Import the headless player core (the ``groovy`` package) for the benchmarks.
+
+It has no GUI or audio imports, so this reaches Song, DoublyLinkedList,
+MusicPlayer, the controllers and (lazily) the API without a window.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_app():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import groovy
+    return groovy
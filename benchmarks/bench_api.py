@@ -0,0 +1,136 @@
+"""Load test of the HTTP/JSON API against a local, in-process instance.
+
+    python benchmarks/bench_api.py --songs 100000 --clients 32 --requests 20000
+
+Every client keeps one HTTP/1.1 connection open and sends a mix of reads
+(search, library paging, status) and writes (queue, favorites) with the
+given write ratio. Latency percentiles are reported per kind.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from _app import load_app
+
+WORDS = ("love", "night", "blue", "fire", "dream", "road", "rain", "gold", "heart", "city")
+
+
+def build_player(app, n):
+    player = app.MusicPlayer(storage=app.JsonStorage("songs.json"), autoload=False)
+    for i in range(1, n + 1):
+        player.library.add(app.Song(i, f"{WORDS[i % 10]} song {i}", f"Artist {i % max(1, n // 200)}",
+                                    f"genre-{i % 24}", f"Album {i % max(1, n // 20)}", 1970 + i % 55, "3:30", None))
+    return player
+
+
+def start_server(app, player):
+    loop = asyncio.new_event_loop()
+    server = app.ApiServer(player, port=0)
+    loop.run_until_complete(server.start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return server, loop
+
+
+def stop_server(server, loop):
+    async def drain():
+        # the clients have hung up; give the connection handlers a moment to see EOF
+        for _ in range(100):
+            if len(asyncio.all_tasks()) <= 1:
+                return
+            await asyncio.sleep(0.01)
+
+    asyncio.run_coroutine_threadsafe(drain(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    server.close()
+
+
+def make_request(rng, n, write_ratio):
+    if rng.random() < write_ratio:
+        if rng.random() < 0.5:
+            return "write", "POST", "/queue", {"id": rng.randint(1, n)}
+        return "write", "POST", f"/favorites/{rng.randint(1, n)}", None
+    pick = rng.random()
+    if pick < 0.5:
+        return "read", "GET", f"/search?q={rng.choice(WORDS)}&limit=20", None
+    if pick < 0.9:
+        return "read", "GET", f"/songs?offset={rng.randint(0, n - 1)}&limit=50", None
+    return "read", "GET", "/status", None
+
+
+async def client(port, count, n, write_ratio, seed, latencies):
+    rng = random.Random(seed)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for _ in range(count):
+        kind, method, path, payload = make_request(rng, n, write_ratio)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        start = time.perf_counter()
+        writer.write(f"{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+        await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader.readexactly(length)
+        latencies[kind].append(time.perf_counter() - start)
+        if status >= 500:
+            raise RuntimeError(f"{method} {path} -> {status}")
+    writer.close()
+
+
+async def run_load(port, clients, requests, n, write_ratio):
+    latencies = {"read": [], "write": []}
+    per_client = max(1, requests // clients)
+    start = time.perf_counter()
+    await asyncio.gather(*(client(port, per_client, n, write_ratio, seed, latencies) for seed in range(clients)))
+    return time.perf_counter() - start, latencies
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--songs", type=int, default=100_000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+
+    app = load_app()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)   # the player keeps its history / caches in the working directory
+        try:
+            player = build_player(app, args.songs)
+            server, loop = start_server(app, player)
+            try:
+                elapsed, latencies = asyncio.run(
+                    run_load(server.port, args.clients, args.requests, args.songs, args.write_ratio))
+            finally:
+                stop_server(server, loop)
+                player.close()
+        finally:
+            os.chdir(cwd)   # leave it before it is removed (Windows cannot delete the cwd)
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{args.songs:,} songs, {args.clients} clients, {total:,} requests in {elapsed:.2f} s "
+          f"({total / elapsed:,.0f} req/s)")
+    for kind, values in latencies.items():
+        if values:
+            print(f"{kind:<6} {len(values):7,}  p50 {percentile(values, 50) * 1000:7.2f} ms  "
+                  f"p95 {percentile(values, 95) * 1000:7.2f} ms  p99 {percentile(values, 99) * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Time and peak memory of the core data structures and player operations.
+
+    python benchmarks/bench_core.py --sizes 10000 100000 1000000 --out run.json
+    python benchmarks/bench_core.py --sizes 100000 --compare run.json
+
+Runs on the groovy core alone (no Tk window, no audio) with a synthetic
+library in a temporary directory. Each operation is timed over a few repeats
+(best and median are kept) and then run once more under tracemalloc for its
+peak.
+--out saves the results as JSON; --compare prints the ratio against such a
+file and exits with status 1 when an operation got slower than --threshold.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from _app import load_app
+from bench_memory import records
+
+KEYWORDS = ("track 12", "artist 3", "genre-5", "album 7", "12")   # "12": short keyword, full scan
+QUERIES = ("genre:genre-5", "genre:genre-5 year>=2000", "artist:\"artist 3\" track", "year<1990 duration<3:00")
+
+
+class Runner:
+    def __init__(self, repeat, memory):
+        self.repeat = repeat
+        self.memory = memory
+        self.results = {}
+
+    def run(self, name, fn, ops=1, setup=None):
+        """Time ``fn(setup())``; ``ops`` is how many operations one call performs."""
+        times = []
+        for _ in range(self.repeat):
+            arg = setup() if setup else None
+            gc.collect()
+            start = time.perf_counter()
+            fn(arg)
+            times.append(time.perf_counter() - start)
+            if times[-1] > 2.0:
+                break   # slow enough that one more run tells us nothing new
+        peak = None
+        if self.memory:
+            arg = setup() if setup else None
+            gc.collect()
+            tracemalloc.start()
+            fn(arg)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        best = min(times)
+        self.results[name] = {
+            "seconds": best,
+            "median": statistics.median(times),
+            "ops": ops,
+            "per_op_us": best / ops * 1e6,
+            "peak_mib": None if peak is None else peak / 2**20,
+        }
+        memory = "" if peak is None else f"  {peak / 2**20:9.1f} MiB peak"
+        print(f"  {name:<28} {best * 1000:10.2f} ms  {best / ops * 1e6:10.2f} us/op{memory}")
+
+
+def bench_size(app, n, repeat, memory, seed=1):
+    rng = random.Random(seed)
+    runner = Runner(repeat, memory)
+    songs = [app.Song(*rec) for rec in records(n)]
+    ids = [rng.randint(1, n) for _ in range(10_000)]
+
+    # --- DoublyLinkedList ---
+    def build(_):
+        dll = app.DoublyLinkedList()
+        for song in songs:
+            dll.add(song)
+        return dll
+    runner.run("dll.add", build, ops=n)
+    dll = build(None)
+
+    runner.run("dll.find_by_id", lambda _: [dll.find_by_id(i) for i in ids], ops=len(ids))
+    for keyword in KEYWORDS:
+        runner.run(f"dll.search[{keyword}]", lambda _, k=keyword: dll.search(k, 0, 50))
+    runner.run("dll.search[all matches]", lambda _: dll.search("artist 3"))
+    runner.run("dll.get_all", lambda _: dll.get_all())
+
+    victims = rng.sample(songs, min(1000, n))
+
+    def delete(_):
+        for song in victims:
+            dll.delete(song.id)
+        for song in victims:   # put them back (at the tail) for the next repeat
+            dll.add(song)
+    runner.run("dll.delete (+re-add)", delete, ops=len(victims))
+
+    # --- MusicPlayer persistence ---
+    player = app.MusicPlayer(storage=app.JsonStorage("songs.json"), autoload=False)
+    for song in songs:
+        player.library.add(song)
+    runner.run("player.save_library", lambda _: player.save_library())
+
+    def fresh_player():
+        return app.MusicPlayer(storage=app.JsonStorage("songs.json"), autoload=False)
+    runner.run("player.load_library", lambda p: p.load_library(), setup=fresh_player)
+
+    playlist = [song.id for song in rng.sample(songs, max(1, n // 10))]
+    player.storage.save_playlist(playlist)
+    runner.run("player.load_playlist", lambda _: player.load_playlist(), ops=len(playlist))
+
+    # --- navigation ---
+    steps = min(10_000, n)
+
+    def navigate(step):
+        def walk(_):
+            player.current_mode, player.list_order = "library", "asc"
+            player.current_song = songs[n // 2]
+            for _ in range(steps):
+                player.current_song = step()
+        return walk
+    runner.run("player.next_song", navigate(player.next_song), ops=steps)
+    runner.run("player.prev_song", navigate(player.prev_song), ops=steps)
+
+    picks = [songs[i - 1] for i in ids[:1000]]
+    runner.run("player.find_similar_song", lambda _: [player.find_similar_song(s) for s in picks], ops=len(picks))
+
+    # --- sorted views ---
+    def build_sorted(_):
+        index = app.SortedIndex("title")
+        index.add_many(songs)
+        return index
+    runner.run("sorted.build[title]", build_sorted, ops=n)
+    index = player.sorted_index("title")
+    offsets = [rng.randrange(n) for _ in range(1000)]
+    runner.run("sorted.page", lambda _: [index.page(o, 50) for o in offsets], ops=len(offsets))
+    runner.run("sorted.neighbour", lambda _: [index.neighbour(s) for s in picks], ops=len(picks))
+
+    # --- structured queries ---
+    queries = app.QueryEngine(player)
+    for text in QUERIES:
+        runner.run(f"query[{text}]", lambda _, t=text: queries.run(t, 0, 50))
+
+    # --- user operations ---
+    user = app.UserController(player)
+    player.favorites.update(song.id for song in rng.sample(songs, max(1, n // 100)))
+    runner.run("user.get_favorites", lambda _: user.get_favorites())
+
+    player.close()
+    return runner.results
+
+
+def compare(results, baseline, threshold):
+    """Print time ratios against ``baseline``; return the number of regressions."""
+    regressions = 0
+    for size, ops in results.items():
+        old_ops = baseline.get("results", {}).get(size)
+        if not old_ops:
+            continue
+        print(f"\n{int(size):,} songs vs baseline")
+        for name, result in ops.items():
+            old = old_ops.get(name)
+            if not old or not old["seconds"]:
+                continue
+            ratio = result["seconds"] / old["seconds"]
+            flag = "  REGRESSION" if ratio > threshold else ""
+            regressions += bool(flag)
+            print(f"  {name:<28} {ratio:6.2f}x{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --out")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = parser.parse_args()
+
+    app = load_app()
+    results = {}
+    cwd = os.getcwd()
+    for n in args.sizes:
+        print(f"{n:,} songs")
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)   # the player keeps its files in the working directory
+            try:
+                results[str(n)] = bench_size(app, n, args.repeat, not args.no_memory)
+            finally:
+                os.chdir(cwd)
+
+    report = {
+        "meta": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Memory of the library's Song/Node layout vs. the original dict-based one.
+
+    python benchmarks/bench_memory.py --songs 1000000
+
+Both layouts get freshly built strings for every record, the way json.load
+hands them over, and are chained into a doubly linked list.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from _app import load_app
+
+
+class LegacySong:
+    """Song as it was before __slots__ / interning."""
+    def __init__(self, id, title, artist, genre, album, year=None, duration=None, file_path=None):
+        self.id = id
+        self.title = title
+        self.artist = artist
+        self.genre = genre
+        self.album = album
+        self.year = year
+        self.duration = duration
+        self.file_path = file_path
+
+
+class LegacyNode:
+    def __init__(self, song):
+        self.song = song
+        self.prev = None
+        self.next = None
+
+
+def records(n):
+    # ~n/200 artists, ~n/20 albums, 24 genres; "".join builds a new str each time
+    for i in range(n):
+        yield (i + 1,
+               "".join(("Track ", str(i))),
+               "".join(("Artist ", str(i % max(1, n // 200)))),
+               "".join(("genre-", str(i % 24))),
+               "".join(("Album ", str(i % max(1, n // 20)))),
+               1970 + i % 55,
+               "".join((str(2 + i % 4), ":", str(10 + i % 50))),
+               "".join(("/music/", str(i), ".mp3")))
+
+
+def build(song_cls, node_cls, n):
+    head = tail = None
+    for rec in records(n):
+        node = node_cls(song_cls(*rec))
+        if head is None:
+            head = tail = node
+        else:
+            tail.next = node
+            node.prev = tail
+            tail = node
+    return head
+
+
+def measure(label, song_cls, node_cls, n):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    head = build(song_cls, node_cls, n)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del head
+    print(f"{label:<10} {current / 2**20:9.1f} MiB held  {peak / 2**20:9.1f} MiB peak  "
+          f"{current / n:7.1f} B/song  {elapsed:6.2f} s build")
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--songs", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    app = load_app()
+    print(f"{args.songs:,} songs")
+    legacy = measure("legacy", LegacySong, LegacyNode, args.songs)
+    compact = measure("compact", app.Song, app.Node, args.songs)
+    print(f"saved {100 * (1 - compact / legacy):.0f}%")
+
+
+if __name__ == "__main__":
+    main()
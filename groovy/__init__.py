@@ -0,0 +1,25 @@
+"""Groovy music player core: models, storage, player, queries and controllers.
+
+Nothing here imports customtkinter or pygame, so batch tools, benchmarks
+and tests can use the library without starting a window or the mixer.
+The GUI lives in "Kelompok 4 Source Kode Struktur Data.py"; the HTTP API
+(groovy.api) is imported on first access since it pulls in asyncio.
+"""
+from .metrics import Histogram, Metrics, METRICS
+from .models import Song, User, Node, SearchIndex, DoublyLinkedList, SimilarityIndex, FeatureScorer, \
+    parse_duration, SortedIndex, SortedView, Queue, Stack, PlayHistory
+from .journal import iter_json_array, Journal, LibraryJournal, PlaylistJournal
+from .metadata import probe_duration, AUDIO_EXTENSIONS, read_tags, iter_audio_files, MetadataJournal, MetadataCache
+from .storage import DEFAULT_PLAYLIST, Storage, PlaylistFiles, JsonStorage, SqliteStorage
+from .player import PlaylistManager, UserSession, MusicPlayer
+from .query import QueryError, Predicate, parse_query, QueryEngine
+from .controller import AdminController, UserController, SearchWorker
+
+_API = ("ApiError", "AsyncRWLock", "ApiServer", "serve_api")
+
+
+def __getattr__(name):
+    if name in _API:
+        from . import api
+        return getattr(api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,413 @@
+"""Headless asyncio HTTP/JSON API over a MusicPlayer."""
+import asyncio
+import contextlib
+import json
+import re
+from urllib.parse import unquote, urlsplit, parse_qsl
+from concurrent.futures import ThreadPoolExecutor
+
+from .controller import AdminController, UserController
+from .metrics import METRICS
+from .models import SortedIndex
+from .player import MusicPlayer
+from .query import QueryError
+
+
+class ApiError(Exception):
+    """Turned into a JSON error response with the given HTTP status."""
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class AsyncRWLock:
+    """Many readers or one writer; a waiting writer holds back new readers."""
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextlib.asynccontextmanager
+    async def reading(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self._writer and not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def writing(self):
+        async with self._cond:
+            self._writers_waiting += 1
+            try:
+                await self._cond.wait_for(lambda: not self._writer and not self._readers)
+            finally:
+                self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class ApiServer:
+    """Local HTTP/JSON API over MusicPlayer, AdminController and UserController.
+
+    Built on asyncio.start_server (HTTP/1.1 with keep-alive, no extra
+    dependencies). Handlers run on a thread pool: GET requests share an
+    AsyncRWLock and run side by side, everything else takes it exclusively,
+    so the player's structures are never read mid-update.
+    """
+    MAX_BODY = 1 << 20
+    MAX_LIMIT = 1000
+    REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+    def __init__(self, player, host="127.0.0.1", port=8765, workers=4):
+        self.player = player
+        self.admin = AdminController(player)
+        self.user = UserController(player)
+        self.host = host
+        self.port = port
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = None     # created on the server's event loop, see start()
+        self._server = None
+        self._routes = [(method, re.compile(pattern), handler) for method, pattern, handler in (
+            ("GET", r"/status", self._status),
+            ("GET", r"/songs", self._list_songs),
+            ("POST", r"/songs", self._add_song),
+            ("GET", r"/songs/(\d+)", self._get_song),
+            ("PATCH", r"/songs/(\d+)", self._edit_song),
+            ("DELETE", r"/songs/(\d+)", self._delete_song),
+            ("GET", r"/search", self._search),
+            ("GET", r"/queue", self._get_queue),
+            ("POST", r"/queue", self._enqueue),
+            ("DELETE", r"/queue", self._clear_queue),
+            ("DELETE", r"/queue/(\d+)", self._dequeue_at),
+            ("GET", r"/playlists", self._list_playlists),
+            ("POST", r"/playlists", self._create_playlist),
+            ("GET", r"/playlists/([^/]+)", self._get_playlist),
+            ("DELETE", r"/playlists/([^/]+)", self._delete_playlist),
+            ("POST", r"/playlists/([^/]+)/songs", self._add_to_playlist),
+            ("DELETE", r"/playlists/([^/]+)/songs/(\d+)", self._remove_from_playlist),
+            ("GET", r"/favorites", self._get_favorites),
+            ("POST", r"/favorites/(\d+)", self._add_favorite),
+            ("DELETE", r"/favorites/(\d+)", self._remove_favorite),
+            ("GET", r"/history", self._get_history),
+            ("GET", r"/metrics", self._get_metrics),
+        )]
+
+    #  server
+    async def start(self):
+        self._lock = AsyncRWLock()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]   # port=0 picks a free one
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        self._executor.shutdown(wait=True)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= self.MAX_BODY:
+                    await self._respond(writer, 413 if length > 0 else 400, {"error": "bad content length"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                with METRICS.timed("api.request"):
+                    status, payload = await self._dispatch(method, target, body)
+                METRICS.count(f"api.responses_{status}")
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {self.REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def _dispatch(self, method, target, body):
+        url = urlsplit(target)
+        allowed = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.fullmatch(url.path)
+            if not match:
+                continue
+            allowed = True
+            if route_method == method:
+                break
+        else:
+            return (405, {"error": "method not allowed"}) if allowed else (404, {"error": "no such endpoint"})
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {"error": "body is not valid JSON"}
+        if not isinstance(data, dict):
+            return 400, {"error": "body must be a JSON object"}
+        query = dict(parse_qsl(url.query))
+        args = [unquote(g) for g in match.groups()]
+        guard = self._lock.reading() if method == "GET" else self._lock.writing()
+        try:
+            async with guard:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, handler, query, data, *args)
+        except ApiError as e:
+            return e.status, {"error": str(e)}
+        except Exception as e:
+            print("API handler failed:", e)
+            return 500, {"error": "internal error"}
+        return (201, result) if method == "POST" else (200, result)
+
+    #  helpers
+    def _int(self, query, key, default, maximum=None):
+        try:
+            value = int(query.get(key, default))
+        except (TypeError, ValueError):
+            raise ApiError(400, f"{key} must be an integer")
+        if value < 0:
+            raise ApiError(400, f"{key} must not be negative")
+        return min(value, maximum) if maximum is not None else value
+
+    def _songs(self, songs):
+        return [MusicPlayer._song_record(s) for s in songs]
+
+    def _id(self, value, key="id"):
+        """A song id from the path or body; anything but an integer is a 400."""
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+        raise ApiError(400, f"{key} must be an integer")
+
+    def _check_song_fields(self, data):
+        """400 unless every song field in ``data`` has a type the library can store."""
+        for key in ("title", "artist", "genre", "album", "file_path"):
+            if not isinstance(data.get(key), (str, type(None))):
+                raise ApiError(400, f"{key} must be a string")
+        year = data.get("year")
+        if not (year is None or year == "" or (isinstance(year, int) and not isinstance(year, bool))
+                or (isinstance(year, str) and year.isdigit())):
+            raise ApiError(400, "year must be an integer")
+        duration = data.get("duration")
+        if not (duration is None or isinstance(duration, str)
+                or (isinstance(duration, int) and not isinstance(duration, bool))):
+            raise ApiError(400, 'duration must be a string like "3:45" or seconds')
+
+    def _song(self, song_id):
+        song = self.player.library.find_by_id(self._id(song_id))
+        if song is None:
+            raise ApiError(404, "no such song")
+        return song
+
+    def _playlist_name(self, name):
+        if name not in self.player.playlists:
+            raise ApiError(404, "no such playlist")
+        return name
+
+    #  handlers (run on the thread pool)
+    def _status(self, query, data):
+        current = self.player.current_song
+        return {"songs": self.player.library.size,
+                "queue": len(self.player.queue),
+                "current_song": MusicPlayer._song_record(current) if current else None,
+                "is_playing": self.player.is_playing}
+
+    def _list_songs(self, query, data):
+        offset = self._int(query, "offset", 0)
+        limit = self._int(query, "limit", 50, self.MAX_LIMIT)
+        sort_by = query.get("sort") or None
+        if sort_by is not None and sort_by not in SortedIndex.FIELDS:
+            raise ApiError(400, "sort must be one of " + ", ".join(SortedIndex.FIELDS))
+        order = query.get("order", "asc")
+        if order not in ("asc", "desc"):
+            raise ApiError(400, "order must be asc or desc")
+        q = query.get("q", "").strip()
+        if q:
+            # structured filter, e.g. ?q=genre:pop year>=2000; total counts the matches
+            try:
+                songs = self.admin.list_songs(sort_by=sort_by, descending=order == "desc", query=q)
+                plan = self.admin.queries.explain(q)
+            except QueryError as e:
+                raise ApiError(400, str(e))
+            return {"total": len(songs), "offset": offset, "plan": plan,
+                    "items": self._songs(songs[offset:offset + limit])}
+        songs = self.admin.list_songs(offset, limit, sort_by, descending=order == "desc")
+        return {"total": self.player.library.size, "offset": offset, "items": self._songs(songs)}
+
+    def _get_song(self, query, data, song_id):
+        song = self._song(song_id)
+        plays, last = self.user.get_play_stats(song.id)
+        return dict(MusicPlayer._song_record(song), plays=plays, last_played=last,
+                    favorite=song.id in self.player.favorites)
+
+    def _add_song(self, query, data):
+        self._check_song_fields(data)
+        if not data.get("title"):
+            raise ApiError(400, "title is required")
+        ok, message = self.admin.add_song(*(data.get(k) for k in (
+            "title", "artist", "genre", "album", "year", "duration", "file_path")))
+        if not ok:
+            raise ApiError(400, message)
+        return MusicPlayer._song_record(self.player.library.tail.song)
+
+    def _edit_song(self, query, data, song_id):
+        """Partial update: fields missing from the body keep their value."""
+        record = MusicPlayer._song_record(self._song(song_id))
+        unknown = set(data) - set(record) - {"id"}
+        if unknown:
+            raise ApiError(400, "unknown fields: " + ", ".join(sorted(unknown)))
+        self._check_song_fields(data)
+        record.update((k, v) for k, v in data.items() if k != "id")
+        ok, message = self.admin.edit_song(record["id"], *(record[k] for k in (
+            "title", "artist", "genre", "album", "year", "duration", "file_path")))
+        if not ok:
+            raise ApiError(400, message)
+        return MusicPlayer._song_record(self.player.library.find_by_id(record["id"]))
+
+    def _delete_song(self, query, data, song_id):
+        if not self.admin.delete_song(int(song_id)):
+            raise ApiError(404, "no such song")
+        return {"deleted": int(song_id)}
+
+    def _search(self, query, data):
+        offset = self._int(query, "offset", 0)
+        limit = self._int(query, "limit", 50, self.MAX_LIMIT)
+        return {"items": self._songs(self.user.search(query.get("q", ""), offset, limit))}
+
+    def _get_queue(self, query, data):
+        return {"items": self._songs(self.user.get_queue())}
+
+    def _enqueue(self, query, data):
+        """{"id": n} (with "next": true to play it next), {"ids": [...]} or {"album": name}."""
+        if "ids" in data:
+            if not isinstance(data["ids"], list):
+                raise ApiError(400, "ids must be a list of integers")
+            added = self.user.enqueue_many([self._id(i, "every id in ids") for i in data["ids"]])
+        elif "album" in data:
+            if not isinstance(data["album"], str):
+                raise ApiError(400, "album must be a string")
+            added = self.user.enqueue_album(data["album"])
+        elif "id" in data:
+            song_id = self._song(data["id"]).id
+            added = int(self.user.play_next(song_id) if data.get("next") else self.user.enqueue(song_id))
+        else:
+            raise ApiError(400, "expected id, ids or album")
+        return {"added": added, "queue": len(self.player.queue)}
+
+    def _clear_queue(self, query, data):
+        self.player.queue.clear()
+        return {"queue": 0}
+
+    def _dequeue_at(self, query, data, position):
+        if not self.user.remove_from_queue(int(position)):
+            raise ApiError(404, "no such queue position")
+        return {"queue": len(self.player.queue)}
+
+    def _list_playlists(self, query, data):
+        return {"items": self.user.get_playlists(), "active": self.player.playlists.active_name}
+
+    def _create_playlist(self, query, data):
+        name = str(data.get("name", ""))
+        if not self.user.create_playlist(name):
+            raise ApiError(400, "playlist name is empty or already exists")
+        return {"name": name.strip()}
+
+    def _get_playlist(self, query, data, name):
+        return {"name": name, "items": self._songs(self.user.get_playlist(self._playlist_name(name)))}
+
+    def _delete_playlist(self, query, data, name):
+        if not self.user.delete_playlist(self._playlist_name(name)):
+            raise ApiError(400, "this playlist cannot be deleted")
+        return {"deleted": name}
+
+    def _add_to_playlist(self, query, data, name):
+        song = self._song(data.get("id"))
+        self.user.add_to_playlist(song.id, self._playlist_name(name))
+        return {"name": name, "size": self.player.playlists.get(name).size}
+
+    def _remove_from_playlist(self, query, data, name, song_id):
+        if not self.user.remove_from_playlist(int(song_id), self._playlist_name(name)):
+            raise ApiError(404, "song is not in this playlist")
+        return {"name": name, "size": self.player.playlists.get(name).size}
+
+    def _get_favorites(self, query, data):
+        return {"items": self._songs(self.user.get_favorites())}
+
+    def _add_favorite(self, query, data, song_id):
+        song = self._song(song_id)
+        if song.id not in self.player.favorites:
+            self.user.toggle_favorite(song.id)
+        return {"favorite": song.id}
+
+    def _remove_favorite(self, query, data, song_id):
+        song_id = int(song_id)
+        if song_id in self.player.favorites:
+            self.user.toggle_favorite(song_id)
+        return {"favorite": None}
+
+    def _get_history(self, query, data):
+        limit = self._int(query, "limit", 20, self.MAX_LIMIT)
+        return {"items": self._songs(self.user.get_history(limit))}
+
+    def _get_metrics(self, query, data):
+        return METRICS.snapshot()
+
+
+def serve_api(player, host="127.0.0.1", port=8765):
+    """Run the API until interrupted (python "<this file>" --serve)."""
+    server = ApiServer(player, host, port)
+
+    async def run():
+        await server.start()
+        print(f"Groovy API listening on http://{server.host}:{server.port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        player.close()
@@ -0,0 +1,281 @@
+"""Admin / user controllers and the background search worker."""
+import threading
+from queue import SimpleQueue
+
+from .metadata import iter_audio_files, read_tags
+from .models import Song
+from .player import MusicPlayer
+from .query import QueryEngine
+
+
+class AdminController:
+    def __init__(self, player: MusicPlayer):
+        self.player = player
+        self.queries = QueryEngine(player)
+
+    def list_songs(self, offset=0, limit=None, sort_by=None, descending=False, query=None):
+        """A page of the library in list order, or sorted by a SortedIndex field.
+
+        ``query`` filters it first (see groovy.query); QueryError on bad syntax.
+        """
+        if query and query.strip():
+            return self.queries.run(query, offset, limit, sort_by, descending)
+        if sort_by:
+            return self.player.sorted_index(sort_by).page(offset, limit, reverse=descending)
+        if offset == 0 and limit is None:
+            return self.player.library.get_all()
+        return self.player.library.slice(offset, limit)
+
+    def add_song(self, title, artist, genre, album, year, duration, file_path):
+        try:
+            year = int(year) if year else None   # before get_next_id, so a bad year does not use up an id
+            song = Song(self.player.get_next_id(), title, artist, genre, album, year, duration, file_path)
+            self.player.library.add(song)
+            # persist library (one journal record, not a full rewrite)
+            self.player.record_song_added(song)
+            return True, "Song added"
+        except Exception as e:
+            return False, str(e)
+
+    def edit_song(self, song_id, title, artist, genre, album, year, duration, file_path):
+        try:
+            song = self.player.library.update(song_id, title=title, artist=artist, genre=genre, album=album,
+                                              year=int(year) if year else None, duration=duration,
+                                              file_path=file_path)
+            if song is None:
+                return False, "Song not found"
+            # playlists share the Song object; their indexes still hold the old fields
+            for _, songs in self.player.playlists.loaded():
+                songs.update(song_id)
+            self.player.record_song_updated(song)
+            return True, "Song updated"
+        except Exception as e:
+            return False, str(e)
+
+    def scan_folder(self, root, progress=None, workers=8):
+        """Read tags of every audio file under ``root`` on a thread pool.
+
+        Does not touch the library, so it can run off the UI thread.
+        ``progress(done, total)`` is called from this thread as files finish.
+        """
+        from concurrent.futures import ThreadPoolExecutor   # only folder import needs it; keeps import cheap
+        paths = list(iter_audio_files(root))
+        total = len(paths)
+        records = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for done, record in enumerate(pool.map(read_tags, paths), 1):
+                records.append(record)
+                if progress and (done % 100 == 0 or done == total):
+                    progress(done, total)
+        return records
+
+    def add_songs(self, records):
+        """Insert many songs with a single persistence flush; skips known files."""
+        known = {s.file_path for s in self.player.library.get_all() if s.file_path}
+        fresh = []
+        for r in records:
+            if r["file_path"] in known:
+                continue
+            known.add(r["file_path"])
+            fresh.append(r)
+        next_id = self.player.get_next_id(len(fresh)) if fresh else 0
+        for i, r in enumerate(fresh):
+            self.player.library.add(Song(next_id + i, r["title"], r["artist"], r["genre"], r["album"],
+                                         r["year"], r["duration"], r["file_path"]))
+        added = len(fresh)
+        if added:
+            self.player.save_library()
+        return added
+
+    def import_folder(self, root, progress=None, workers=8):
+        return self.add_songs(self.scan_folder(root, progress, workers))
+
+    def delete_song(self, song_id):
+        ok = self.player.library.delete(song_id)
+        # also remove from opened playlists; unopened ones drop the id when loaded
+        for name, songs in self.player.playlists.loaded():
+            while songs.delete(song_id):
+                self.player.record_playlist_removed(song_id, name)
+        self.player.queue.remove_song(song_id)
+        # persist library
+        if ok:
+            self.player.record_song_deleted(song_id)
+        return ok
+
+
+class UserController:
+    """Contains user-facing operations (search, playlist, favs, history)."""
+    def __init__(self, player: MusicPlayer):
+        self.player = player
+        self.queries = QueryEngine(player)
+
+    def search(self, keyword, offset=0, limit=None, cancelled=None):
+        return self.player.library.search(keyword, offset, limit, cancelled)
+
+    def query(self, text, offset=0, limit=None, sort_by=None, descending=False):
+        """Structured filter, e.g. ``genre:pop year>=2000 duration<4:00``; QueryError on bad syntax."""
+        return self.queries.run(text, offset, limit, sort_by, descending)
+
+    def browse(self, sort_by, descending=False, offset=0, limit=None):
+        """A page of the library sorted by ``sort_by`` (see SortedIndex.FIELDS)."""
+        return self.player.sorted_index(sort_by).page(offset, limit, reverse=descending)
+
+    def add_to_playlist(self, song_id, name=None):
+        song = self.player.library.find_by_id(song_id)
+        if not song or (name is not None and name not in self.player.playlists):
+            return False
+        self.player.playlists.get(name).add(song)
+        self.player.record_playlist_added(song_id, name)
+        return True
+
+    def remove_from_playlist(self, song_id, name=None):
+        if not self.player.playlists.get(name).delete(song_id):
+            return False
+        self.player.record_playlist_removed(song_id, name)
+        return True
+
+    #  named playlists
+    def get_playlists(self):
+        return self.player.playlists.names()
+
+    def get_playlist(self, name=None):
+        return self.player.playlists.get(name).get_all()
+
+    def select_playlist(self, name):
+        return self.player.playlists.select(name)
+
+    def create_playlist(self, name):
+        return self.player.playlists.create(name)
+
+    def delete_playlist(self, name):
+        return self.player.playlists.delete(name)
+
+    #  up-next queue
+    def enqueue(self, song_id):
+        song = self.player.library.find_by_id(song_id)
+        if not song:
+            return False
+        self.player.queue.enqueue(song)
+        return True
+
+    def enqueue_many(self, song_ids):
+        """Queue several songs at once (e.g. a whole search result); returns how many."""
+        songs = [s for s in map(self.player.library.find_by_id, song_ids) if s]
+        self.player.queue.enqueue_many(songs)
+        return len(songs)
+
+    def enqueue_album(self, album):
+        songs = [s for s in self.player.library.get_all() if s.album == album]
+        self.player.queue.enqueue_many(songs)
+        return len(songs)
+
+    def play_next(self, song_id):
+        song = self.player.library.find_by_id(song_id)
+        if not song:
+            return False
+        self.player.queue.play_next(song)
+        return True
+
+    def remove_from_queue(self, position):
+        return self.player.queue.remove_at(position) is not None
+
+    def move_to_front(self, position):
+        song = self.player.queue.remove_at(position)
+        if song is None:
+            return False
+        self.player.queue.play_next(song)
+        return True
+
+    def get_queue(self):
+        return self.player.queue.get_all()
+
+    def toggle_favorite(self, song_id):
+        return self.player.session.toggle_favorite(song_id)
+
+    def get_favorites(self):
+        return [s for s in self.player.library.get_all() if s.id in self.player.favorites]
+
+    def get_history(self, limit=None):
+        """Most recent plays first."""
+        return self.player.history.recent(limit)
+
+    def get_play_stats(self, song_id):
+        """(play count, last played as a UNIX timestamp or None)."""
+        history = self.player.history
+        return history.play_count(song_id), history.last_played_at(song_id)
+
+
+class SearchWorker:
+    """Runs searches on a background thread, newest query only.
+
+    submit() returns a generation number; results arrive on ``results`` as
+    (generation, songs, done) batches. A newer submit() or cancel() makes the
+    running search stale: it is abandoned mid-scan (``search`` gets a
+    ``cancelled`` callback) or between batches, so the caller only has to
+    drop batches whose generation is not the one it is waiting for.
+    """
+    def __init__(self, search, first_page=50, batch_size=500):
+        self._search = search
+        self.first_page = first_page
+        self.batch_size = batch_size
+        self.results = SimpleQueue()
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._pending = None
+        self._closed = False
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, keyword):
+        with self._cond:
+            self._generation += 1
+            self._pending = (self._generation, keyword)
+            self._cond.notify()
+            return self._generation
+
+    def cancel(self):
+        with self._cond:
+            self._generation += 1
+            self._pending = None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify()
+
+    def _stale(self, generation):
+        return generation != self._generation or self._closed
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                generation, keyword = self._pending
+                self._pending = None
+            try:
+                self._execute(generation, keyword)
+            except Exception as e:
+                # e.g. the library changed while we were reading it
+                print("Search failed:", e)
+                self.results.put((generation, [], True))
+
+    def _execute(self, generation, keyword):
+        # the first screenful comes from a bounded top-k, the rest follows in batches
+        def cancelled():
+            return self._stale(generation)
+        first = self._search(keyword, 0, self.first_page, cancelled=cancelled)
+        if self._stale(generation):
+            return
+        if len(first) < self.first_page:
+            self.results.put((generation, first, True))
+            return
+        self.results.put((generation, first, False))
+        rest = self._search(keyword, self.first_page, cancelled=cancelled)
+        for start in range(0, len(rest), self.batch_size):
+            if self._stale(generation):
+                return
+            self.results.put((generation, rest[start:start + self.batch_size], False))
+        self.results.put((generation, [], True))
@@ -0,0 +1,298 @@
+"""Snapshot + append-only journal persistence."""
+import os
+import json
+import threading
+
+
+def iter_json_array(f, chunk_size=1 << 16):
+    """Yield the elements of a top-level JSON array from a text file one by one.
+
+    Only ``chunk_size`` characters plus the element being decoded are held in
+    memory, instead of the whole document as with json.load.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos = "", 0
+    started = eof = False
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ",")):
+            pos += 1
+        if pos == len(buf):
+            if eof:
+                if started:
+                    raise ValueError("unterminated JSON array")
+                return  # empty file
+            buf, pos = f.read(chunk_size), 0
+            eof = not buf
+            continue
+        if not started:
+            if buf[pos] != "[":
+                raise ValueError("expected a JSON array")
+            started = True
+            pos += 1
+            continue
+        if buf[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if eof:
+                raise
+            more = f.read(chunk_size)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield item
+        pos = end
+
+
+class Journal:
+    """Append-only change log kept next to a JSON snapshot file.
+
+    Every mutation appends one JSON line to the journal instead of rewriting
+    the snapshot. When ``compact_every`` records have piled up the journal is
+    rotated aside and a daemon thread folds it into a fresh snapshot. Loading
+    replays snapshot + rotated journal (left over if a compaction was cut
+    short) + live journal, so nothing is lost if the app exits mid-way.
+    Subclasses define the in-memory state via _empty/_decode/_encode/_apply.
+    """
+    def __init__(self, snapshot_path, compact_every=500):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + ".journal"
+        self.rotated_path = self.journal_path + ".1"
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._file = None
+        self._pending = 0
+        self._compactor = None
+
+    #  state hooks
+    def _empty(self):
+        raise NotImplementedError
+
+    def _decode(self, data):
+        raise NotImplementedError
+
+    def _encode(self, state):
+        raise NotImplementedError
+
+    def _apply(self, state, record):
+        raise NotImplementedError
+
+    #  reading
+    def _read_snapshot(self):
+        try:
+            with open(self.snapshot_path, "r") as f:
+                return self._decode(json.load(f))
+        except FileNotFoundError:
+            return self._empty()
+
+    def _read_journal(self, path):
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        return  # torn last write
+                    yield record
+        except FileNotFoundError:
+            return
+
+    def _replay(self, state, path):
+        count = 0
+        for record in self._read_journal(path):
+            self._apply(state, record)
+            count += 1
+        return count
+
+    def load(self):
+        """Return the current state: snapshot with all journal records applied."""
+        self.wait()
+        state = self._read_snapshot()
+        self._replay(state, self.rotated_path)
+        self._pending = self._replay(state, self.journal_path)
+        if self._pending >= self.compact_every:
+            self.compact()
+        return state
+
+    #  writing
+    def append(self, record):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.journal_path, "a")
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self._pending += 1
+            due = self._pending >= self.compact_every
+        if due:
+            self.compact()
+
+    def _write_atomic(self, state):
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._encode(state), f, indent=4)
+        os.replace(tmp_path, self.snapshot_path)
+
+    def write_snapshot(self, state):
+        """Replace the snapshot with ``state`` and drop the journal (full flush)."""
+        self.wait()
+        with self._lock:
+            self._write_atomic(state)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            for path in (self.journal_path, self.rotated_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            self._pending = 0
+
+    #  compaction
+    def compact(self, wait=False):
+        """Fold the journal into the snapshot on a background thread."""
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if not os.path.exists(self.journal_path):
+                return
+            if os.path.exists(self.rotated_path):
+                # an earlier compaction did not finish; queue behind its records
+                with open(self.journal_path, "r") as src, open(self.rotated_path, "a") as dst:
+                    dst.write(src.read())
+                os.remove(self.journal_path)
+            else:
+                os.replace(self.journal_path, self.rotated_path)
+            self._pending = 0
+            self._compactor = threading.Thread(target=self._fold_rotated, daemon=True)
+            self._compactor.start()
+        if wait:
+            self.wait()
+
+    def _fold_rotated(self):
+        try:
+            state = self._read_snapshot()
+            self._replay(state, self.rotated_path)
+            self._write_atomic(state)
+            os.remove(self.rotated_path)
+        except Exception as e:
+            print("Failed to compact journal:", e)
+
+    def wait(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def close(self):
+        self.wait()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class LibraryJournal(Journal):
+    """songs.json: list of song records. State is an ordered dict id -> record."""
+    def _empty(self):
+        return {}
+
+    def _decode(self, data):
+        songs = {}
+        for record in data:
+            songs.setdefault(record.get("id"), record)  # first copy of an id wins
+        return songs
+
+    def _encode(self, state):
+        return list(state.values())
+
+    def _apply(self, state, record):
+        if record["op"] == "add":
+            state.setdefault(record["song"]["id"], record["song"])
+        elif record["op"] == "delete":
+            state.pop(record["id"], None)
+        elif record["op"] == "update" and record["song"]["id"] in state:
+            state[record["song"]["id"]] = record["song"]   # same key, so the order is kept
+
+    def iter_records(self):
+        """Stream the same records load() returns, in the same order.
+
+        The snapshot is parsed incrementally; only the (small) journal is read
+        up front. Journal ops are resolved per id for both cases "id is in the
+        snapshot" and "id is not", since that is only known once it streams by.
+        An update keeps the record where it was: (snap, record) means "at its
+        snapshot position, but with this record".
+        """
+        self.wait()
+        snap = object()
+        fates = {}   # id -> [outcome if in snapshot, outcome if not]
+        order = live = 0
+        for path in (self.rotated_path, self.journal_path):
+            for record in self._read_journal(path):
+                order += 1
+                if path == self.journal_path:
+                    live += 1
+                if record["op"] == "delete":
+                    song_id = record["id"]
+                else:
+                    song_id = record["song"]["id"]
+                fate = fates.setdefault(song_id, [snap, None])
+                for i in (0, 1):
+                    if record["op"] == "delete":
+                        fate[i] = None
+                    elif record["op"] == "update":
+                        if fate[i] is snap:
+                            fate[i] = (snap, record["song"])
+                        elif fate[i] is not None:
+                            fate[i] = (fate[i][0], record["song"])
+                    elif fate[i] is None:
+                        fate[i] = (order, record["song"])
+        self._pending = live
+
+        tail = []    # journal additions, in the order they were made
+        seen = set()
+        try:
+            with open(self.snapshot_path, "r") as f:
+                for record in iter_json_array(f):
+                    song_id = record.get("id")
+                    fate = fates.get(song_id)
+                    if fate is None:
+                        yield record
+                    elif song_id not in seen:
+                        seen.add(song_id)
+                        if fate[0] is snap:
+                            yield record
+                        elif fate[0] is not None and fate[0][0] is snap:
+                            yield fate[0][1]
+                        elif fate[0] is not None:
+                            tail.append(fate[0])
+        except FileNotFoundError:
+            pass
+        for song_id, fate in fates.items():
+            if song_id not in seen and fate[1] is not None:
+                tail.append(fate[1])
+        for _, record in sorted(tail, key=lambda e: e[0]):
+            yield record
+        if self._pending >= self.compact_every:
+            self.compact()
+
+
+class PlaylistJournal(Journal):
+    """playlist.json: list of song IDs in playlist order."""
+    def _empty(self):
+        return []
+
+    def _decode(self, data):
+        return list(data)
+
+    def _encode(self, state):
+        return state
+
+    def _apply(self, state, record):
+        if record["op"] == "add":
+            state.append(record["id"])
+        elif record["op"] == "delete" and record["id"] in state:
+            state.remove(record["id"])  # first occurrence, like DoublyLinkedList.delete
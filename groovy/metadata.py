@@ -0,0 +1,296 @@
+"""Audio tag / duration probing and the metadata cache used by folder import."""
+import os
+import re
+import threading
+import struct
+import wave
+
+from .journal import Journal
+
+
+_MPEG_BITRATES = {   # kbit/s by (MPEG version group, layer); index 0 = free format
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MPEG_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+
+
+def _mpeg_header(b):
+    """Decode a 4-byte MPEG audio frame header, or None if it is not one."""
+    if len(b) < 4 or b[0] != 0xFF or (b[1] & 0xE0) != 0xE0:
+        return None
+    version = {0: 25, 2: 2, 3: 1}.get((b[1] >> 3) & 3)
+    layer = {1: 3, 2: 2, 3: 1}.get((b[1] >> 1) & 3)
+    bitrate_idx, rate_idx = b[2] >> 4, (b[2] >> 2) & 3
+    if version is None or layer is None or bitrate_idx in (0, 15) or rate_idx == 3:
+        return None
+    bitrate = _MPEG_BITRATES[(1 if version == 1 else 2, layer)][bitrate_idx] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][rate_idx]
+    padding = (b[2] >> 1) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if (layer == 2 or version == 1) else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return {"version": version, "layer": layer, "bitrate": bitrate, "sample_rate": sample_rate,
+            "samples": samples, "length": length, "mono": (b[3] >> 6) == 3}
+
+
+def _id3v2_size(head):
+    """Total size of an ID3v2 tag starting at ``head`` (0 if there is none)."""
+    if len(head) < 10 or head[:3] != b"ID3":
+        return 0
+    size = (head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F)
+    return 10 + size + (10 if head[5] & 0x10 else 0)
+
+
+def _mp3_duration(f, file_size):
+    # skip (possibly several) ID3v2 tags
+    start = 0
+    while True:
+        f.seek(start)
+        skip = _id3v2_size(f.read(10))
+        if not skip:
+            break
+        start += skip
+    f.seek(start)
+    buf = f.read(64 * 1024)
+    # first frame header that is followed by another valid header
+    for i in range(len(buf) - 3):
+        header = _mpeg_header(buf[i:i + 4])
+        if header is None:
+            continue
+        nxt = i + header["length"]
+        if nxt + 4 <= len(buf) and _mpeg_header(buf[nxt:nxt + 4]) is None:
+            continue
+        break
+    else:
+        return None
+    frame = buf[i:i + header["length"] + 64]
+
+    # VBR files carry a frame count in a Xing/Info or VBRI header
+    if header["version"] == 1:
+        side = 17 if header["mono"] else 32
+    else:
+        side = 9 if header["mono"] else 17
+    frames = None
+    xing = frame[4 + side:4 + side + 12]
+    if xing[:4] in (b"Xing", b"Info") and len(xing) == 12 and struct.unpack(">I", xing[4:8])[0] & 1:
+        frames = struct.unpack(">I", xing[8:12])[0]
+    elif frame[36:40] == b"VBRI" and len(frame) >= 54:
+        frames = struct.unpack(">I", frame[50:54])[0]
+    if frames:
+        return frames * header["samples"] / header["sample_rate"]
+
+    # otherwise assume constant bitrate
+    audio_bytes = file_size - start - i
+    f.seek(max(0, file_size - 128))
+    if f.read(3) == b"TAG":
+        audio_bytes -= 128
+    return audio_bytes * 8 / header["bitrate"]
+
+
+def _flac_duration(f):
+    if f.read(4) != b"fLaC":
+        return None
+    block = f.read(4 + 34)          # first metadata block is always STREAMINFO
+    if len(block) < 38:
+        return None
+    info = block[4:]
+    sample_rate = (info[10] << 12) | (info[11] << 4) | (info[12] >> 4)
+    total = ((info[13] & 0x0F) << 32) | struct.unpack(">I", info[14:18])[0]
+    return total / sample_rate if sample_rate and total else None
+
+
+def probe_duration(path):
+    """Length of an audio file in seconds read from its headers, or None.
+
+    Only a few KB are read: MP3 frame headers (Xing/Info/VBRI frame counts
+    for VBR, file size / bitrate for CBR), FLAC STREAMINFO or the WAV header.
+    """
+    try:
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".wav":
+            with wave.open(path, "rb") as w:
+                return w.getnframes() / float(w.getframerate())
+        with open(path, "rb") as f:
+            if ext == ".flac":
+                return _flac_duration(f)
+            if ext == ".mp3":
+                return _mp3_duration(f, os.fstat(f.fileno()).st_size)
+    except Exception:
+        pass
+    return None
+
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".flac", ".m4a")
+
+# ID3v2 frame ids we care about, per major version (2.2 uses 3-char ids)
+_ID3_FRAMES = {
+    2: {"TT2": "title", "TP1": "artist", "TAL": "album", "TYE": "year", "TCO": "genre"},
+    3: {"TIT2": "title", "TPE1": "artist", "TALB": "album", "TYER": "year", "TCON": "genre"},
+    4: {"TIT2": "title", "TPE1": "artist", "TALB": "album", "TDRC": "year", "TCON": "genre"},
+}
+
+
+def _id3_text(data):
+    encoding = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}.get(data[:1][0] if data else 0, "latin-1")
+    return data[1:].decode(encoding, "replace").split("\x00")[0].strip()
+
+
+def _read_id3v2(f):
+    head = f.read(10)
+    if len(head) < 10 or head[:3] != b"ID3" or head[3] not in _ID3_FRAMES:
+        return {}
+    version, flags = head[3], head[5]
+    end = _id3v2_size(head) - (10 if flags & 0x10 else 0)
+    wanted = _ID3_FRAMES[version]
+    id_len, header_len = (3, 6) if version == 2 else (4, 10)
+    pos = 10
+    if flags & 0x40 and version >= 3:          # extended header
+        ext = f.read(4)
+        size = struct.unpack(">I", ext)[0]
+        if version == 4:
+            size = (ext[0] << 21 | ext[1] << 14 | ext[2] << 7 | ext[3]) - 4
+        f.seek(size, 1)
+        pos += 4 + size
+    tags = {}
+    while pos + header_len <= end and len(tags) < len(wanted):
+        header = f.read(header_len)
+        frame_id = header[:id_len]
+        if len(header) < header_len or not frame_id.strip(b"\x00"):
+            break                                # padding
+        if version == 2:
+            size = int.from_bytes(header[3:6], "big")
+        elif version == 3:
+            size = struct.unpack(">I", header[4:8])[0]
+        else:
+            size = header[4] << 21 | header[5] << 14 | header[6] << 7 | header[7]
+        field = wanted.get(frame_id.decode("latin-1"))
+        if field:
+            tags[field] = _id3_text(f.read(size))
+        else:
+            f.seek(size, 1)                      # skip album art etc. without reading it
+        pos += header_len + size
+    return tags
+
+
+def _read_id3v1(f):
+    try:
+        f.seek(-128, 2)
+    except OSError:
+        return {}
+    data = f.read(128)
+    if data[:3] != b"TAG":
+        return {}
+    text = lambda b: b.split(b"\x00")[0].decode("latin-1").strip()
+    return {"title": text(data[3:33]), "artist": text(data[33:63]),
+            "album": text(data[63:93]), "year": text(data[93:97])}
+
+
+def read_tags(path):
+    """Song fields for an audio file from its ID3 tags (v2.2-2.4, v1 fallback).
+
+    Missing titles fall back to the file name; duration comes from
+    probe_duration and is formatted like the Add Song form ("m:ss").
+    """
+    tags = {}
+    if path.lower().endswith(".mp3"):
+        try:
+            with open(path, "rb") as f:
+                tags = _read_id3v2(f)
+                if not tags.get("title") or not tags.get("artist"):
+                    for key, value in _read_id3v1(f).items():
+                        if value and not tags.get(key):
+                            tags[key] = value
+        except Exception:
+            pass
+    year = re.match(r"\d{4}", tags.get("year") or "")
+    genre = re.sub(r"^\(\d+\)", "", tags.get("genre") or "").strip()   # "(17)Rock" -> "Rock"
+    seconds = probe_duration(path)
+    return {
+        "title": tags.get("title") or os.path.splitext(os.path.basename(path))[0],
+        "artist": tags.get("artist") or "",
+        "genre": genre,
+        "album": tags.get("album") or "",
+        "year": int(year.group()) if year else None,
+        "duration": f"{int(seconds) // 60}:{int(seconds) % 60:02d}" if seconds else "",
+        "file_path": path,
+    }
+
+
+def iter_audio_files(root):
+    """Paths of all audio files below ``root``, depth first."""
+    stack = [root]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                yield entry.path.replace(os.sep, "/")
+
+
+class MetadataJournal(Journal):
+    """metadata_cache.json: probed metadata by absolute path."""
+    def _empty(self):
+        return {}
+
+    def _decode(self, data):
+        return dict(data)
+
+    def _encode(self, state):
+        return state
+
+    def _apply(self, state, record):
+        state[record["path"]] = record["entry"]
+
+
+class MetadataCache:
+    """Probed durations persisted on disk, keyed by path and validated against
+    the file's size and mtime, so each file is only probed once."""
+    def __init__(self, path="metadata_cache.json"):
+        self._journal = MetadataJournal(path, compact_every=5000)
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is None:
+            try:
+                self._entries = self._journal.load()
+            except Exception as e:
+                print("Failed to load metadata cache:", e)
+                self._entries = {}
+        return self._entries
+
+    def duration(self, file_path):
+        """Cached or freshly probed duration in seconds (None if unknown)."""
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        key = os.path.abspath(file_path)
+        with self._lock:
+            entry = self._load().get(key)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        seconds = probe_duration(file_path)
+        entry = [st.st_size, st.st_mtime_ns, seconds]
+        with self._lock:
+            self._entries[key] = entry
+        try:
+            self._journal.append({"path": key, "entry": entry})
+        except Exception as e:
+            print("Failed to save metadata cache:", e)
+        return seconds
+
+    def close(self):
+        self._journal.close()
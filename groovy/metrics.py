@@ -0,0 +1,139 @@
+"""Latency histograms and counters for the hot paths (opt-in, see METRICS)."""
+import os
+import contextlib
+import json
+import time
+import re
+import threading
+
+
+class Histogram:
+    """Latency histogram over fixed bucket bounds (seconds), Prometheus style."""
+    BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    __slots__ = ("buckets", "count", "total", "max")
+
+    def __init__(self):
+        self.buckets = [0] * (len(self.BOUNDS) + 1)   # last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        i = 0
+        while i < len(self.BOUNDS) and seconds > self.BOUNDS[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation (max for +Inf)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.BOUNDS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {"count": self.count, "sum": self.total, "max": self.max,
+                "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.quantile(0.5), "p95": self.quantile(0.95), "p99": self.quantile(0.99),
+                "buckets": dict(zip([str(b) for b in self.BOUNDS] + ["+Inf"], self.buckets))}
+
+
+class Metrics:
+    """Opt-in registry of latency histograms and counters for hot paths.
+
+    Off by default, and then timed()/instrument()/count() cost one flag
+    check. Turn it on with GROOVY_METRICS=1, the --metrics flag or the
+    switch on the F12 debug panel. dump() writes JSON (.json) or Prometheus
+    text (anything else).
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            with self._lock:
+                self._counters[name] = self._counters.get(name, 0) + n
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def instrument(self, name):
+        """Decorator form of timed()."""
+        def wrap(fn):
+            def timed_fn(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            timed_fn.__name__ = fn.__name__
+            timed_fn.__doc__ = fn.__doc__
+            return timed_fn
+        return wrap
+
+    def snapshot(self):
+        with self._lock:
+            return {"enabled": self.enabled,
+                    "counters": dict(self._counters),
+                    "histograms": {name: h.snapshot() for name, h in sorted(self._histograms.items())}}
+
+    def to_prometheus(self):
+        def metric(name):
+            return "groovy_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+        snap = self.snapshot()
+        lines = []
+        for name, value in sorted(snap["counters"].items()):
+            lines += [f"# TYPE {metric(name)}_total counter", f"{metric(name)}_total {value}"]
+        for name, h in snap["histograms"].items():
+            base = metric(name) + "_seconds"
+            lines.append(f"# TYPE {base} histogram")
+            cumulative = 0
+            for bound, n in h["buckets"].items():
+                cumulative += n
+                lines.append(f'{base}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f"{base}_sum {h['sum']}", f"{base}_count {h['count']}"]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+
+
+METRICS = Metrics(enabled=os.environ.get("GROOVY_METRICS") == "1")
@@ -0,0 +1,1027 @@
+"""Song model and the in-memory data structures: linked list, search and
+similarity indexes, queue, stack and play history."""
+import os
+import sys
+import random
+import json
+import time
+import re
+import heapq
+import math
+import threading
+from bisect import bisect_left, insort
+from collections import deque
+
+from .metrics import METRICS
+
+np = None   # numpy is optional and only imported when a vectorised index asks for it
+
+
+def _numpy():
+    """Import numpy on first use; None when it is not installed."""
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+    return np
+
+
+def _intern(value):
+    # artist/genre/album repeat across thousands of songs; share one str object
+    return sys.intern(value) if type(value) is str else value
+
+
+class Song:
+    # no per-instance __dict__: a large library holds millions of these
+    __slots__ = ("id", "title", "artist", "genre", "album", "year", "duration", "file_path")
+
+    def __init__(self, id, title, artist, genre, album, year=None, duration=None, file_path=None):
+        self.id = id
+        self.title = title
+        self.artist = _intern(artist)
+        self.genre = _intern(genre)
+        self.album = _intern(album)
+        self.year = year
+        self.duration = duration  # optional string like "3:45"
+        self.file_path = file_path
+
+    def __str__(self):
+        return f"{self.id}: {self.title} - {self.artist} ({self.genre})"
+
+
+class User:
+    def __init__(self, username, fullname):
+        self.username = username
+        self.fullname = fullname
+
+
+class Node:
+    __slots__ = ("song", "prev", "next")
+
+    def __init__(self, song):
+        self.song = song
+        self.prev = None
+        self.next = None
+
+
+class SearchIndex:
+    """Inverted index over title, artist and genre.
+
+    Each field keeps token postings (whole words) and trigram postings
+    (substrings). A keyword of three or more characters is answered by
+    intersecting the trigram postings and verifying the few candidates;
+    shorter keywords scan the pre-lowered fields instead of the songs.
+
+    Reads and writes hold a lock, because SearchWorker searches on its own
+    thread while the UI thread may still be streaming songs in.
+    """
+    FIELDS = ("title", "artist", "genre")
+    _TOKEN_RE = re.compile(r"\w+")
+
+    def __init__(self):
+        self._tokens = {f: {} for f in self.FIELDS}
+        self._grams = {f: {} for f in self.FIELDS}
+        self._docs = {}   # id -> (seq, song, lowered field values)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _terms(self, text):
+        return set(self._TOKEN_RE.findall(text))
+
+    def add(self, song):
+        with self._lock:
+            self._insert(song, self._seq)
+            self._seq += 1
+
+    def update(self, song):
+        """Re-index an edited song, keeping its place among equally ranked matches."""
+        values = self._values(song)   # raises on a bad field before the old entry is dropped
+        with self._lock:
+            doc = self._docs.get(song.id)
+            if doc is None:
+                seq = self._seq
+                self._seq += 1
+            else:
+                seq = doc[0]
+                self._remove(song)
+            self._insert(song, seq, values)
+
+    def _values(self, song):
+        return tuple((getattr(song, f) or '').lower() for f in self.FIELDS)
+
+    def _insert(self, song, seq, values=None):
+        if values is None:
+            values = self._values(song)
+        self._docs[song.id] = (seq, song, values)
+        for field, value in zip(self.FIELDS, values):
+            for token in self._terms(value):
+                self._tokens[field].setdefault(token, set()).add(song.id)
+            for gram in self._trigrams(value):
+                self._grams[field].setdefault(gram, set()).add(song.id)
+
+    def remove(self, song):
+        with self._lock:
+            self._remove(song)
+
+    def _remove(self, song):
+        doc = self._docs.pop(song.id, None)
+        if doc is None:
+            return
+        for field, value in zip(self.FIELDS, doc[2]):
+            for postings, keys in ((self._tokens[field], self._terms(value)),
+                                   (self._grams[field], self._trigrams(value))):
+                for key in keys:
+                    ids = postings.get(key)
+                    if ids is not None:
+                        ids.discard(song.id)
+                        if not ids:
+                            del postings[key]
+
+    def _candidates(self, field, keyword):
+        postings = self._grams[field]
+        lists = []
+        for gram in self._trigrams(keyword):
+            ids = postings.get(gram)
+            if not ids:
+                return ()
+            lists.append(ids)
+        lists.sort(key=len)
+        return lists[0].intersection(*lists[1:])
+
+    def estimate(self, keyword, field=None):
+        """Upper bound on the songs matching ``keyword`` (in ``field``, or any field), from posting sizes only."""
+        with self._lock:
+            return self._estimate(keyword.lower(), field)
+
+    def _estimate(self, keyword, field):
+        if len(keyword) < 3:
+            return len(self._docs)
+        total = 0
+        for f in (self.FIELDS if field is None else (field,)):
+            postings = self._grams[f]
+            total += min(len(postings.get(gram, ())) for gram in self._trigrams(keyword))
+        return min(total, len(self._docs))
+
+    def matches(self, keyword, field):
+        """Songs whose ``field`` contains ``keyword``, in no particular order."""
+        with self._lock:
+            return self._matches(keyword.lower(), field)
+
+    def _matches(self, keyword, field):
+        rank = self.FIELDS.index(field)
+        if len(keyword) >= 3:
+            ids = [i for i in self._candidates(field, keyword) if keyword in self._docs[i][2][rank]]
+        else:
+            ids = [i for i, doc in self._docs.items() if keyword in doc[2][rank]]
+        return [self._docs[i][1] for i in ids]
+
+    @METRICS.instrument("search")
+    def search(self, keyword, offset=0, limit=None, cancelled=None):
+        """Return matching songs ranked title > artist > genre, then by list order.
+
+        ``cancelled()`` is polled while scanning; once it returns True the
+        search gives up early with [] (and releases the lock).
+        """
+        with self._lock:
+            return self._search(keyword.lower(), offset, limit, cancelled)
+
+    def _search(self, keyword, offset, limit, cancelled=None):
+        if not keyword:
+            ranked = ((doc[0], doc[1]) for doc in self._docs.values())
+            songs = [song for _, song in sorted(ranked, key=lambda r: r[0])]
+            return songs[offset:offset + limit] if limit is not None else songs[offset:]
+
+        ranks = {}   # id -> field rank of the best matching field
+        if len(keyword) >= 3:
+            for rank, field in enumerate(self.FIELDS):
+                for n, song_id in enumerate(self._candidates(field, keyword)):
+                    if cancelled is not None and not n & 4095 and cancelled():
+                        return []
+                    if song_id not in ranks and keyword in self._docs[song_id][2][rank]:
+                        ranks[song_id] = rank
+        else:
+            for n, (song_id, (_, _, values)) in enumerate(self._docs.items()):
+                if cancelled is not None and not n & 4095 and cancelled():
+                    return []
+                for rank, value in enumerate(values):
+                    if keyword in value:
+                        ranks[song_id] = rank
+                        break
+
+        def sort_key(song_id):
+            rank = ranks[song_id]
+            # whole-word hits go before substring hits within the same field
+            exact = song_id in self._tokens[self.FIELDS[rank]].get(keyword, ())
+            return (rank, 0 if exact else 1, self._docs[song_id][0])
+
+        if limit is not None:
+            ordered = heapq.nsmallest(offset + limit, ranks, key=sort_key)[offset:]
+        else:
+            ordered = sorted(ranks, key=sort_key)[offset:]
+        return [self._docs[song_id][1] for song_id in ordered]
+
+
+class DoublyLinkedList:
+    def __init__(self, searchable=True):
+        self.head = None
+        self.tail = None
+        self.size = 0
+        # id -> list of nodes carrying that id, in list order. Almost always a
+        # single node; a playlist may hold the same song more than once.
+        self._index = {}
+        # secondary indexes see each id once, when it first enters the list
+        # and when its last node leaves it
+        self._indexes = []
+        # the trigram index costs ~2 KB a song; playlists go without (searchable=False)
+        self.search_index = self.attach(SearchIndex()) if searchable else None
+
+    def attach(self, index):
+        """Register an index exposing add(song)/remove(song) and keep it in sync.
+
+        An index may also offer add_many(songs), used for the initial fill,
+        and update(song), called after a song was edited in place (otherwise
+        it gets remove + add; remove must work from what the index stored).
+        """
+        songs = (nodes[0].song for nodes in self._index.values())
+        add_many = getattr(index, "add_many", None)
+        if add_many is not None:
+            add_many(songs)
+        else:
+            for song in songs:
+                index.add(song)
+        self._indexes.append(index)
+        return index
+
+    def add(self, song: Song):
+        if song.id not in self._index:
+            # indexes first: if one rejects the song the list is left as it was
+            self._index_all(song)
+        new_node = Node(song)
+        if self.head is None:
+            self.head = self.tail = new_node
+        else:
+            self.tail.next = new_node
+            new_node.prev = self.tail
+            self.tail = new_node
+        self._index.setdefault(song.id, []).append(new_node)
+        self.size += 1
+        return True
+
+    def _index_all(self, song):
+        done = []
+        try:
+            for index in self._indexes:
+                index.add(song)
+                done.append(index)
+        except Exception:
+            for index in done:
+                index.remove(song)
+            raise
+
+    def delete(self, song_id):
+        nodes = self._index.get(song_id)
+        if not nodes:
+            return False
+        current = nodes.pop(0)
+        if not nodes:
+            del self._index[song_id]
+            for index in self._indexes:
+                index.remove(current.song)
+        if current.prev:
+            current.prev.next = current.next
+        else:
+            self.head = current.next
+        if current.next:
+            current.next.prev = current.prev
+        else:
+            self.tail = current.prev
+        self.size -= 1
+        return True
+
+    EDITABLE = ("title", "artist", "genre", "album", "year", "duration", "file_path")
+
+    def update(self, song_id, **fields):
+        """Edit a song in place and re-index it; returns the song (None if unknown).
+
+        With no fields it only re-indexes, e.g. a playlist sharing a Song
+        object that was edited through the library.
+        """
+        nodes = self._index.get(song_id)
+        if not nodes:
+            return None
+        song = nodes[0].song
+        for field in fields:
+            if field not in self.EDITABLE:
+                raise ValueError(f"cannot edit {field!r}")
+        old = {field: getattr(song, field) for field in fields}
+        for field, value in fields.items():
+            setattr(song, field, _intern(value) if field in ("artist", "genre", "album") else value)
+        try:
+            self._reindex(song)
+        except Exception:
+            # an index rejected the new values: put the old ones back everywhere
+            for field, value in old.items():
+                setattr(song, field, value)
+            self._reindex(song)
+            raise
+        return song
+
+    def _reindex(self, song):
+        for index in self._indexes:
+            update = getattr(index, "update", None)
+            if update is not None:
+                update(song)
+            else:
+                index.remove(song)
+                index.add(song)
+
+    def search(self, keyword, offset=0, limit=None, cancelled=None):
+        if self.search_index is None:
+            keyword = keyword.lower()
+            songs = [s for s in self.get_all()
+                     if any(keyword in (getattr(s, f) or "").lower() for f in SearchIndex.FIELDS)]
+            return songs[offset:offset + limit] if limit is not None else songs[offset:]
+        return self.search_index.search(keyword, offset, limit, cancelled)
+
+    def get_all(self):
+        songs = []
+        current = self.head
+        while current:
+            songs.append(current.song)
+            current = current.next
+        return songs
+
+    def find_node(self, song_id):
+        nodes = self._index.get(song_id)
+        return nodes[0] if nodes else None
+
+    def find_by_id(self, song_id):
+        node = self.find_node(song_id)
+        return node.song if node else None
+
+    def slice(self, offset=0, limit=None):
+        """Songs ``offset`` .. ``offset + limit`` in list order, walked from the nearer end."""
+        stop = self.size if limit is None else min(self.size, offset + limit)
+        if offset >= stop:
+            return []
+        songs = []
+        if offset <= self.size - stop:
+            node = self.head
+            for _ in range(offset):
+                node = node.next
+            for _ in range(stop - offset):
+                songs.append(node.song)
+                node = node.next
+        else:
+            node = self.tail
+            for _ in range(self.size - stop):
+                node = node.prev
+            for _ in range(stop - offset):
+                songs.append(node.song)
+                node = node.prev
+            songs.reverse()
+        return songs
+
+    def resolve(self, song_ids):
+        """Songs for ``song_ids`` straight from the id index; unknown ids are skipped."""
+        index = self._index
+        return [nodes[0].song for nodes in map(index.get, song_ids) if nodes]
+
+    def owns(self, node):
+        """True if ``node`` is still linked into this list."""
+        return any(n is node for n in self._index.get(node.song.id, ()))
+
+    def __contains__(self, song_id):
+        return song_id in self._index
+
+
+class _Bucket:
+    """Set of songs with O(1) add, remove and random sampling."""
+    __slots__ = ("songs", "_pos")
+
+    def __init__(self):
+        self.songs = []
+        self._pos = {}
+
+    def add(self, song):
+        if song.id not in self._pos:
+            self._pos[song.id] = len(self.songs)
+            self.songs.append(song)
+
+    def remove(self, song_id):
+        i = self._pos.pop(song_id, None)
+        if i is None:
+            return
+        last = self.songs.pop()
+        if i < len(self.songs):
+            self.songs[i] = last
+            self._pos[last.id] = i
+
+    def sample(self, k):
+        return self.songs if len(self.songs) <= k else random.sample(self.songs, k)
+
+    def __len__(self):
+        return len(self.songs)
+
+
+class SimilarityIndex:
+    """Songs bucketed by artist, album, genre and year, kept in sync with the
+    library. similar() scores a bounded random sample from the buckets the
+    song falls into, so its cost does not grow with the library.
+    """
+    FIELDS = ("artist", "album", "genre", "year")
+    WEIGHTS = (4, 3, 2, 1)
+
+    def __init__(self, sample_size=32, vectorized=False):
+        self.sample_size = sample_size
+        self.buckets = {f: {} for f in self.FIELDS}
+        self.everything = _Bucket()
+        self._keys = {}   # id -> bucket keys, in FIELDS order
+        self.scorer = FeatureScorer() if vectorized and _numpy() is not None else None
+
+    @staticmethod
+    def keys(song):
+        # text fields compare case-insensitively; blanks never make songs similar
+        return tuple((getattr(song, f) or "").casefold() or None for f in ("artist", "album", "genre")) \
+            + (song.year if isinstance(song.year, int) else None,)
+
+    def add(self, song):
+        keys = self.keys(song)
+        self._keys[song.id] = keys
+        self.everything.add(song)
+        for field, key in zip(self.FIELDS, keys):
+            if key is not None:
+                self.buckets[field].setdefault(key, _Bucket()).add(song)
+        if self.scorer is not None:
+            self.scorer.add(song, keys)
+
+    def remove(self, song):
+        keys = self._keys.pop(song.id, None)
+        if keys is None:
+            return
+        self.everything.remove(song.id)
+        for field, key in zip(self.FIELDS, keys):
+            bucket = self.buckets[field].get(key)
+            if bucket is not None:
+                bucket.remove(song.id)
+                if not bucket:
+                    del self.buckets[field][key]
+        if self.scorer is not None:
+            self.scorer.remove(song.id)
+
+    def bucket(self, field, key):
+        """Songs whose ``field`` equals ``key`` (already casefolded for text)."""
+        bucket = self.buckets[field].get(key)
+        return bucket.songs if bucket else []
+
+    def score(self, keys, other):
+        other = self._keys.get(other.id) or self.keys(other)
+        total = 0
+        for weight, a, b in zip(self.WEIGHTS[:3], keys, other):
+            if a is not None and a == b:
+                total += weight
+        if keys[3] is not None and other[3] is not None and abs(keys[3] - other[3]) <= 1:
+            total += self.WEIGHTS[3]
+        return total
+
+    def similar(self, song, k=5, exclude=()):
+        """Up to k songs sharing features with ``song``, best first.
+
+        Ties are broken randomly so repeated calls do not keep returning the
+        same neighbour. IDs in ``exclude`` (e.g. recently played) are skipped.
+        """
+        keys = self._keys.get(song.id) or self.keys(song)
+        if self.scorer is not None:
+            # whole artist/album buckets, so every song scoring 4+ is seen
+            return self.scorer.top_k(song.id, keys, k, exclude, self._candidates(keys, whole=("artist", "album")))
+        candidates = {}
+        for other in self._candidates(keys):
+            if other.id != song.id and other.id not in exclude:
+                candidates[other.id] = other
+        ranked = sorted(candidates.values(), key=lambda o: (-self.score(keys, o), random.random()))
+        return ranked[:k]
+
+    def _candidates(self, keys, whole=()):
+        """Songs in the buckets ``keys`` fall into: whole for fields in ``whole``, else a sample."""
+        for field, key in zip(self.FIELDS, keys):
+            if key is None:
+                continue
+            for value in ((key - 1, key, key + 1) if field == "year" else (key,)):
+                bucket = self.buckets[field].get(value)
+                if bucket is not None:
+                    yield from (bucket.songs if field in whole else bucket.sample(self.sample_size))
+
+    def random_song(self, exclude=()):
+        for other in self.everything.sample(len(exclude) + 1):
+            if other.id not in exclude:
+                return other
+        return None
+
+
+class FeatureScorer:
+    """NumPy variant of SimilarityIndex scoring: rates the candidate songs (or
+    every song) in one vectorised pass and keeps the top k with argpartition."""
+    _NO_YEAR = -(1 << 30)
+
+    def __init__(self, capacity=1024):
+        self._codes = ({}, {}, {})         # artist/album/genre key -> int code
+        self._cols = np.zeros((4, capacity), dtype=np.int64)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._songs = [None] * capacity
+        self._rows = {}                    # song id -> row
+        self._free = []
+        self._used = 0                     # rows ever handed out
+
+    def _encode(self, keys, query=False):
+        codes = []
+        for table, key in zip(self._codes, keys[:3]):
+            if key is None:
+                codes.append(-2 if query else -1)   # a blank never matches a blank
+            elif query:
+                codes.append(table.get(key, -3))
+            else:
+                codes.append(table.setdefault(key, len(table)))
+        codes.append(keys[3] if keys[3] is not None else self._NO_YEAR * (2 if query else 1))
+        return codes
+
+    def add(self, song, keys):
+        if self._free:
+            row = self._free.pop()
+        else:
+            row = self._used
+            self._used += 1
+            if row == len(self._songs):
+                grow = len(self._songs)
+                self._cols = np.concatenate([self._cols, np.zeros((4, grow), dtype=np.int64)], axis=1)
+                self._alive = np.concatenate([self._alive, np.zeros(grow, dtype=bool)])
+                self._songs.extend([None] * grow)
+        self._cols[:, row] = self._encode(keys)
+        self._alive[row] = True
+        self._songs[row] = song
+        self._rows[song.id] = row
+
+    def remove(self, song_id):
+        row = self._rows.pop(song_id, None)
+        if row is not None:
+            self._alive[row] = False
+            self._songs[row] = None
+            self._free.append(row)
+
+    def top_k(self, song_id, keys, k, exclude=(), candidates=None):
+        """Best k songs; only ``candidates`` are scored when given, else every row (O(n))."""
+        if candidates is None:
+            rows = np.arange(self._used)
+            rows = rows[self._alive[:self._used]]
+        else:
+            rows = np.unique(np.fromiter((self._rows[s.id] for s in candidates), dtype=np.int64))
+        skip = [self._rows[i] for i in (song_id, *exclude) if i in self._rows]
+        if skip:
+            rows = rows[~np.isin(rows, skip)]
+        n = len(rows)
+        if not n:
+            return []
+        artist, album, genre, year = self._encode(keys, query=True)
+        cols = self._cols[:, rows]
+        score = (4 * (cols[0] == artist) + 3 * (cols[1] == album) + 2 * (cols[2] == genre)
+                 + (np.abs(cols[3] - year) <= 1)).astype(np.float64)
+        score += np.random.random(n) * 0.5      # random tie-break within a score
+        k = min(k, n)
+        top = np.argpartition(-score, k - 1)[:k]
+        top = top[np.argsort(-score[top])]
+        return [self._songs[rows[i]] for i in top if score[i] >= 1]
+
+
+def parse_duration(text):
+    """Seconds in an "m:ss" / "h:mm:ss" (or plain seconds) string; None if it is not one."""
+    if isinstance(text, (int, float)):
+        return text
+    parts = (text or "").strip().split(":")
+    if len(parts) > 3 or not all(p.isdigit() for p in parts):
+        return None
+    seconds = 0
+    for part in parts:
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+class SortedIndex:
+    """Songs ordered by one field, kept in step with the list it is attached to.
+
+    A bucketed sorted list: entries sit in sorted chunks of at most 2 * LOAD,
+    found by bisecting the chunk maxima, and a Fenwick tree over the chunk
+    lengths maps a position to (chunk, offset) and back. Indexing, page()
+    and position() are O(log n); add/remove shift one short chunk. Ties are
+    broken by id and blanks sort last.
+    """
+    FIELDS = ("title", "artist", "album", "genre", "year", "duration")
+    LOAD = 256
+    _LAST = "\U0010ffff"   # sorts after any casefolded text
+
+    def __init__(self, field):
+        if field not in self.FIELDS:
+            raise ValueError(f"cannot sort by {field!r}")
+        self.field = field
+        self._chunks = []   # sorted lists of (key, id, song)
+        self._maxes = []    # last entry of each chunk
+        self._tree = []     # Fenwick tree over the chunk lengths
+        self._keys = {}     # id -> key at insertion; the song may be edited in place later
+        self.size = 0
+
+    def key(self, song):
+        return self.sort_key(self.field, song)
+
+    @classmethod
+    def sort_key(cls, field, song):
+        """What ``song`` is ordered by in a SortedIndex over ``field``."""
+        value = getattr(song, field)
+        if field == "year":
+            return value if isinstance(value, int) else math.inf
+        if field == "duration":
+            value = parse_duration(value)
+            return math.inf if value is None else value
+        value = (value or "").casefold()
+        if not value:
+            return cls._LAST
+        # titles are unique enough; the other fields repeat across many songs
+        return value if field == "title" else sys.intern(value)
+
+    def _blank(self):
+        return math.inf if self.field in ("year", "duration") else self._LAST
+
+    #  Fenwick tree
+    def _rebuild(self):
+        tree = [len(chunk) for chunk in self._chunks]
+        for i in range(len(tree)):
+            j = i | (i + 1)
+            if j < len(tree):
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def _grow(self, i, delta):
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i |= i + 1
+
+    def _prefix(self, i):
+        """Number of entries in chunks[:i]."""
+        total = 0
+        while i > 0:
+            total += self._tree[i - 1]
+            i &= i - 1
+        return total
+
+    def _locate(self, pos):
+        """(chunk, offset) of the entry at ``pos``."""
+        tree = self._tree
+        i = 0
+        step = 1 << (len(tree).bit_length() - 1) if tree else 0
+        while step:
+            j = i + step
+            if j <= len(tree) and tree[j - 1] <= pos:
+                pos -= tree[j - 1]
+                i = j
+            step >>= 1
+        return i, pos
+
+    #  index protocol (see DoublyLinkedList.attach)
+    def add(self, song):
+        key = self._keys[song.id] = self.key(song)
+        entry = (key, song.id, song)
+        chunks, maxes = self._chunks, self._maxes
+        self.size += 1
+        if not chunks:
+            chunks.append([entry])
+            maxes.append(entry)
+            self._rebuild()
+            return
+        i = bisect_left(maxes, entry)
+        if i == len(maxes):
+            i -= 1
+            chunks[i].append(entry)
+            maxes[i] = entry
+        else:
+            insort(chunks[i], entry)
+        chunk = chunks[i]
+        if len(chunk) > 2 * self.LOAD:
+            chunks.insert(i + 1, chunk[self.LOAD:])
+            del chunk[self.LOAD:]
+            maxes[i] = chunk[-1]
+            maxes.insert(i + 1, chunks[i + 1][-1])
+            self._rebuild()
+        else:
+            self._grow(i, 1)
+
+    def add_many(self, songs):
+        if self.size:
+            for song in songs:
+                self.add(song)
+            return
+        # initial fill: one sort instead of a bisect per song
+        entries = []
+        for song in songs:
+            key = self._keys[song.id] = self.key(song)
+            entries.append((key, song.id, song))
+        entries.sort()   # ids are unique, so songs themselves are never compared
+        self._chunks = [entries[i:i + self.LOAD] for i in range(0, len(entries), self.LOAD)]
+        self._maxes = [chunk[-1] for chunk in self._chunks]
+        self.size = len(entries)
+        self._rebuild()
+
+    def remove(self, song):
+        key = self._keys.pop(song.id, None)
+        if key is None:
+            return
+        entry = (key, song.id)   # sorts just before the stored (key, id, song)
+        i = bisect_left(self._maxes, entry)
+        chunk = self._chunks[i]
+        j = bisect_left(chunk, entry)
+        del chunk[j]
+        self.size -= 1
+        if not chunk:
+            del self._chunks[i]
+            del self._maxes[i]
+            self._rebuild()
+        else:
+            if j == len(chunk):
+                self._maxes[i] = chunk[-1]
+            self._grow(i, -1)
+
+    #  queries
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += self.size
+        if not 0 <= pos < self.size:
+            raise IndexError("SortedIndex index out of range")
+        i, j = self._locate(pos)
+        return self._chunks[i][j][2]
+
+    def _bisect(self, probe):
+        """Number of entries that sort before ``probe``."""
+        i = bisect_left(self._maxes, probe)
+        if i == len(self._maxes):
+            return self.size
+        return self._prefix(i) + bisect_left(self._chunks[i], probe)
+
+    def position(self, song):
+        """Position of ``song`` in sort order, or None if it is not indexed."""
+        key = self._keys.get(song.id)
+        if key is None:
+            return None
+        return self._bisect((key, song.id))
+
+    def span(self, lo=None, hi=None, lo_open=False, hi_open=False):
+        """(start, stop) positions of the keys between ``lo`` and ``hi``.
+
+        A None bound is unbounded on that side; blanks are never included.
+        (key,) sorts before every entry with that key and (key, inf) after.
+        """
+        start = 0 if lo is None else self._bisect((lo, math.inf) if lo_open else (lo,))
+        if hi is None:
+            stop = self._bisect((self._blank(),))
+        else:
+            stop = self._bisect((hi,) if hi_open else (hi, math.inf))
+        return start, max(start, stop)
+
+    def neighbour(self, song, step=1):
+        """The song ``step`` places after ``song`` (before, if negative), or None."""
+        pos = self.position(song)
+        if pos is None or not 0 <= pos + step < self.size:
+            return None
+        return self[pos + step]
+
+    def page(self, offset=0, limit=None, reverse=False):
+        """Songs ``offset`` .. ``offset + limit`` in sort order, or in reverse order."""
+        stop = self.size if limit is None else min(self.size, offset + limit)
+        if offset >= stop:
+            return []
+        lo, hi = (self.size - stop, self.size - offset) if reverse else (offset, stop)
+        i, j = self._locate(lo)
+        songs = []
+        while len(songs) < hi - lo:
+            songs.extend(e[2] for e in self._chunks[i][j:j + hi - lo - len(songs)])
+            i, j = i + 1, 0
+        if reverse:
+            songs.reverse()
+        return songs
+
+    def view(self, reverse=False):
+        return SortedView(self, reverse)
+
+
+class SortedView:
+    """Read-only sequence over a SortedIndex, ascending or descending.
+
+    It is what the list views page through: len() and indexing go straight
+    to the index, nothing is copied.
+    """
+    __slots__ = ("index", "reverse")
+
+    def __init__(self, index, reverse=False):
+        self.index = index
+        self.reverse = reverse
+
+    def __len__(self):
+        return self.index.size
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            start, stop, stride = pos.indices(self.index.size)
+            if stride != 1:
+                return [self[i] for i in range(start, stop, stride)]
+            return self.index.page(start, max(0, stop - start), self.reverse)
+        if pos < 0:
+            pos += self.index.size
+        if not 0 <= pos < self.index.size:
+            raise IndexError("SortedView index out of range")
+        return self.index[self.index.size - 1 - pos if self.reverse else pos]
+
+    def position(self, song):
+        pos = self.index.position(song)
+        if pos is None or not self.reverse:
+            return pos
+        return self.index.size - 1 - pos
+
+
+class Queue:
+    """Up-next queue on a deque: O(1) enqueue, dequeue and play-next."""
+    def __init__(self):
+        self.items = deque()
+
+    def enqueue(self, song):
+        self.items.append(song)
+
+    def enqueue_many(self, songs):
+        self.items.extend(songs)
+
+    def play_next(self, song):
+        """Put a song at the front so it plays right after the current one."""
+        self.items.appendleft(song)
+
+    def dequeue(self):
+        return self.items.popleft() if self.items else None
+
+    def peek(self):
+        return self.items[0] if self.items else None
+
+    def remove_at(self, position):
+        """Remove and return the song at a 0-based position (None if out of range)."""
+        if not 0 <= position < len(self.items):
+            return None
+        song = self.items[position]
+        del self.items[position]
+        return song
+
+    def remove_song(self, song_id):
+        """Drop every queued copy of a song, e.g. after it left the library."""
+        kept = [s for s in self.items if s.id != song_id]
+        removed = len(self.items) - len(kept)
+        if removed:
+            self.items = deque(kept)
+        return removed
+
+    def clear(self):
+        self.items.clear()
+
+    def get_all(self):
+        return list(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+class Stack:
+    """Fixed-capacity ring buffer; pushing onto a full stack drops the oldest item."""
+    def __init__(self, capacity=20):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._top = 0    # slot the next push writes to
+        self._size = 0
+
+    def push(self, song):
+        self._items[self._top] = song
+        self._top = (self._top + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def recent(self, n=None):
+        """Newest-first list of at most n items, without copying the rest."""
+        n = self._size if n is None else max(0, min(n, self._size))
+        return [self._items[(self._top - 1 - i) % self.capacity] for i in range(n)]
+
+    def get_all(self):
+        return self.recent()[::-1]
+
+    def __len__(self):
+        return self._size
+
+
+class PlayHistory:
+    """Listening history with per-song play counts and last-played times.
+
+    Recent plays live in a Stack ring buffer. Each play appends one line to
+    ``history.log`` carrying the song's new cumulative count, so replay is
+    idempotent. Every ``roll_every`` plays the totals are written to
+    ``history.json`` and the log starts over, keeping it bounded.
+    """
+    def __init__(self, path="history.log", capacity=20, roll_every=200):
+        self.path = path
+        self.stats_path = os.path.splitext(path)[0] + ".json"
+        self.roll_every = max(roll_every, capacity)
+        self.plays = Stack(capacity)
+        self.play_counts = {}
+        self.last_played = {}
+        self._recent_ids = deque(maxlen=capacity)   # ids of self.plays, for persistence
+        self._file = None
+        self._logged = 0
+
+    def load(self, resolve):
+        """Restore history; ``resolve(song_id)`` maps IDs back to Song objects."""
+        try:
+            with open(self.stats_path, "r") as f:
+                data = json.load(f)
+            for song_id, count, ts in data.get("plays", []):
+                self.play_counts[song_id] = count
+                self.last_played[song_id] = ts
+            self._recent_ids.extend(data.get("recent", []))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print("Failed to load history:", e)
+        try:
+            with open(self.path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # torn last write
+                    self.play_counts[entry["id"]] = entry["count"]
+                    self.last_played[entry["id"]] = entry["ts"]
+                    self._recent_ids.append(entry["id"])
+                    self._logged += 1
+        except FileNotFoundError:
+            pass
+        for song_id in self._recent_ids:
+            song = resolve(song_id)
+            if song:
+                self.plays.push(song)
+
+    def push(self, song):
+        now = time.time()
+        count = self.play_counts.get(song.id, 0) + 1
+        self.play_counts[song.id] = count
+        self.last_played[song.id] = now
+        self.plays.push(song)
+        self._recent_ids.append(song.id)
+        try:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(json.dumps({"id": song.id, "ts": now, "count": count}) + "\n")
+            self._file.flush()
+            self._logged += 1
+            if self._logged >= self.roll_every:
+                self._roll()
+        except Exception as e:
+            print("Failed to save history:", e)
+
+    def _roll(self):
+        data = {
+            "plays": [[i, c, self.last_played.get(i)] for i, c in self.play_counts.items()],
+            "recent": list(self._recent_ids),
+        }
+        tmp_path = self.stats_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.stats_path)
+        if self._file is not None:
+            self._file.close()
+        self._file = open(self.path, "w")
+        self._logged = 0
+
+    def recent(self, n=None):
+        return self.plays.recent(n)
+
+    def get_all(self):
+        return self.plays.get_all()
+
+    def play_count(self, song_id):
+        return self.play_counts.get(song_id, 0)
+
+    def last_played_at(self, song_id):
+        return self.last_played.get(song_id)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
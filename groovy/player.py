@@ -0,0 +1,537 @@
+"""Playlists, per-user sessions and the MusicPlayer core."""
+import os
+import json
+import threading
+from urllib.parse import quote
+
+from .metadata import MetadataCache
+from .metrics import METRICS
+from .models import Song, DoublyLinkedList, SimilarityIndex, SortedIndex, Queue, PlayHistory
+from .storage import DEFAULT_PLAYLIST, PlaylistFiles, JsonStorage
+
+
+class PlaylistManager:
+    """Named playlists, each a DoublyLinkedList built the first time it is opened.
+
+    Membership tests go through the list's id index and ids are resolved in
+    bulk through the library's index, so opening a playlist is O(n) dict
+    lookups. Persistence stays with MusicPlayer.record_playlist_*.
+    """
+    def __init__(self, storage, library):
+        self.storage = storage
+        self.library = library
+        self.active_name = DEFAULT_PLAYLIST
+        self._lists = {}     # name -> DoublyLinkedList, opened playlists only
+        self._names = None   # all names, read from storage on first use
+
+    def names(self):
+        if self._names is None:
+            try:
+                self._names = list(self.storage.list_playlists())
+            except Exception as e:
+                print("Failed to list playlists:", e)
+                self._names = []
+            if DEFAULT_PLAYLIST not in self._names:
+                self._names.insert(0, DEFAULT_PLAYLIST)
+        return list(self._names)
+
+    def __contains__(self, name):
+        return name in self.names()
+
+    def get(self, name=None):
+        """The playlist called ``name`` (default: the active one), loading it if needed."""
+        name = self.active_name if name is None else name
+        songs = self._lists.get(name)
+        if songs is None:
+            songs = DoublyLinkedList(searchable=False)
+            try:
+                ids = self.storage.load_playlist(name) if name in self else []
+            except Exception as e:
+                print("Failed to load playlist:", e)
+                ids = []
+            for song in self.library.resolve(ids):
+                songs.add(song)
+            self._lists[name] = songs
+        return songs
+
+    @property
+    def active(self):
+        return self.get()
+
+    def loaded(self):
+        """(name, songs) for the playlists opened so far."""
+        return list(self._lists.items())
+
+    def select(self, name):
+        if name not in self:
+            return False
+        self.active_name = name
+        return True
+
+    def create(self, name):
+        name = name.strip()
+        if not name or name in self:
+            return False
+        try:
+            self.storage.save_playlist([], name)
+        except Exception as e:
+            print("Failed to save playlist:", e)
+            return False
+        self._names.append(name)
+        self._lists[name] = DoublyLinkedList(searchable=False)
+        return True
+
+    def delete(self, name):
+        if name == DEFAULT_PLAYLIST or name not in self:
+            return False
+        try:
+            self.storage.delete_playlist(name)
+        except Exception as e:
+            print("Failed to delete playlist:", e)
+            return False
+        self._names.remove(name)
+        self._lists.pop(name, None)
+        if self.active_name == name:
+            self.active_name = DEFAULT_PLAYLIST
+        return True
+
+    def reload(self):
+        """Forget opened playlists; they are read again from storage on next use."""
+        self._lists.clear()
+        self._names = None
+
+
+class UserSession:
+    """One account's state over the shared library.
+
+    Favorites, listening history, the up-next queue, named playlists and
+    navigation settings belong to a session. Songs stay in the single
+    MusicPlayer.library and sessions only keep ids, so a session is a few
+    kilobytes in memory and on disk whatever the size of the library.
+    The default session (username None) uses the top-level files: history.log,
+    the storage's playlists and session.json.
+    """
+    def __init__(self, username, library, path, playlist_storage, history_capacity=20):
+        self.username = username
+        self.library = library
+        self.path = path
+        self.playlist_storage = playlist_storage
+        self.history_capacity = history_capacity
+        self.favorites = set()
+        self.history = PlayHistory(os.path.join(path, "history.log"), capacity=history_capacity)
+        self.queue = Queue()
+        self.playlists = PlaylistManager(playlist_storage, library)
+        self.nav = {"current_mode": "library", "list_order": "asc", "sort_by": None}
+        self.loaded = False   # save() is a no-op until load() has read the files
+        self._stored_queue = None   # (ids on disk, the ones resolved) after a load mid-stream
+
+    @classmethod
+    def for_user(cls, username, library, root="users", history_capacity=20):
+        """Session whose files live in ``root``/<username>/."""
+        path = os.path.join(root, quote(username, safe=""))
+        return cls(username, library, path, PlaylistFiles(os.path.join(path, "playlists")), history_capacity)
+
+    @property
+    def state_path(self):
+        return os.path.join(self.path, "session.json")
+
+    def load(self, complete=True):
+        """(Re)read everything; call once the library is loaded so ids resolve.
+
+        With complete=False (the library is still streaming in) queue ids
+        that do not resolve yet are kept: save() writes the stored queue as it
+        was, or, once the queue has been changed, the new queue followed by
+        those ids.
+        """
+        try:
+            with open(self.state_path, "r") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = {}
+        except Exception as e:
+            print("Failed to load session:", e)
+            data = {}
+        self.favorites = set(data.get("favorites", []))
+        self.queue.clear()
+        queue_ids = data.get("queue", [])
+        songs = self.library.resolve(queue_ids)
+        self.queue.enqueue_many(songs)
+        self._stored_queue = None
+        if not complete and len(songs) < len(queue_ids):
+            self._stored_queue = (queue_ids, [song.id for song in songs])
+        self.nav.update(data.get("nav", {}))
+        self.playlists.reload()
+        self.playlists.select(data.get("playlist", DEFAULT_PLAYLIST))
+        # a fresh PlayHistory, loading twice would push the recent plays twice
+        self.history.close()
+        self.history = PlayHistory(self.history.path, capacity=self.history_capacity)
+        self.history.load(self.library.find_by_id)
+        self.loaded = True
+
+    def save(self):
+        """Write favorites, queue, navigation and the active playlist name."""
+        if not self.loaded:
+            return   # the empty in-memory state would overwrite what is on disk
+        queue = [song.id for song in self.queue.get_all()]
+        if self._stored_queue is not None:
+            stored, resolved = self._stored_queue
+            if queue == resolved:
+                queue = stored   # untouched since a partial load: keep what was on disk
+            else:
+                resolved = set(resolved)
+                queue += [i for i in stored if i not in resolved]
+        data = {
+            "favorites": sorted(self.favorites),
+            "queue": queue,
+            "nav": self.nav,
+            "playlist": self.playlists.active_name,
+        }
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            print("Failed to save session:", e)
+
+    def toggle_favorite(self, song_id):
+        if song_id in self.favorites:
+            self.favorites.remove(song_id)
+            added = False
+        else:
+            self.favorites.add(song_id)
+            added = True
+        self.save()
+        return added
+
+    def close(self, close_storage=True):
+        self.save()
+        self.history.close()
+        if close_storage:
+            self.playlist_storage.close()
+
+
+class MusicPlayer:
+    """Core player logic and in-memory data storage.
+
+    With autoload=False nothing is read at construction; the caller drives
+    iter_load_library() (then load_playlist() and load_history()) at its own pace.
+    """
+    def __init__(self, storage=None, autoload=True, history_capacity=20, vectorized_similarity=False):
+        self.library = DoublyLinkedList()
+        self.similarity = self.library.attach(SimilarityIndex(vectorized=vectorized_similarity))
+        self.history_capacity = history_capacity
+        self.last_id = 0       # highest song id handed out so far, see get_next_id
+        self.library_loaded = False   # iter_load_library ran to the end
+        self.current_song = None
+        self.is_playing = False
+        self.current_mode = "library"
+        self.list_order = "asc"
+        self.sort_by = None    # None: library order; else a SortedIndex field next/prev walk by
+        self._sorted = {}      # field -> SortedIndex over the library, see sorted_index
+        self._sorted_lock = threading.Lock()   # API readers may ask for the same index at once
+        self._cursor = None    # Node of current_song, see _current_node
+        self._similar_pick = None   # (song, its similar pick), see _similar_to_current
+        self.metadata = MetadataCache("metadata_cache.json")
+        self.storage = storage if storage is not None else JsonStorage()
+        # favorites / history / queue / playlists belong to the active session
+        self.default_session = UserSession(None, self.library, ".", self.storage, history_capacity)
+        self.session = self.default_session
+
+        # Load saved data
+        if autoload:
+            self.load_library()
+            self.load_session()   # after the library so IDs resolve correctly
+
+    #  sessions
+    @property
+    def favorites(self):
+        return self.session.favorites
+
+    @property
+    def history(self):
+        return self.session.history
+
+    @property
+    def queue(self):
+        return self.session.queue
+
+    @property
+    def playlists(self):
+        return self.session.playlists
+
+    def load_session(self):
+        self.session.load(self.library_loaded)
+        if not self.default_session.loaded:
+            # someone logged in while the library was still streaming in
+            self.default_session.load(self.library_loaded)
+        self.current_mode = self.session.nav.get("current_mode", "library")
+        self.list_order = self.session.nav.get("list_order", "asc")
+        self.sort_by = self.session.nav.get("sort_by")
+
+    def switch_session(self, username):
+        """Make ``username``'s session active (None: the default session).
+
+        The previous user session is saved and closed, so only one is held in
+        memory at a time; switching back reads its few small files again.
+        """
+        if username == self.session.username:
+            return self.session
+        previous = self.session
+        previous.nav = self._nav()
+        if previous is self.default_session:
+            previous.save()
+        else:
+            previous.close()
+        if username is None:
+            self.session = self.default_session
+        else:
+            self.session = UserSession.for_user(username, self.library, history_capacity=self.history_capacity)
+            self.session.load(self.library_loaded)
+        self.current_mode = self.session.nav.get("current_mode", "library")
+        self.list_order = self.session.nav.get("list_order", "asc")
+        self.sort_by = self.session.nav.get("sort_by")
+        self._cursor = None
+        self._similar_pick = None
+        return self.session
+
+    def _nav(self):
+        return {"current_mode": self.current_mode, "list_order": self.list_order, "sort_by": self.sort_by}
+
+    def get_next_id(self, count=1):
+        """Reserve ``count`` new song ids and return the first (O(1)).
+
+        Ids count up from a persisted high-water mark instead of max(id) + 1,
+        so a deleted song's id is never reused: unopened playlists and other
+        users' sessions may still hold it.
+        """
+        first = self.last_id + 1
+        self.last_id += count
+        try:
+            self.storage.save_last_id(self.last_id)
+        except Exception as e:
+            print("Failed to save last song id:", e)
+        return first
+
+    @property
+    def playlist(self):
+        """The active named playlist."""
+        return self.playlists.active
+
+    #  playlist persistence 
+    @METRICS.instrument("save_playlist")
+    def save_playlist(self, name=None):
+        """Simpan playlist ke storage sebagai list ID lagu."""
+        name = self.playlists.active_name if name is None else name
+        try:
+            self.playlists.storage.save_playlist([song.id for song in self.playlists.get(name).get_all()], name)
+        except Exception as e:
+            print("Failed to save playlist:", e)
+
+    def load_playlist(self):
+        """Muat playlist aktif dari storage; yang lain dimuat saat dibuka."""
+        self.playlists.reload()
+        self.playlists.active
+
+    def load_history(self):
+        """Reload the active session (history is read together with the rest)."""
+        self.load_session()
+
+    def record_playlist_added(self, song_id, name=None):
+        try:
+            self.playlists.storage.add_to_playlist(song_id, self.playlists.active_name if name is None else name)
+        except Exception as e:
+            print("Failed to save playlist:", e)
+
+    def record_playlist_removed(self, song_id, name=None):
+        try:
+            self.playlists.storage.remove_from_playlist(song_id, self.playlists.active_name if name is None else name)
+        except Exception as e:
+            print("Failed to save playlist:", e)
+
+    #  library persistence 
+    @staticmethod
+    def _song_record(s):
+        return {
+            "id": s.id,
+            "title": s.title,
+            "artist": s.artist,
+            "genre": s.genre,
+            "album": s.album,
+            "year": s.year,
+            "duration": s.duration,
+            "file_path": s.file_path
+        }
+
+    @METRICS.instrument("save_library")
+    def save_library(self):
+        """Tulis ulang seluruh library ke storage (full flush)."""
+        try:
+            self.storage.save_songs([self._song_record(s) for s in self.library.get_all()])
+        except Exception as e:
+            print("Failed to save library:", e)
+
+    def load_library(self):
+        try:
+            for _ in self.iter_load_library():
+                pass
+        except Exception as e:
+            print("Failed to load library:", e)
+
+    def iter_load_library(self, batch_size=500):
+        """Stream songs from storage into the library batch by batch.
+
+        Yields the library size after each batch. Records are parsed and
+        turned into Song objects only as the generator is advanced, so a GUI
+        can render the first page while the rest is still on disk.
+        """
+        last_id = self.storage.load_last_id()
+        if not last_id:
+            # no mark yet (library saved before it existed): read all ids once, up
+            # front, so a song added mid-load cannot take the id of one not read yet
+            last_id = self.storage.max_song_id()
+            if last_id:
+                self.storage.save_last_id(last_id)
+        self.last_id = max(self.last_id, last_id)
+        batch = []
+        for record in self.storage.iter_songs():
+            batch.append(record)
+            if len(batch) >= batch_size:
+                self._add_records(batch)
+                batch = []
+                yield self.library.size
+        if batch:
+            self._add_records(batch)
+            yield self.library.size
+        self.library_loaded = True
+
+    def _add_records(self, records):
+        for s in records:
+            song = Song(
+                s.get("id"),
+                s.get("title"),
+                s.get("artist"),
+                s.get("genre"),
+                s.get("album"),
+                s.get("year"),
+                s.get("duration"),
+                s.get("file_path")
+            )
+            # avoid duplicate IDs if repeated load
+            if song.id not in self.library:
+                self.library.add(song)
+                if isinstance(song.id, int) and song.id > self.last_id:
+                    self.last_id = song.id
+
+    def record_song_added(self, song):
+        """Persist one added song (O(1), no full rewrite)."""
+        try:
+            self.storage.add_song(self._song_record(song))
+        except Exception as e:
+            print("Failed to save library:", e)
+
+    def record_song_updated(self, song):
+        try:
+            self.storage.update_song(self._song_record(song))
+        except Exception as e:
+            print("Failed to save library:", e)
+
+    def record_song_deleted(self, song_id):
+        try:
+            self.storage.delete_song(song_id)
+        except Exception as e:
+            print("Failed to save library:", e)
+
+    def close(self):
+        """Finish pending storage work (e.g. journal compaction) and close it."""
+        self.session.nav = self._nav()
+        if self.session is not self.default_session:
+            self.session.close()
+        self.default_session.close(close_storage=False)
+        self.storage.close()
+        self.metadata.close()
+
+    #  navigation helpers 
+    def sorted_index(self, field):
+        """The library ordered by ``field``; built on first use, then kept in sync."""
+        index = self._sorted.get(field)
+        if index is None:
+            with self._sorted_lock:
+                index = self._sorted.get(field)
+                if index is None:
+                    index = self._sorted[field] = self.library.attach(SortedIndex(field))
+        return index
+
+    def find_similar_song(self, current_song, recent=10):
+        """Best-matching other song, avoiding the last ``recent`` plays when possible."""
+        exclude = {s.id for s in self.history.recent(recent)}
+        exclude.add(current_song.id)
+        picks = self.similarity.similar(current_song, k=1, exclude=exclude)
+        if not picks:
+            # everything similar was just played; a repeat beats a random jump
+            picks = self.similarity.similar(current_song, k=1)
+        if picks:
+            return picks[0]
+        return (self.similarity.random_song(exclude)
+                or self.similarity.random_song({current_song.id}))
+
+    def _active_list(self):
+        return self.playlist if self.current_mode == "playlist" else self.library
+
+    def _current_node(self):
+        """Node of current_song in the list being navigated (O(1)).
+
+        The cursor is reused while it still points at current_song inside the
+        active list; after a mode switch or a delete it is looked up again
+        through the list's id index.
+        """
+        songs = self._active_list()
+        node = self._cursor
+        if node is None or node.song is not self.current_song or not songs.owns(node):
+            node = songs.find_node(self.current_song.id)
+        self._cursor = node
+        return node
+
+    def _step(self, forward, move=True):
+        """Neighbour of the current song in visual order (desc walks the list backwards)."""
+        if not self.current_song or not self._active_list().size:
+            return None
+        ahead = forward == (self.list_order != "desc")
+        if self.current_mode == "library" and self.sort_by:
+            nxt = self.sorted_index(self.sort_by).neighbour(self.current_song, 1 if ahead else -1)
+            if nxt:
+                return nxt
+        else:
+            node = self._current_node()
+            nxt = node and (node.next if ahead else node.prev)
+            if nxt:
+                if move:
+                    self._cursor = nxt
+                return nxt.song
+        # fallback: similar
+        return self._similar_to_current() if forward else self.find_similar_song(self.current_song)
+
+    def _similar_to_current(self):
+        # remembered per song, so peek_next_song and next_song agree on the pick
+        pick = self._similar_pick
+        if pick is None or pick[0] is not self.current_song:
+            pick = self._similar_pick = (self.current_song, self.find_similar_song(self.current_song))
+        return pick[1]
+
+    def next_song(self):
+        # the up-next queue always wins over list order
+        queued = self.queue.dequeue()
+        if queued:
+            return queued
+        return self._step(forward=True)
+
+    def peek_next_song(self):
+        """What next_song() will return, without consuming the queue or moving."""
+        queued = self.queue.peek()
+        if queued:
+            return queued
+        return self._step(forward=True, move=False)
+
+    def prev_song(self):
+        return self._step(forward=False)
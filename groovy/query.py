@@ -0,0 +1,179 @@
+"""Structured library filters: ``genre:pop artist:hindia year>=2000 duration<4:00``."""
+import operator
+import re
+
+from .models import SortedIndex, parse_duration
+
+
+class QueryError(ValueError):
+    """The query text could not be understood; the message says why."""
+
+
+# field -> kind; text fields compare case-insensitively
+FIELDS = {"title": "text", "artist": "text", "album": "text", "genre": "text",
+          "year": "number", "duration": "duration"}
+
+_TOKEN_RE = re.compile(r'(?P<field>[A-Za-z_]+)(?P<op><=|>=|:|=|<|>|~)(?:"(?P<quoted>[^"]*)"|(?P<value>[^\s"]*))'
+                       r'|"(?P<phrase>[^"]*)"|(?P<word>\S+)')
+_COMPARE = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+            ":": operator.eq, "=": operator.eq}
+
+
+class Predicate:
+    """One condition of a query, plus how to answer it from an index.
+
+    ``kind`` picks the index: "hash" (SimilarityIndex buckets, exact text
+    or year), "range" (SortedIndex span), "text" (SearchIndex trigram
+    postings) or "scan" (no index, walk the library). estimate() is cheap
+    and exact for hash/range, an upper bound for text.
+    """
+    def __init__(self, field, op, value):
+        self.field = field     # None for free text
+        self.op = op
+        self.value = value
+        if field is None:
+            self.kind = "text"
+            self.value = value.lower()
+        elif FIELDS[field] == "text":
+            if op in _COMPARE and op not in (":", "="):
+                raise QueryError(f"{field} can only be matched with : or ~")
+            # titles are matched by substring even with ':'; nobody types a whole title
+            if op == "~" or field == "title":
+                self.op = "~"
+                self.value = value.lower()
+                self.kind = "text" if field in ("title", "artist", "genre") else "scan"
+            else:
+                self.value = value.casefold()
+                self.kind = "hash"
+        else:
+            if op == "~":
+                raise QueryError(f"{field} cannot be matched with ~")
+            number = parse_duration(value) if FIELDS[field] == "duration" else (
+                int(value) if value.isdigit() else None)
+            if number is None:
+                raise QueryError(f"bad {field}: {value!r}")
+            self.value = number
+            self.kind = "hash" if field == "year" and op in (":", "=") else "range"
+
+    def __repr__(self):
+        if self.field is None:
+            return repr(self.value)
+        return f"{self.field}{self.op}{self.value!r}"
+
+    def _span(self, engine):
+        index = engine.player.sorted_index(self.field)
+        v, op = self.value, self.op
+        if op in (":", "="):
+            return index, index.span(v, v)
+        if op in ("<", "<="):
+            return index, index.span(None, v, hi_open=op == "<")
+        return index, index.span(v, None, lo_open=op == ">")
+
+    def estimate(self, engine):
+        library = engine.player.library
+        if self.kind == "hash":
+            return len(engine.player.similarity.bucket(self.field, self.value))
+        if self.kind == "range":
+            _, (start, stop) = self._span(engine)
+            return stop - start
+        if self.kind == "text":
+            return library.search_index.estimate(self.value, self.field)
+        return library.size
+
+    def fetch(self, engine):
+        """Every song matching this predicate alone, via its index."""
+        library = engine.player.library
+        if self.kind == "hash":
+            return list(engine.player.similarity.bucket(self.field, self.value))
+        if self.kind == "range":
+            index, (start, stop) = self._span(engine)
+            return index.page(start, stop - start)
+        if self.kind == "text":
+            if self.field is None:
+                return library.search(self.value)
+            return library.search_index.matches(self.value, self.field)
+        return [song for song in library.get_all() if self.test(song)]
+
+    def test(self, song):
+        if self.field is None:
+            return any(self.value in (getattr(song, f) or "").lower() for f in ("title", "artist", "genre"))
+        value = getattr(song, self.field)
+        if self.op == "~":
+            return self.value in (value or "").lower()
+        kind = FIELDS[self.field]
+        if kind == "text":
+            return bool(value) and value.casefold() == self.value
+        if kind == "duration":
+            value = parse_duration(value)
+        elif not isinstance(value, int):
+            value = None
+        return value is not None and _COMPARE[self.op](value, self.value)
+
+
+def parse_query(text):
+    """Predicates of ``text``; bare words and "quoted phrases" search title/artist/genre."""
+    predicates = []
+    for match in _TOKEN_RE.finditer(text or ""):
+        field = match.group("field")
+        if field is not None:
+            field = field.lower()
+            if field not in FIELDS:
+                raise QueryError(f"unknown field {field!r} (use {', '.join(FIELDS)})")
+            value = match.group("quoted")
+            if value is None:
+                value = match.group("value")
+            if not value:
+                raise QueryError(f"{field}{match.group('op')} needs a value")
+            predicates.append(Predicate(field, match.group("op"), value))
+        else:
+            word = match.group("phrase")
+            if word is None:
+                word = match.group("word")
+            if word.strip():
+                predicates.append(Predicate(None, ":", word.strip()))
+    return predicates
+
+
+class QueryEngine:
+    """Answers parsed queries from the library's indexes.
+
+    The planner estimates every predicate, fetches the most selective one
+    through its index and checks the rest song by song on those candidates,
+    so a query never walks the whole library unless nothing narrower exists.
+    Results are in library id order unless ``sort_by`` asks otherwise.
+    """
+    def __init__(self, player):
+        self.player = player
+
+    def plan(self, predicates):
+        """[(estimate, predicate)], cheapest first."""
+        estimated = [(p.estimate(self), i, p) for i, p in enumerate(predicates)]
+        estimated.sort(key=lambda e: e[:2])
+        return [(n, p) for n, _, p in estimated]
+
+    def explain(self, text):
+        return [{"predicate": repr(p), "index": p.kind, "estimate": n} for n, p in self.plan(parse_query(text))]
+
+    def run(self, text, offset=0, limit=None, sort_by=None, descending=False):
+        if sort_by and sort_by not in SortedIndex.FIELDS:
+            raise QueryError(f"cannot sort by {sort_by!r}")
+        predicates = parse_query(text)
+        if not predicates:
+            if sort_by:
+                return self.player.sorted_index(sort_by).page(offset, limit, reverse=descending)
+            if descending:
+                songs = self.player.library.get_all()
+                songs.reverse()
+                return songs[offset:] if limit is None else songs[offset:offset + limit]
+            return self.player.library.slice(offset, limit)
+
+        plan = self.plan(predicates)
+        if plan[0][0] == 0:
+            return []
+        rest = [p for _, p in plan[1:]]
+        songs = [s for s in plan[0][1].fetch(self) if all(p.test(s) for p in rest)]
+        if sort_by:
+            songs.sort(key=lambda s: (SortedIndex.sort_key(sort_by, s), s.id), reverse=descending)
+        else:
+            songs.sort(key=lambda s: s.id, reverse=descending)
+        return songs[offset:] if limit is None else songs[offset:offset + limit]
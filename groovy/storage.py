@@ -0,0 +1,381 @@
+"""Storage backends for the library and named playlists (JSON files or SQLite)."""
+import os
+import json
+import threading
+from urllib.parse import quote, unquote
+
+from .journal import LibraryJournal, PlaylistJournal
+
+
+DEFAULT_PLAYLIST = "My Playlist"
+
+
+class Storage:
+    """Interface between MusicPlayer and wherever songs/playlists are kept.
+
+    Songs travel as plain record dicts (see MusicPlayer._song_record) and each
+    named playlist as a list of song IDs. Single-item methods are called on
+    every edit and should be cheap; save_* are full flushes.
+    """
+    def load_songs(self):
+        raise NotImplementedError
+
+    def iter_songs(self):
+        """Yield song records one at a time; backends override to stream."""
+        return iter(self.load_songs())
+
+    def save_songs(self, records):
+        raise NotImplementedError
+
+    def add_song(self, record):
+        raise NotImplementedError
+
+    def delete_song(self, song_id):
+        raise NotImplementedError
+
+    def update_song(self, record):
+        """Replace the stored fields of ``record["id"]``, keeping its position."""
+        raise NotImplementedError
+
+    def load_last_id(self):
+        """Highest song id ever handed out, deleted songs included (0: unknown)."""
+        return 0
+
+    def save_last_id(self, last_id):
+        pass
+
+    def max_song_id(self):
+        """Largest integer id stored; backends override with something cheaper than a full read."""
+        return max((r.get("id") for r in self.iter_songs() if isinstance(r.get("id"), int)), default=0)
+
+    def list_playlists(self):
+        raise NotImplementedError
+
+    def load_playlist(self, name=DEFAULT_PLAYLIST):
+        raise NotImplementedError
+
+    def save_playlist(self, song_ids, name=DEFAULT_PLAYLIST):
+        raise NotImplementedError
+
+    def add_to_playlist(self, song_id, name=DEFAULT_PLAYLIST):
+        raise NotImplementedError
+
+    def remove_from_playlist(self, song_id, name=DEFAULT_PLAYLIST):
+        raise NotImplementedError
+
+    def delete_playlist(self, name):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PlaylistFiles:
+    """Named playlists as one snapshot/journal pair each in ``playlist_dir``.
+
+    This is the playlist half of the Storage interface. JsonStorage keeps its
+    playlists this way, and so does every UserSession under users/<name>/.
+    """
+    def __init__(self, playlist_dir="playlists"):
+        self.playlist_dir = playlist_dir
+        self._playlists = {}   # name -> PlaylistJournal, opened on first use
+
+    def migrate_legacy(self, path):
+        """Split an old single playlist.json (flat id list or {name: ids}) into files."""
+        with open(path, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            playlists = data
+        else:
+            journal = PlaylistJournal(path)   # replays playlist.journal as well
+            playlists = {DEFAULT_PLAYLIST: journal.load()}
+            journal.close()
+        for name, song_ids in playlists.items():
+            self.save_playlist(song_ids, name)
+        for legacy in (path, os.path.splitext(path)[0] + ".journal"):
+            if os.path.exists(legacy):
+                os.replace(legacy, legacy + ".bak")
+
+    def _journal(self, name):
+        journal = self._playlists.get(name)
+        if journal is None:
+            os.makedirs(self.playlist_dir, exist_ok=True)
+            path = os.path.join(self.playlist_dir, quote(name, safe=" ") + ".json")
+            journal = self._playlists[name] = PlaylistJournal(path)
+        return journal
+
+    def list_playlists(self):
+        names = set(self._playlists)
+        try:
+            for filename in os.listdir(self.playlist_dir):
+                for ext in (".json", ".journal", ".journal.1"):
+                    if filename.endswith(ext):
+                        names.add(unquote(filename[:-len(ext)]))
+        except FileNotFoundError:
+            pass
+        return sorted(names)
+
+    def load_playlist(self, name=DEFAULT_PLAYLIST):
+        return self._journal(name).load()
+
+    def save_playlist(self, song_ids, name=DEFAULT_PLAYLIST):
+        self._journal(name).write_snapshot(list(song_ids))
+
+    def add_to_playlist(self, song_id, name=DEFAULT_PLAYLIST):
+        self._journal(name).append({"op": "add", "id": song_id})
+
+    def remove_from_playlist(self, song_id, name=DEFAULT_PLAYLIST):
+        self._journal(name).append({"op": "delete", "id": song_id})
+
+    def delete_playlist(self, name):
+        journal = self._journal(name)
+        journal.close()
+        del self._playlists[name]
+        for path in (journal.snapshot_path, journal.journal_path, journal.rotated_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        for journal in self._playlists.values():
+            journal.close()
+
+
+class JsonStorage(Storage):
+    """Default backend: songs.json plus one snapshot/journal pair per playlist
+    in ``playlist_dir``, so editing one playlist never rewrites the others.
+
+    An old single playlist.json (flat id list or {name: ids}) is split into
+    that directory on first start and kept as playlist.json.bak.
+    """
+    def __init__(self, songs_path="songs.json", playlist_path="playlist.json", playlist_dir="playlists"):
+        self.library_journal = LibraryJournal(songs_path)
+        self.last_id_path = os.path.splitext(songs_path)[0] + ".last_id"
+        self.playlist_files = PlaylistFiles(playlist_dir)
+        if not os.path.isdir(playlist_dir) and os.path.exists(playlist_path):
+            self.playlist_files.migrate_legacy(playlist_path)
+
+    def load_songs(self):
+        return list(self.library_journal.load().values())
+
+    def iter_songs(self):
+        return self.library_journal.iter_records()
+
+    def save_songs(self, records):
+        self.library_journal.write_snapshot({r["id"]: r for r in records})
+
+    def add_song(self, record):
+        self.library_journal.append({"op": "add", "song": record})
+
+    def delete_song(self, song_id):
+        self.library_journal.append({"op": "delete", "id": song_id})
+
+    def update_song(self, record):
+        self.library_journal.append({"op": "update", "song": record})
+
+    def load_last_id(self):
+        try:
+            with open(self.last_id_path, "r") as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            print("Failed to load last song id:", e)
+            return 0
+
+    def save_last_id(self, last_id):
+        tmp_path = self.last_id_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(last_id))
+        os.replace(tmp_path, self.last_id_path)
+
+    def list_playlists(self):
+        return self.playlist_files.list_playlists()
+
+    def load_playlist(self, name=DEFAULT_PLAYLIST):
+        return self.playlist_files.load_playlist(name)
+
+    def save_playlist(self, song_ids, name=DEFAULT_PLAYLIST):
+        self.playlist_files.save_playlist(song_ids, name)
+
+    def add_to_playlist(self, song_id, name=DEFAULT_PLAYLIST):
+        self.playlist_files.add_to_playlist(song_id, name)
+
+    def remove_from_playlist(self, song_id, name=DEFAULT_PLAYLIST):
+        self.playlist_files.remove_from_playlist(song_id, name)
+
+    def delete_playlist(self, name):
+        self.playlist_files.delete_playlist(name)
+
+    def close(self):
+        self.library_journal.close()
+        self.playlist_files.close()
+
+
+class SqliteStorage(Storage):
+    """SQLite backend. Edits are single-row statements, and the query_* helpers
+    let tools read a large library in place without building Song objects."""
+    COLUMNS = ("id", "title", "artist", "genre", "album", "year", "duration", "file_path")
+
+    def __init__(self, path="groovy.db"):
+        import sqlite3   # imported here so JSON-only users do not load it
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS songs (
+                    id INTEGER PRIMARY KEY,
+                    title TEXT, artist TEXT, genre TEXT, album TEXT,
+                    year INTEGER, duration TEXT, file_path TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_songs_artist ON songs(artist);
+                CREATE INDEX IF NOT EXISTS idx_songs_genre ON songs(genre);
+                CREATE INDEX IF NOT EXISTS idx_songs_year ON songs(year);
+                CREATE TABLE IF NOT EXISTS playlists (
+                    name TEXT PRIMARY KEY
+                );
+                CREATE TABLE IF NOT EXISTS playlist_songs (
+                    position INTEGER PRIMARY KEY AUTOINCREMENT,
+                    playlist TEXT NOT NULL,
+                    song_id INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_playlist_songs_order ON playlist_songs(playlist, position);
+                CREATE INDEX IF NOT EXISTS idx_playlist_songs_song ON playlist_songs(playlist, song_id);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER
+                );
+            """)
+            # databases from before named playlists had a single `playlist` table
+            legacy = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'playlist'").fetchone()
+            if legacy:
+                self._conn.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (DEFAULT_PLAYLIST,))
+                self._conn.execute(
+                    "INSERT INTO playlist_songs (playlist, song_id) "
+                    "SELECT ?, song_id FROM playlist ORDER BY position", (DEFAULT_PLAYLIST,))
+                self._conn.execute("DROP TABLE playlist")
+
+    def _insert_sql(self):
+        return "INSERT OR IGNORE INTO songs (%s) VALUES (%s)" % (
+            ", ".join(self.COLUMNS), ", ".join("?" * len(self.COLUMNS)))
+
+    def _row(self, record):
+        return tuple(record.get(c) for c in self.COLUMNS)
+
+    #  songs
+    def load_songs(self):
+        return list(self.iter_songs())
+
+    def iter_songs(self, batch_size=1000):
+        last_id = None
+        while True:
+            # keyset pagination, so the lock is not held while the caller works
+            with self._lock:
+                if last_id is None:
+                    rows = self._conn.execute(
+                        "SELECT * FROM songs ORDER BY id LIMIT ?", (batch_size,)).fetchall()
+                else:
+                    rows = self._conn.execute(
+                        "SELECT * FROM songs WHERE id > ? ORDER BY id LIMIT ?",
+                        (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield dict(r)
+            last_id = rows[-1]["id"]
+
+    def save_songs(self, records):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM songs")
+            self._conn.executemany(self._insert_sql(), (self._row(r) for r in records))
+
+    def add_song(self, record):
+        with self._lock, self._conn:
+            self._conn.execute(self._insert_sql(), self._row(record))
+
+    def delete_song(self, song_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM songs WHERE id = ?", (song_id,))
+
+    def update_song(self, record):
+        columns = self.COLUMNS[1:]
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE songs SET %s WHERE id = ?" % ", ".join(c + " = ?" for c in columns),
+                               tuple(record.get(c) for c in columns) + (record["id"],))
+
+    def load_last_id(self):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'last_id'").fetchone()
+        return row[0] if row else 0
+
+    def max_song_id(self):
+        with self._lock:
+            return self._conn.execute("SELECT MAX(id) FROM songs").fetchone()[0] or 0
+
+    def save_last_id(self, last_id):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_id', ?)", (last_id,))
+
+    #  playlists
+    def list_playlists(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT name FROM playlists ORDER BY name")]
+
+    def load_playlist(self, name=DEFAULT_PLAYLIST):
+        with self._lock:
+            return [r[0] for r in self._conn.execute(
+                "SELECT song_id FROM playlist_songs WHERE playlist = ? ORDER BY position", (name,))]
+
+    def save_playlist(self, song_ids, name=DEFAULT_PLAYLIST):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (name,))
+            self._conn.execute("DELETE FROM playlist_songs WHERE playlist = ?", (name,))
+            self._conn.executemany("INSERT INTO playlist_songs (playlist, song_id) VALUES (?, ?)",
+                                   ((name, i) for i in song_ids))
+
+    def add_to_playlist(self, song_id, name=DEFAULT_PLAYLIST):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (name,))
+            self._conn.execute("INSERT INTO playlist_songs (playlist, song_id) VALUES (?, ?)", (name, song_id))
+
+    def remove_from_playlist(self, song_id, name=DEFAULT_PLAYLIST):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM playlist_songs WHERE position = "
+                "(SELECT MIN(position) FROM playlist_songs WHERE playlist = ? AND song_id = ?)", (name, song_id))
+
+    def delete_playlist(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM playlist_songs WHERE playlist = ?", (name,))
+            self._conn.execute("DELETE FROM playlists WHERE name = ?", (name,))
+
+    #  in-place queries
+    def get_song(self, song_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM songs WHERE id = ?", (song_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count_songs(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM songs").fetchone()[0]
+
+    def query_songs(self, artist=None, genre=None, year=None, offset=0, limit=None):
+        """Records matching the given fields, served from the column indexes."""
+        where, args = [], []
+        for column, value in (("artist", artist), ("genre", genre), ("year", year)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                args.append(value)
+        sql = "SELECT * FROM songs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY id LIMIT ? OFFSET ?"
+        args += [-1 if limit is None else limit, offset]
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(sql, args)]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
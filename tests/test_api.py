@@ -0,0 +1,109 @@
+"""ApiServer request validation: bad payloads are a 400 and leave the library alone."""
+import asyncio
+import json
+
+import pytest
+
+from groovy import ApiServer, JsonStorage, MusicPlayer
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    player = MusicPlayer(storage=JsonStorage())
+    server = ApiServer(player, port=0)
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(server.start())
+
+    def call(method, target, body=None):
+        raw = b"" if body is None else json.dumps(body).encode()
+        return loop.run_until_complete(server._dispatch(method, target, raw))
+
+    call("POST", "/songs", {"title": "Hello", "artist": "Adele", "genre": "Pop", "year": 2015, "duration": "4:55"})
+    yield call, player
+    server._server.close()
+    loop.close()
+    server.close()
+    player.close()
+
+
+def consistent(player):
+    library = player.library
+    songs = library.get_all()
+    assert len(songs) == library.size == len(library._index)
+    assert len(library.search_index._docs) == library.size
+    assert len(player.similarity._keys) == library.size
+    return songs
+
+
+@pytest.mark.parametrize("body", [
+    {"title": 5},
+    {"title": ["a"]},
+    {"title": "x", "artist": 7},
+    {"title": "x", "genre": {"a": 1}},
+    {"title": "x", "album": 1.5},
+    {"title": "x", "file_path": 3},
+    {"title": "x", "year": "abc"},
+    {"title": "x", "year": True},
+    {"title": "x", "year": 19.5},
+    {"title": "x", "duration": ["3:00"]},
+    {"title": "x", "duration": False},
+    {},
+])
+def test_bad_new_song(api, body):
+    call, player = api
+    status, payload = call("POST", "/songs", body)
+    assert status == 400, payload
+    assert [s.title for s in consistent(player)] == ["Hello"]
+    # a rejected add must not use up an id
+    status, payload = call("POST", "/songs", {"title": "Next"})
+    assert status == 201 and payload["id"] == 2
+
+
+@pytest.mark.parametrize("body", [
+    {"title": 9},
+    {"artist": ["x"]},
+    {"year": "20x5"},
+    {"duration": {"m": 3}},
+    {"colour": "red"},
+])
+def test_bad_edit(api, body):
+    call, player = api
+    status, payload = call("PATCH", "/songs/1", body)
+    assert status == 400, payload
+    song = consistent(player)[0]
+    assert (song.title, song.artist, song.year, song.duration) == ("Hello", "Adele", 2015, "4:55")
+    assert player.library.search("hel") == [song]
+
+
+def test_good_add_and_edit(api):
+    call, player = api
+    status, payload = call("POST", "/songs", {"title": "Someone", "artist": None, "year": "2011", "duration": 285})
+    assert status == 201 and payload["year"] == 2011
+    status, payload = call("PATCH", "/songs/1", {"title": "Hello Again", "year": ""})
+    assert status == 200 and payload["title"] == "Hello Again" and payload["year"] is None
+    assert [s.title for s in player.library.search("again")] == ["Hello Again"]
+    consistent(player)
+
+
+@pytest.mark.parametrize("target, body", [
+    ("/queue", {"id": "abc"}),
+    ("/queue", {"id": True}),
+    ("/queue", {"ids": 5}),
+    ("/queue", {"ids": [1, "x"]}),
+    ("/queue", {"album": 3}),
+    ("/queue", [1]),
+    ("/queue", {}),
+    ("/playlists/My%20Playlist/songs", {}),
+])
+def test_bad_ids(api, target, body):
+    call, player = api
+    status, payload = call("POST", target, body)
+    assert status == 400, payload
+    assert len(player.queue) == 0
+
+
+def test_unknown_song_is_404(api):
+    call, _ = api
+    assert call("POST", "/queue", {"id": 99})[0] == 404
+    assert call("PATCH", "/songs/99", {"title": "x"})[0] == 404
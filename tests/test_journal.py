@@ -0,0 +1,134 @@
+"""Snapshot + journal persistence: streaming reads agree with load() and a plain model."""
+import io
+import json
+import os
+import random
+
+import pytest
+
+from groovy import LibraryJournal, PlaylistJournal, iter_json_array
+
+
+def record(song_id, version=0):
+    return {"id": song_id, "title": f"song {song_id} v{version}"}
+
+
+def apply(model, op):
+    """What LibraryJournal does with one op, on a plain dict."""
+    if op["op"] == "add":
+        model.setdefault(op["song"]["id"], op["song"])
+    elif op["op"] == "delete":
+        model.pop(op["id"], None)
+    elif op["song"]["id"] in model:
+        model[op["song"]["id"]] = op["song"]
+
+
+def random_op(rng, version):
+    song_id = rng.randint(1, 40)
+    kind = rng.choice(("add", "add", "delete", "update"))
+    if kind == "delete":
+        return {"op": "delete", "id": song_id}
+    return {"op": kind, "song": record(song_id, version)}
+
+
+def check(path, model):
+    streamed = list(LibraryJournal(path).iter_records())
+    loaded = list(LibraryJournal(path).load().values())
+    assert streamed == loaded == list(model.values())
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_iter_records_matches_load(tmp_path, seed):
+    rng = random.Random(seed)
+    path = str(tmp_path / "songs.json")
+    journal = LibraryJournal(path, compact_every=10**6)
+    model = {}
+    for version in range(300):
+        roll = rng.random()
+        if roll < 0.02:
+            journal.write_snapshot(dict(model))
+        elif roll < 0.04:
+            journal.compact(wait=True)
+        elif roll < 0.05 and os.path.exists(journal.journal_path):
+            # a compaction that was cut short leaves the rotated journal behind
+            journal.close()
+            with open(journal.journal_path) as src, open(journal.rotated_path, "a") as dst:
+                dst.write(src.read())
+            os.remove(journal.journal_path)
+        else:
+            op = random_op(rng, version)
+            journal.append(op)
+            apply(model, op)
+        if version % 25 == 0:
+            journal.close()
+            check(path, model)
+    journal.close()
+    check(path, model)
+
+
+def test_update_keeps_snapshot_position(tmp_path):
+    path = str(tmp_path / "songs.json")
+    journal = LibraryJournal(path)
+    journal.write_snapshot({i: record(i) for i in (1, 2, 3)})
+    journal.append({"op": "update", "song": record(2, 1)})
+    journal.append({"op": "add", "song": record(4)})
+    journal.append({"op": "update", "song": record(9, 1)})   # unknown id: ignored
+    journal.close()
+    assert [r["title"] for r in LibraryJournal(path).iter_records()] == \
+        ["song 1 v0", "song 2 v1", "song 3 v0", "song 4 v0"]
+
+
+def test_delete_then_add_moves_to_the_end(tmp_path):
+    path = str(tmp_path / "songs.json")
+    journal = LibraryJournal(path)
+    journal.write_snapshot({i: record(i) for i in (1, 2, 3)})
+    journal.append({"op": "delete", "id": 1})
+    journal.append({"op": "add", "song": record(1, 1)})
+    journal.close()
+    assert [r["id"] for r in LibraryJournal(path).iter_records()] == [2, 3, 1]
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    path = str(tmp_path / "songs.json")
+    journal = LibraryJournal(path)
+    journal.append({"op": "add", "song": record(1)})
+    journal.close()
+    with open(journal.journal_path, "a") as f:
+        f.write('{"op": "add", "song": {"id": 2')
+    assert [r["id"] for r in LibraryJournal(path).iter_records()] == [1]
+
+
+def test_compaction_folds_the_journal(tmp_path):
+    path = str(tmp_path / "songs.json")
+    journal = LibraryJournal(path, compact_every=5)
+    for i in range(1, 13):
+        journal.append({"op": "add", "song": record(i)})
+    journal.close()
+    assert not os.path.exists(journal.rotated_path)
+    with open(path) as f:
+        assert len(json.load(f)) >= 5   # later rounds may still be in the live journal
+    assert [r["id"] for r in LibraryJournal(path).iter_records()] == list(range(1, 13))
+
+
+def test_playlist_journal(tmp_path):
+    path = str(tmp_path / "playlist.json")
+    journal = PlaylistJournal(path)
+    journal.write_snapshot([3, 1, 3])
+    journal.append({"op": "add", "id": 5})
+    journal.append({"op": "delete", "id": 3})   # first occurrence only
+    journal.append({"op": "delete", "id": 8})
+    journal.close()
+    assert PlaylistJournal(path).load() == [1, 3, 5]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 1 << 16])
+def test_iter_json_array(chunk_size):
+    items = [{"id": i, "title": "a, [b] \"c\"" * (i % 3)} for i in range(50)] + [1, "x", None, [2, 3]]
+    text = json.dumps(items, indent=4)
+    assert list(iter_json_array(io.StringIO(text), chunk_size)) == items
+    assert list(iter_json_array(io.StringIO(""), chunk_size)) == []
+    assert list(iter_json_array(io.StringIO(" [ ] "), chunk_size)) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO("{}"), chunk_size))
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO("[1, 2"), chunk_size))
@@ -0,0 +1,128 @@
+"""DoublyLinkedList: the chain, the id index and the attached indexes stay in step."""
+import random
+
+import pytest
+
+from groovy import DoublyLinkedList, SimilarityIndex, Song, SortedIndex
+
+
+def song(song_id, title=None, artist="Tulus", genre="Pop"):
+    return Song(song_id, title or f"song {song_id}", artist, genre, "Monokrom", 2016, "3:30")
+
+
+def check(songs, expected):
+    """Walk the chain both ways and compare with ``expected``; returns the ids."""
+    forward = songs.get_all()
+    backward, node = [], songs.tail
+    while node:
+        backward.append(node.song)
+        node = node.prev
+    assert forward == expected == backward[::-1]
+    assert songs.size == len(expected)
+    assert sum(len(nodes) for nodes in songs._index.values()) == len(expected)
+    for s in expected:
+        assert s.id in songs and songs.find_by_id(s.id) is not None
+    assert len(songs.search_index._docs) == len({s.id for s in expected})
+
+
+class Broken:
+    """An index that refuses one song id."""
+    def __init__(self, bad_id):
+        self.bad_id = bad_id
+        self.ids = set()
+
+    def add(self, song):
+        if song.id == self.bad_id:
+            raise ValueError("rejected")
+        self.ids.add(song.id)
+
+    def remove(self, song):
+        self.ids.discard(song.id)
+
+
+def test_random_operations_match_a_plain_list():
+    rng = random.Random(5)
+    songs = DoublyLinkedList()
+    sorted_index = songs.attach(SortedIndex("title"))
+    expected = []
+    pool = [song(i) for i in range(1, 60)]
+    for _ in range(2000):
+        roll = rng.random()
+        if roll < 0.5:
+            s = rng.choice(pool)    # repeats allowed, as in a playlist
+            songs.add(s)
+            expected.append(s)
+        elif roll < 0.8 and expected:
+            s = rng.choice(expected)
+            assert songs.delete(s.id)
+            expected.remove(s)      # first occurrence, like the list
+        elif expected:
+            s = rng.choice(expected)
+            songs.update(s.id, title=f"edited {rng.randint(1, 9)}")
+    check(songs, expected)
+    assert sorted_index.page() == sorted({s.id: s for s in expected}.values(),
+                                         key=lambda s: (s.title.casefold(), s.id))
+    assert not songs.delete(1000)
+
+
+def test_failed_index_add_leaves_the_list_unchanged():
+    songs = DoublyLinkedList()
+    similarity = songs.attach(SimilarityIndex())
+    broken = songs.attach(Broken(bad_id=3))
+    good = [song(1), song(2)]
+    for s in good:
+        songs.add(s)
+    with pytest.raises(ValueError):
+        songs.add(song(3))
+    check(songs, good)
+    assert 3 not in songs and broken.ids == {1, 2}
+    assert set(similarity._keys) == {1, 2}
+    assert songs.search("song 3") == []
+
+
+def test_bad_field_type_on_add():
+    songs = DoublyLinkedList()
+    songs.add(song(1))
+    with pytest.raises(AttributeError):
+        songs.add(Song(2, 5, "x", "y", "z"))
+    check(songs, songs.get_all())
+    assert songs.size == 1
+
+
+def test_failed_update_restores_the_song():
+    songs = DoublyLinkedList()
+    songs.attach(SortedIndex("artist"))
+    hello = song(1, "Hello")
+    songs.add(hello)
+    songs.add(song(2))
+    with pytest.raises(AttributeError):
+        songs.update(1, title=9, artist="Adele")
+    assert (hello.title, hello.artist) == ("Hello", "Tulus")
+    assert songs.search("hel") == [hello]
+    with pytest.raises(ValueError):
+        songs.update(1, colour="red")
+    assert songs.update(99, title="x") is None
+
+
+def test_attach_fills_from_existing_songs():
+    songs = DoublyLinkedList()
+    for i in (3, 1, 2, 1):
+        songs.add(song(i))
+    index = songs.attach(SortedIndex("title"))
+    assert [s.id for s in index.page()] == [1, 2, 3]
+    songs.delete(1)
+    assert [s.id for s in index.page()] == [1, 2, 3]   # one copy of id 1 is still listed
+    songs.delete(1)
+    assert [s.id for s in index.page()] == [2, 3]
+
+
+def test_playlists_go_without_a_search_index():
+    library = DoublyLinkedList()
+    playlist = DoublyLinkedList(searchable=False)
+    for i in range(1, 6):
+        library.add(song(i, artist="Hindia" if i % 2 else "Tulus"))
+        playlist.add(library.find_by_id(i))
+    assert playlist.search_index is None and playlist._indexes == []
+    assert [s.id for s in playlist.search("hindia")] == [1, 3, 5]
+    assert [s.id for s in playlist.search("SONG", 1, 2)] == [2, 3]
+    check(library, library.get_all())
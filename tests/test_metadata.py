@@ -0,0 +1,105 @@
+"""Duration probing, ID3 tags, the metadata cache and folder import."""
+import os
+import struct
+import wave
+
+import pytest
+
+import groovy.metadata
+from groovy import AdminController, JsonStorage, MetadataCache, MusicPlayer, probe_duration, read_tags
+
+FRAME = b"\xff\xfb\x90\x00" + bytes(413)   # MPEG-1 layer III, 128 kbit/s, 44.1 kHz: 417 bytes
+
+
+def id3v23(**frames):
+    ids = {"title": b"TIT2", "artist": b"TPE1", "album": b"TALB", "year": b"TYER", "genre": b"TCON"}
+    body = b""
+    for field, text in frames.items():
+        data = b"\x03" + text.encode()
+        body += ids[field] + struct.pack(">I", len(data)) + b"\x00\x00" + data
+    body += bytes(64)   # padding
+    size = len(body)
+    syncsafe = bytes([(size >> 21) & 0x7F, (size >> 14) & 0x7F, (size >> 7) & 0x7F, size & 0x7F])
+    return b"ID3\x03\x00\x00" + syncsafe + body
+
+
+def write_mp3(path, frames, tag=b""):
+    with open(path, "wb") as f:
+        f.write(tag + FRAME * frames)
+
+
+def write_wav(path, seconds, rate=8000):
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(1)
+        w.setframerate(rate)
+        w.writeframes(bytes(int(seconds * rate)))
+
+
+def test_probe_duration(tmp_path):
+    write_mp3(tmp_path / "cbr.mp3", 2500, id3v23(title="x"))
+    assert probe_duration(str(tmp_path / "cbr.mp3")) == pytest.approx(2500 * 417 * 8 / 128000)
+    write_wav(tmp_path / "a.wav", 1.5)
+    assert probe_duration(str(tmp_path / "a.wav")) == pytest.approx(1.5)
+    (tmp_path / "junk.mp3").write_bytes(b"not audio")
+    assert probe_duration(str(tmp_path / "junk.mp3")) is None
+    assert probe_duration(str(tmp_path / "missing.flac")) is None
+
+
+def test_read_tags(tmp_path):
+    path = str(tmp_path / "track.mp3")
+    write_mp3(path, 2500, id3v23(title="Evaluasi", artist="Hindia", album="Menari", year="2019-11", genre="(13)Pop"))
+    assert read_tags(path) == {"title": "Evaluasi", "artist": "Hindia", "genre": "Pop", "album": "Menari",
+                               "year": 2019, "duration": "1:05", "file_path": path}
+    bare = str(tmp_path / "No Tags.mp3")
+    write_mp3(bare, 10)
+    tags = read_tags(bare)
+    assert (tags["title"], tags["artist"], tags["year"]) == ("No Tags", "", None)
+
+
+def test_cache_probes_each_file_once(tmp_path, monkeypatch):
+    probes = []
+    real = groovy.metadata.probe_duration
+    monkeypatch.setattr(groovy.metadata, "probe_duration", lambda p: probes.append(p) or real(p))
+    path = str(tmp_path / "a.wav")
+    write_wav(path, 2)
+    cache_path = str(tmp_path / "metadata_cache.json")
+
+    cache = MetadataCache(cache_path)
+    assert cache.duration(path) == pytest.approx(2)
+    assert cache.duration(path) == pytest.approx(2)
+    assert len(probes) == 1
+    cache.close()
+
+    cache = MetadataCache(cache_path)
+    assert cache.duration(path) == pytest.approx(2)
+    assert len(probes) == 1
+    write_wav(path, 3)   # changed on disk: probed again
+    os.utime(path, ns=(0, 0))
+    assert cache.duration(path) == pytest.approx(3)
+    assert len(probes) == 2
+    assert cache.duration(str(tmp_path / "missing.wav")) is None
+    cache.close()
+
+
+def test_import_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "music" / "album").mkdir(parents=True)
+    write_mp3(tmp_path / "music" / "album" / "one.mp3", 100, id3v23(title="One", artist="A"))
+    write_mp3(tmp_path / "music" / "two.MP3", 100)
+    write_wav(tmp_path / "music" / "three.wav", 1)
+    (tmp_path / "music" / "cover.jpg").write_bytes(b"")
+
+    player = MusicPlayer(storage=JsonStorage())
+    admin = AdminController(player)
+    seen = []
+    assert admin.import_folder("music", progress=lambda done, total: seen.append((done, total)), workers=2) == 3
+    assert seen[-1] == (3, 3)
+    assert sorted(s.title for s in player.library.get_all()) == ["One", "three", "two"]
+    assert [s.id for s in player.library.get_all()] == [1, 2, 3]
+    assert admin.import_folder("music") == 0   # known files are skipped
+    player.close()
+
+    player = MusicPlayer(storage=JsonStorage())
+    assert player.library.size == 3 and player.get_next_id() == 4
+    player.close()
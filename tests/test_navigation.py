@@ -0,0 +1,71 @@
+"""next_song / prev_song: node cursor, list order, sorted views and the queue."""
+import pytest
+
+from groovy import AdminController, JsonStorage, MusicPlayer, UserController
+
+
+@pytest.fixture
+def player(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    player = MusicPlayer(storage=JsonStorage())
+    admin = AdminController(player)
+    for title, artist in (("Hati-Hati di Jalan", "Tulus"), ("Evaluasi", "Hindia"), ("Bertaut", "Nadin"),
+                          ("Monokrom", "Tulus"), ("Secukupnya", "Hindia")):
+        admin.add_song(title, artist, "Pop", "", "", "", None)
+    yield player
+    player.close()
+
+
+def walk(player, step, n):
+    ids = []
+    for _ in range(n):
+        player.current_song = step()
+        ids.append(player.current_song.id)
+    return ids
+
+
+def test_library_order_both_ways(player):
+    player.current_song = player.library.find_by_id(1)
+    assert walk(player, player.next_song, 4) == [2, 3, 4, 5]
+    assert walk(player, player.prev_song, 2) == [4, 3]
+    player.list_order = "desc"
+    assert walk(player, player.next_song, 2) == [2, 1]
+    assert walk(player, player.prev_song, 1) == [2]
+
+
+def test_cursor_follows_repeats_in_a_playlist(player):
+    user = UserController(player)
+    for song_id in (1, 2, 1, 3):
+        user.add_to_playlist(song_id)
+    player.current_mode = "playlist"
+    player.current_song = player.library.find_by_id(1)
+    # looking song 1 up again would jump back to its first copy and loop 2, 1, 2, ...
+    assert walk(player, player.next_song, 3) == [2, 1, 3]
+    assert walk(player, player.prev_song, 2) == [1, 2]
+
+
+def test_cursor_survives_deletes(player):
+    player.current_song = player.library.find_by_id(2)
+    assert player.peek_next_song().id == 3
+    AdminController(player).delete_song(3)
+    assert player.next_song().id == 4
+    player.current_song = player.library.find_by_id(4)
+    player.library.delete(4)
+    player.library.add(player.current_song)   # now at the end: the old node is stale
+    assert player.prev_song().id == 5
+
+
+def test_sorted_order_and_the_queue(player):
+    player.sort_by = "title"
+    player.current_song = player.library.find_by_id(3)   # Bertaut
+    assert walk(player, player.next_song, 3) == [2, 1, 4]
+    player.queue.enqueue(player.library.find_by_id(5))
+    assert player.peek_next_song().id == 5 and len(player.queue) == 1
+    assert player.next_song().id == 5 and len(player.queue) == 0
+
+
+def test_end_of_list_falls_back_to_a_similar_song(player):
+    player.current_song = player.library.find_by_id(5)
+    pick = player.peek_next_song()
+    assert pick is not None and pick.id != 5
+    assert player.next_song() is pick
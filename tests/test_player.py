@@ -0,0 +1,124 @@
+"""MusicPlayer persistence paths: streaming load, song ids and sessions."""
+import json
+
+import pytest
+
+from groovy import AdminController, JsonStorage, MusicPlayer, SqliteStorage
+
+
+def write_library(path, ids):
+    with open(path, "w") as f:
+        json.dump([{"id": i, "title": f"song {i}", "artist": "a", "genre": "g", "album": "b",
+                    "year": 2000, "duration": "3:00", "file_path": None} for i in ids], f)
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return (lambda: JsonStorage()) if request.param == "json" else (lambda: SqliteStorage("groovy.db"))
+
+
+def test_deleted_ids_are_not_reused(storage):
+    player = MusicPlayer(storage=storage())
+    admin = AdminController(player)
+    for title in ("a", "b", "c"):
+        admin.add_song(title, "x", "y", "z", "", "", None)
+    admin.delete_song(3)
+    player.close()
+
+    player = MusicPlayer(storage=storage())
+    admin = AdminController(player)
+    admin.add_song("d", "x", "y", "z", "", "", None)
+    assert [s.id for s in player.library.get_all()] == [1, 2, 4]
+    player.close()
+
+
+def test_add_during_a_streaming_load_of_a_legacy_library(tmp_path, monkeypatch):
+    # saved before songs.last_id existed: the loader has to find the largest id itself
+    monkeypatch.chdir(tmp_path)
+    write_library("songs.json", range(1, 2001))
+    player = MusicPlayer(storage=JsonStorage(), autoload=False)
+    loader = player.iter_load_library(batch_size=500)
+    assert next(loader) == 500
+    ok, _ = AdminController(player).add_song("new", "x", "y", "z", "", "", None)
+    assert ok
+    for _ in loader:
+        pass
+    assert player.library.find_by_id(2001).title == "new"
+    assert player.library.find_by_id(501).title == "song 501"
+    assert player.library.size == 2001
+    player.close()
+
+    player = MusicPlayer(storage=JsonStorage())
+    assert player.library.size == 2001 and player.library.find_by_id(2001).title == "new"
+    player.close()
+
+
+def test_records_with_odd_ids_still_load(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with open("songs.json", "w") as f:
+        json.dump([{"id": None, "title": "no id"}, {"id": "x7", "title": "text id"}, {"id": 4, "title": "four"}], f)
+    player = MusicPlayer(storage=JsonStorage())
+    assert [s.title for s in player.library.get_all()] == ["no id", "text id", "four"]
+    assert player.get_next_id() == 5
+    player.close()
+
+
+def read_session(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_login_during_a_streaming_load_keeps_the_stored_queue(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_library("songs.json", range(1, 2001))
+    (tmp_path / "users" / "guest").mkdir(parents=True)
+    with open("users/guest/session.json", "w") as f:
+        json.dump({"favorites": [7], "queue": [10, 1500, 1999]}, f)
+    with open("session.json", "w") as f:
+        json.dump({"favorites": [2], "queue": [3]}, f)
+
+    player = MusicPlayer(storage=JsonStorage(), autoload=False)
+    loader = player.iter_load_library(batch_size=500)
+    next(loader)
+    player.switch_session("guest")
+    assert [s.id for s in player.queue.get_all()] == [10]
+    player.session.toggle_favorite(8)
+    assert read_session("users/guest/session.json")["queue"] == [10, 1500, 1999]
+    assert read_session("users/guest/session.json")["favorites"] == [7, 8]
+
+    for _ in loader:
+        pass
+    player.load_session()   # what the GUI does once the load has finished
+    assert [s.id for s in player.queue.get_all()] == [10, 1500, 1999]
+    player.switch_session(None)
+    assert player.favorites == {2} and [s.id for s in player.queue.get_all()] == [3]
+    player.close()
+    assert read_session("session.json")["queue"] == [3]
+
+
+def test_closing_before_the_load_keeps_the_default_session(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_library("songs.json", range(1, 10))
+    with open("session.json", "w") as f:
+        json.dump({"favorites": [2], "queue": [3]}, f)
+    player = MusicPlayer(storage=JsonStorage(), autoload=False)
+    player.switch_session("guest")
+    player.switch_session(None)
+    player.close()
+    assert read_session("session.json") == {"favorites": [2], "queue": [3]}
+
+
+def test_changing_the_queue_mid_load_saves_the_change(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_library("songs.json", range(1, 2001))
+    with open("session.json", "w") as f:
+        json.dump({"queue": [10, 1500]}, f)
+    player = MusicPlayer(storage=JsonStorage(), autoload=False)
+    loader = player.iter_load_library(batch_size=500)
+    next(loader)
+    player.load_session()
+    player.queue.enqueue(player.library.find_by_id(20))
+    player.session.save()
+    assert read_session("session.json")["queue"] == [10, 20, 1500]   # 1500 was not read yet
+    player.close()
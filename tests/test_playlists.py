@@ -0,0 +1,63 @@
+"""Named playlists through UserController, on both storage backends."""
+import pytest
+
+from groovy import DEFAULT_PLAYLIST, AdminController, JsonStorage, MusicPlayer, SqliteStorage, UserController
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return (lambda: JsonStorage()) if request.param == "json" else (lambda: SqliteStorage("groovy.db"))
+
+
+def ids(songs):
+    return [s.id for s in songs]
+
+
+def test_playlists_are_kept_apart_and_persist(storage):
+    player = MusicPlayer(storage=storage())
+    admin, user = AdminController(player), UserController(player)
+    for title in "abcd":
+        admin.add_song(title, "x", "y", "z", "", "", None)
+    assert user.create_playlist("Road Trip")
+    assert not user.create_playlist("Road Trip") and not user.create_playlist("  ")
+    assert user.get_playlists() == [DEFAULT_PLAYLIST, "Road Trip"]
+
+    user.add_to_playlist(1)
+    user.add_to_playlist(2, "Road Trip")
+    user.add_to_playlist(3, "Road Trip")
+    assert not user.add_to_playlist(4, "Missing") and not user.add_to_playlist(99)
+    assert user.select_playlist("Road Trip") and not user.select_playlist("Missing")
+    user.add_to_playlist(2)
+    assert ids(user.get_playlist()) == [2, 3, 2]
+    assert user.remove_from_playlist(2) and not user.remove_from_playlist(4)
+    player.close()
+
+    player = MusicPlayer(storage=storage())
+    user = UserController(player)
+    assert user.get_playlists() == [DEFAULT_PLAYLIST, "Road Trip"]
+    assert ids(user.get_playlist(DEFAULT_PLAYLIST)) == [1]
+    assert ids(user.get_playlist("Road Trip")) == [3, 2]
+    player.close()
+
+
+def test_deleting_songs_and_playlists(storage):
+    player = MusicPlayer(storage=storage())
+    admin, user = AdminController(player), UserController(player)
+    for title in "abc":
+        admin.add_song(title, "x", "y", "z", "", "", None)
+    user.create_playlist("Mix")
+    for song_id in (1, 2, 1):
+        user.add_to_playlist(song_id, "Mix")
+    player.playlists.reload()   # "Mix" is not open when song 1 goes
+    admin.delete_song(1)
+    assert ids(user.get_playlist("Mix")) == [2]
+    admin.delete_song(2)        # now it is open
+    assert ids(user.get_playlist("Mix")) == []
+
+    user.select_playlist("Mix")
+    assert not user.delete_playlist(DEFAULT_PLAYLIST)
+    assert user.delete_playlist("Mix") and not user.delete_playlist("Mix")
+    assert player.playlists.active_name == DEFAULT_PLAYLIST
+    assert user.get_playlists() == [DEFAULT_PLAYLIST]
+    player.close()
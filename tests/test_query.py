@@ -0,0 +1,110 @@
+"""QueryEngine: every plan returns what a full scan of the library would."""
+import random
+
+import pytest
+
+from groovy import AdminController, JsonStorage, MusicPlayer, QueryEngine, QueryError, Song, SortedIndex, parse_query
+
+ARTISTS = ("Hindia", "hindia", "Nadin Amizah", "Tulus", "Raisa", None)
+GENRES = ("Pop", "pop", "Indie", "Jazz", "")
+ALBUMS = ("Menari", "Selamat Ulang Tahun", "Monokrom", None)
+TITLES = ("Evaluasi", "Secukupnya", "Rumpang", "Love Story", "Lovely", "Hati-Hati di Jalan", "")
+QUERIES = (
+    "genre:pop",
+    "GENRE=Pop artist:hindia",
+    'artist:"nadin amizah"',
+    "album:monokrom year>=2015",
+    "year:2019",
+    "year<2000",
+    "year>1999 year<=2020",
+    "duration<4:00",
+    "duration>=3:30 genre:indie",
+    "duration:245",
+    "title:love",
+    "title~hati artist~tu",
+    "album~mono",
+    "love",
+    "lo",
+    '"hati di"',
+    "evaluasi genre:jazz year>2030",
+    "hindia rumpang",
+)
+
+
+@pytest.fixture
+def player(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)   # MusicPlayer keeps its caches in the working directory
+    player = MusicPlayer(storage=JsonStorage(), autoload=False)
+    rng = random.Random(7)
+    for i in range(1, 1500):
+        player.library.add(Song(
+            i, f"{rng.choice(TITLES)} {rng.randint(1, 50)}", rng.choice(ARTISTS), rng.choice(GENRES),
+            rng.choice(ALBUMS), rng.choice((None, 1995, 1999, 2000, 2015, 2019, 2021)),
+            rng.choice((None, "", "2:59", "3:30", "4:05", "4:00", "1:02:03", "bad"))))
+    yield player
+    player.close()
+
+
+def scan(player, text):
+    predicates = parse_query(text)
+    return [s for s in player.library.get_all() if all(p.test(s) for p in predicates)]
+
+
+@pytest.mark.parametrize("text", QUERIES)
+def test_plans_match_a_full_scan(player, text):
+    engine = QueryEngine(player)
+    expected = scan(player, text)
+    assert engine.run(text) == sorted(expected, key=lambda s: s.id)
+    assert engine.run(text, descending=True) == sorted(expected, key=lambda s: s.id, reverse=True)
+    assert engine.run(text, 3, 10) == sorted(expected, key=lambda s: s.id)[3:13]
+    assert engine.run(text, sort_by="year") == sorted(expected, key=lambda s: (SortedIndex.sort_key("year", s), s.id))
+
+
+@pytest.mark.parametrize("text", QUERIES)
+def test_after_edits_and_deletes(player, text):
+    admin = AdminController(player)
+    engine = QueryEngine(player)
+    engine.run(text)   # build the lazy sorted indexes first, so they must follow the edits
+    rng = random.Random(text)
+    for song in rng.sample(player.library.get_all(), 200):
+        admin.edit_song(song.id, song.title, rng.choice(ARTISTS), rng.choice(GENRES), song.album,
+                        rng.choice(("", "1990", "2019")), rng.choice(("3:00", "5:10", None)), song.file_path)
+    for song in rng.sample(player.library.get_all(), 200):
+        admin.delete_song(song.id)
+    assert engine.run(text) == sorted(scan(player, text), key=lambda s: s.id)
+
+
+def test_semantics(player):
+    engine = QueryEngine(player)
+    for song in engine.run("genre:pop"):
+        assert song.genre.casefold() == "pop"
+    for song in engine.run("title:love"):
+        assert "love" in song.title.lower()
+    for song in engine.run("year>=2015 duration<4:00"):
+        assert song.year >= 2015 and song.duration in ("2:59", "3:30")
+    assert all(s.year is not None for s in engine.run("year<2030"))
+    assert engine.run("") == player.library.get_all()
+
+
+def test_explain_orders_cheapest_first(player):
+    plan = QueryEngine(player).explain("year>=1990 artist:tulus")
+    assert [step["index"] for step in plan] == ["hash", "range"]
+    assert plan[0]["estimate"] <= plan[1]["estimate"]
+
+
+@pytest.mark.parametrize("text", [
+    "colour:red",
+    "genre:",
+    "genre<pop",
+    "year~19",
+    "year>soon",
+    "duration<long",
+])
+def test_bad_queries(player, text):
+    with pytest.raises(QueryError):
+        QueryEngine(player).run(text)
+
+
+def test_bad_sort_field(player):
+    with pytest.raises(QueryError):
+        QueryEngine(player).run("genre:pop", sort_by="file_path")
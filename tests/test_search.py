@@ -0,0 +1,85 @@
+"""SearchIndex ranking, cancellation and SearchWorker on its own thread."""
+import threading
+import time
+
+from groovy import DoublyLinkedList, SearchWorker, Song
+
+
+def library(n):
+    songs = DoublyLinkedList()
+    for i in range(1, n + 1):
+        songs.add(Song(i, f"track {i}", f"artist {i % 40}", f"genre-{i % 7}", "album"))
+    return songs
+
+
+def brute_force(songs, keyword):
+    keyword = keyword.lower()
+    hits = []
+    for s in songs.get_all():
+        for rank, field in enumerate(("title", "artist", "genre")):
+            if keyword in (getattr(s, field) or "").lower():
+                hits.append(s)
+                break
+    return hits
+
+
+def test_matches_a_plain_scan():
+    songs = library(3000)
+    for keyword in ("track 12", "ARTIST 3", "genre-5", "12", "k", "zzz", "e"):
+        assert sorted(songs.search(keyword), key=lambda s: s.id) == brute_force(songs, keyword)
+        assert songs.search(keyword, 5, 10) == songs.search(keyword)[5:15]
+
+
+def test_cancelled_search_gives_up():
+    songs = library(20000)
+    calls = []
+
+    def cancelled():
+        calls.append(1)
+        return True
+    assert songs.search("1", cancelled=cancelled) == []
+    assert songs.search("track", cancelled=cancelled) == []
+    assert len(calls) == 2   # asked once each, at the start of the scan
+    assert len(songs.search("1", cancelled=lambda: False)) == len(brute_force(songs, "1"))
+
+
+def test_worker_only_delivers_the_newest_search():
+    songs = library(20000)
+    worker = SearchWorker(songs.search, first_page=50, batch_size=500)
+    try:
+        for keyword in ("t", "tr", "tra", "trac"):
+            worker.submit(keyword)
+        generation = worker.submit("1")
+        received, deadline = [], time.time() + 30
+        while time.time() < deadline:
+            batch_generation, batch, done = worker.results.get(timeout=30)
+            if batch_generation == generation:
+                received.extend(batch)
+                if done:
+                    break
+        assert sorted(received, key=lambda s: s.id) == brute_force(songs, "1")
+    finally:
+        worker.close()
+
+
+def test_search_while_songs_stream_in():
+    songs = library(1000)
+    errors, stop = [], threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            try:
+                songs.search("a", 0, 50)
+                songs.search("tra")
+            except Exception as e:   # e.g. "dictionary changed size during iteration"
+                errors.append(e)
+    thread = threading.Thread(target=reader)
+    thread.start()
+    try:
+        for i in range(1001, 6001):
+            songs.add(Song(i, f"track {i}", "artist", "genre", "album"))
+    finally:
+        stop.set()
+        thread.join()
+    assert errors == []
+    assert len(songs.search("track")) == 6000
@@ -0,0 +1,62 @@
+"""SimilarityIndex, pure Python and with the NumPy FeatureScorer."""
+import random
+
+import pytest
+
+from groovy import DoublyLinkedList, SimilarityIndex, Song
+
+
+def library(vectorized, n=3000, seed=11):
+    rng = random.Random(seed)
+    songs = DoublyLinkedList()
+    index = songs.attach(SimilarityIndex(vectorized=vectorized))
+    for i in range(1, n + 1):
+        songs.add(Song(i, f"song {i}", f"artist {rng.randint(1, 300)}", f"genre {rng.randint(1, 12)}",
+                       rng.choice((None, f"album {rng.randint(1, 600)}")), rng.randint(1980, 2020)))
+    for song in rng.sample(songs.get_all(), 300):
+        songs.delete(song.id)
+    return songs, index
+
+
+def best_score(index, song, others, exclude=()):
+    keys = index.keys(song)
+    return max((index.score(keys, o) for o in others if o.id != song.id and o.id not in exclude), default=0)
+
+
+@pytest.mark.parametrize("vectorized", [False, True])
+def test_never_returns_the_song_excluded_or_deleted(vectorized):
+    if vectorized:
+        pytest.importorskip("numpy")
+    songs, index = library(vectorized)
+    alive = {s.id for s in songs.get_all()}
+    rng = random.Random(1)
+    for song in rng.sample(songs.get_all(), 200):
+        exclude = {o.id for o in rng.sample(songs.get_all(), 20)}
+        picks = index.similar(song, k=5, exclude=exclude)
+        assert len(picks) == len({p.id for p in picks}) <= 5
+        for pick in picks:
+            assert pick.id != song.id and pick.id not in exclude and pick.id in alive
+
+
+def test_vectorised_scorer_finds_the_best_artist_or_album_match():
+    pytest.importorskip("numpy")
+    songs, index = library(vectorized=True)
+    assert index.scorer is not None
+    everything = songs.get_all()
+    for song in random.Random(2).sample(everything, 200):
+        picks = index.similar(song, k=3)
+        best = best_score(index, song, everything)
+        if best >= 4:   # shares the artist or the album: read whole, so exact
+            assert index.score(index.keys(song), picks[0]) == best
+        scores = [index.score(index.keys(song), p) for p in picks]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_vectorised_full_scan_matches_brute_force():
+    pytest.importorskip("numpy")
+    songs, index = library(vectorized=True, n=800)
+    everything = songs.get_all()
+    for song in random.Random(3).sample(everything, 100):
+        pick = index.scorer.top_k(song.id, index.keys(song), 1, exclude=(1, 2))
+        expected = best_score(index, song, everything, exclude=(1, 2))
+        assert (index.score(index.keys(song), pick[0]) if pick else 0) == expected
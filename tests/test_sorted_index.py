@@ -0,0 +1,135 @@
+"""SortedIndex / SortedView against a plain sorted() of the same songs."""
+import random
+
+import pytest
+
+from groovy import DoublyLinkedList, Song, SortedIndex
+
+WORDS = ("alpha", "Beta", "gamma", "delta", "", None, "Épée", "zeta")
+
+
+def random_song(rng, song_id):
+    return Song(song_id, rng.choice(WORDS), rng.choice(WORDS), rng.choice(WORDS), rng.choice(WORDS),
+                rng.choice((None, 1975, 1990, 2001, 2020, "")),
+                rng.choice((None, "", "3:05", "0:59", "12:00", "1:02:03", "bad")))
+
+
+def reference(songs, field):
+    return sorted(songs, key=lambda s: (SortedIndex.sort_key(field, s), s.id))
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    # tiny chunks so splits, merges and the Fenwick tree get exercised
+    monkeypatch.setattr(SortedIndex, "LOAD", 4)
+
+
+def check(index, songs):
+    expected = reference(songs, index.field)
+    assert len(index) == len(expected)
+    assert index.page() == expected
+    assert index.page(0, None, reverse=True) == expected[::-1]
+    assert [index[i] for i in range(len(expected))] == expected
+    for pos, song in enumerate(expected):
+        assert index.position(song) == pos
+        assert index.neighbour(song, 1) is (expected[pos + 1] if pos + 1 < len(expected) else None)
+        assert index.neighbour(song, -1) is (expected[pos - 1] if pos else None)
+    for offset in (0, 1, 5, len(expected) - 1, len(expected) + 3):
+        assert index.page(offset, 7) == expected[offset:offset + 7]
+
+
+@pytest.mark.parametrize("field", SortedIndex.FIELDS)
+def test_random_adds_and_removes(field):
+    rng = random.Random(field)
+    index = SortedIndex(field)
+    songs = {}
+    for song_id in range(1, 400):
+        if songs and rng.random() < 0.3:
+            victim = songs.pop(rng.choice(list(songs)))
+            index.remove(victim)
+        else:
+            songs[song_id] = random_song(rng, song_id)
+            index.add(songs[song_id])
+        if song_id % 50 == 0:
+            check(index, list(songs.values()))
+    check(index, list(songs.values()))
+
+
+def test_add_many_then_incremental():
+    rng = random.Random(1)
+    songs = [random_song(rng, i) for i in range(1, 200)]
+    index = SortedIndex("title")
+    index.add_many(songs[:150])
+    check(index, songs[:150])
+    index.add_many(songs[150:])   # not empty any more: one add per song
+    check(index, songs)
+    for song in songs[::3]:
+        index.remove(song)
+    check(index, [s for i, s in enumerate(songs) if i % 3])
+
+
+def test_remove_unknown_song_is_ignored():
+    index = SortedIndex("artist")
+    index.add(Song(1, "a", "x", "g", "al"))
+    index.remove(Song(2, "b", "y", "g", "al"))
+    assert len(index) == 1
+    assert index.position(Song(2, "b", "y", "g", "al")) is None
+
+
+def test_unknown_field():
+    with pytest.raises(ValueError):
+        SortedIndex("file_path")
+
+
+@pytest.mark.parametrize("field, lo, hi", [("year", 1980, 2010), ("duration", 60, 3600)])
+def test_span(field, lo, hi):
+    rng = random.Random(field)
+    songs = [random_song(rng, i) for i in range(1, 300)]
+    index = SortedIndex(field)
+    index.add_many(songs)
+    keys = {s.id: SortedIndex.sort_key(field, s) for s in songs}
+    cases = {
+        (lo, hi, False, False): lambda k: lo <= k <= hi,
+        (lo, hi, True, True): lambda k: lo < k < hi,
+        (None, hi, False, True): lambda k: k < hi,
+        (lo, None, True, False): lambda k: lo < k != float("inf"),
+        (None, None, False, False): lambda k: k != float("inf"),   # blanks never match
+    }
+    for (a, b, lo_open, hi_open), wanted in cases.items():
+        start, stop = index.span(a, b, lo_open, hi_open)
+        got = index.page(start, stop - start)
+        assert got == reference([s for s in songs if wanted(keys[s.id])], field)
+
+
+def test_follows_library_edits_and_deletes():
+    rng = random.Random(2)
+    library = DoublyLinkedList()
+    for i in range(1, 120):
+        library.add(random_song(rng, i))
+    index = library.attach(SortedIndex("album"))
+    for song in library.get_all()[::4]:
+        library.update(song.id, album=rng.choice(WORDS))
+    for song in library.get_all()[::5]:
+        library.delete(song.id)
+    library.add(random_song(rng, 500))
+    check(index, library.get_all())
+
+
+def test_sorted_view():
+    rng = random.Random(3)
+    songs = [random_song(rng, i) for i in range(1, 60)]
+    index = SortedIndex("genre")
+    index.add_many(songs)
+    expected = reference(songs, "genre")
+    for reverse, order in ((False, expected), (True, expected[::-1])):
+        view = index.view(reverse)
+        assert len(view) == len(order)
+        assert view[:] == order
+        assert view[5:17] == order[5:17]
+        assert view[::3] == order[::3]
+        assert view[-1] is order[-1]
+        assert [view.position(s) for s in order] == list(range(len(order)))
+        with pytest.raises(IndexError):
+            view[len(order)]
+        with pytest.raises(IndexError):
+            view[-len(order) - 1]
@@ -0,0 +1,54 @@
+"""Queue, the Stack ring buffer and PlayHistory."""
+import pytest
+
+from groovy import PlayHistory, Queue, Song, Stack
+
+
+def song(song_id):
+    return Song(song_id, f"song {song_id}", "Tulus", "Pop", "Monokrom")
+
+
+def test_stack_keeps_the_newest_items():
+    stack = Stack(3)
+    assert stack.recent() == [] and len(stack) == 0
+    songs = [song(i) for i in range(1, 6)]
+    for s in songs:
+        stack.push(s)
+    assert len(stack) == 3
+    assert stack.recent() == songs[:1:-1]
+    assert stack.recent(2) == [songs[4], songs[3]]
+    assert stack.recent(0) == [] and stack.recent(-1) == []
+    assert stack.get_all() == songs[2:]
+
+
+@pytest.mark.parametrize("capacity", [0, -1])
+def test_stack_needs_room_for_one_item(capacity):
+    with pytest.raises(ValueError):
+        Stack(capacity)
+    with pytest.raises(ValueError):
+        PlayHistory(capacity=capacity)
+
+
+def test_queue_order():
+    queue = Queue()
+    a, b, c = song(1), song(2), song(3)
+    queue.enqueue_many([a, b])
+    queue.play_next(c)
+    assert queue.peek() is c
+    assert queue.remove_at(1) is a and queue.remove_at(5) is None
+    assert queue.dequeue() is c and queue.dequeue() is b
+    assert queue.dequeue() is None and queue.peek() is None
+
+
+def test_history_survives_a_restart(tmp_path):
+    path = str(tmp_path / "history.log")
+    songs = {i: song(i) for i in range(1, 5)}
+    history = PlayHistory(path, capacity=3, roll_every=4)
+    for i in (1, 2, 1, 3, 4, 1):   # rolls over to history.json after the fourth play
+        history.push(songs[i])
+    history.close()
+
+    history = PlayHistory(path, capacity=3)
+    history.load(songs.get)
+    assert history.play_counts == {1: 3, 2: 1, 3: 1, 4: 1}
+    assert [s.id for s in history.plays.recent()] == [1, 4, 3]